@@ -0,0 +1,417 @@
+from playwright.async_api import async_playwright, Page, Browser, BrowserContext, Playwright, TimeoutError as PlaywrightTimeout
+import os
+import time
+import asyncio
+import logging
+from typing import Dict, Any, Optional, List, Tuple
+
+import tracing
+import xtiming_html
+import xtiming_ui
+from web_automator import WebAutomator, SelectOptionIndex, NetworkFilter
+
+logger = logging.getLogger("AsyncWebBot")
+
+
+class AsyncWebAutomator:
+    """
+    Variante asíncrona de WebAutomator sobre playwright.async_api.
+    Mismos selectores y scripts (xtiming_ui) y mismo flujo de llenado, pero varias páginas del
+    mismo contexto avanzan a la vez dentro de un único event loop (sin hilos).
+    """
+    SELECTORS = xtiming_ui.SELECTORS
+    TICKET_FIELDS = xtiming_ui.TICKET_FIELDS
+    _ticket_signature = WebAutomator._ticket_signature
+    _entries_list_params = staticmethod(WebAutomator._entries_list_params)
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None, credentials: Optional[Tuple[str, str]] = None):
+        self.config = config or {}
+        self.user = os.getenv("XTIMING_USER")
+        self.password = os.getenv("XTIMING_PASSWORD")
+        if credentials:
+            self.user, self.password = credentials
+        self.base_url = os.getenv("XTIMING_URL", "https://xtiming.intelix.biz/index.php/es")
+
+        app_cfg = self.config.get("app", {})
+        self.headless = app_cfg.get("headless_browser", False)
+        self.concurrency = max(1, int(app_cfg.get("async_concurrency", 4)))
+        self.persist_session = app_cfg.get("persist_session", True)
+
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        self.session_state_path = os.path.join(base_dir, "data", WebAutomator._session_filename(credentials and self.user))
+        self.option_index = SelectOptionIndex(
+            os.path.join(base_dir, "data", "select_options.json"), app_cfg.get("select_cache_ttl_hours", 24)
+        )
+        self._indexed_scopes = set()
+        # Selects capturados por ticket (ruta rápida de sub-bloques, ver WebAutomator)
+        self._ticket_fields: Dict[tuple, List[Dict[str, Any]]] = {}
+
+        defaults = self.config.get("defaults", {})
+        self.default_client = defaults.get("client_fallback", "Intelix")
+        self.default_project = defaults.get("project_fallback", "Gestión - Intelix")
+        self.default_activity = defaults.get("activity", "Soporte")
+        self.default_tag = defaults.get("tag", "Soporte")
+
+        self.network_filter = NetworkFilter(app_cfg.get("network_filter"), self.base_url)
+        self.tracer = tracing.StepTracer()
+
+        self.playwright: Optional[Playwright] = None
+        self.browser: Optional[Browser] = None
+        self.context: Optional[BrowserContext] = None
+        self._pages: Optional[asyncio.Queue] = None
+        self._all_pages: List[Page] = []
+        self._relogin_lock = asyncio.Lock()
+
+    # --- Ciclo de vida ---
+
+    async def start_browser(self):
+        if self.context: return
+
+        is_headless = self.headless
+        if not os.environ.get("DISPLAY") and os.name != 'nt':
+            if not is_headless:
+                logger.warning("No se detectó DISPLAY (ambiente Docker/servidor). Forzando headless=True.")
+            is_headless = True
+
+        logger.info(f"Iniciando navegador async (headless={is_headless}, páginas={self.concurrency})...")
+        self.playwright = await async_playwright().start()
+        self.browser = await self.playwright.chromium.launch(
+            headless=is_headless,
+            args=["--no-sandbox", "--disable-dev-shm-usage"]
+        )
+
+        state_file = self.session_state_path if self.persist_session and os.path.exists(self.session_state_path) else None
+        self.context = await self.browser.new_context(storage_state=state_file)
+        if self.network_filter.enabled:
+            await self.context.route("**/*", self._handle_route)
+            self.context.on("response", self.network_filter.on_response)
+
+        try:
+            first_page = await self.context.new_page()
+            if not (state_file and await self._session_is_valid()):
+                await self.login(first_page)
+                await self._save_session()
+            else:
+                logger.info("Sesión persistida válida. Se omite el login.")
+
+            # Pool de páginas: cada registro toma una y la devuelve al terminar
+            self._pages = asyncio.Queue()
+            self._all_pages = [first_page]
+            for _ in range(self.concurrency - 1):
+                self._all_pages.append(await self.context.new_page())
+            for page in self._all_pages:
+                self._pages.put_nowait(page)
+        except Exception as e:
+            logger.error(f"Error crítico iniciando navegador async: {e}")
+            await self.close_browser()
+            raise e
+
+    async def close_browser(self):
+        logger.info("Cerrando navegador async...")
+        self.option_index.save()
+        self._indexed_scopes = set()
+        self._ticket_fields = {}
+        try:
+            if self.context: await self.context.close()
+            if self.browser: await self.browser.close()
+            if self.playwright: await self.playwright.stop()
+        finally:
+            self.context = None
+            self.browser = None
+            self.playwright = None
+            self._pages = None
+            self._all_pages = []
+
+    async def _handle_route(self, route):
+        if self.network_filter.decide(route.request):
+            await route.continue_()
+        else:
+            await route.abort("blockedbyclient")
+
+    async def _session_is_valid(self) -> bool:
+        try:
+            resp = await self.context.request.get(f"{self.base_url}/timesheet/", max_redirects=0, timeout=10000)
+            return resp.status == 200
+        except Exception as e:
+            logger.debug(f"No se pudo validar la sesión persistida: {e}")
+            return False
+
+    async def _save_session(self):
+        if not self.persist_session: return
+        try:
+            os.makedirs(os.path.dirname(self.session_state_path), exist_ok=True)
+            await self.context.storage_state(path=self.session_state_path)
+            os.chmod(self.session_state_path, 0o600)
+        except Exception as e:
+            logger.warning(f"No se pudo guardar la sesión: {e}")
+
+    async def login(self, page: Page, max_retries: int = 3, delay: int = 2):
+        last_exception = None
+        for attempt in range(max_retries):
+            try:
+                logger.info(f"Iniciando sesión para usuario {self.user}...")
+                await page.goto(f"{self.base_url}/login")
+
+                if await page.locator(self.SELECTORS["user_menu"]).is_visible():
+                    logger.info("Sesión recuperada.")
+                    return True
+
+                await page.fill(self.SELECTORS["login_user"], self.user)
+                await page.fill(self.SELECTORS["login_pass"], self.password)
+                await page.click(self.SELECTORS["login_btn"])
+
+                try:
+                    await page.wait_for_selector(self.SELECTORS["user_menu"], timeout=15000)
+                    logger.info("Login exitoso.")
+                    return True
+                except PlaywrightTimeout:
+                    if "login" in page.url:
+                        raise Exception("Credenciales inválidas o error de carga.")
+                    return True
+            except Exception as e:
+                last_exception = e
+                logger.warning(f"Intento {attempt + 1}/{max_retries} fallido en login: {str(e)}")
+                await asyncio.sleep(delay * (attempt + 1))  # Backoff lineal
+
+        logger.error(f"Acción login falló después de {max_retries} intentos.")
+        raise last_exception
+
+    # --- Esperas y selects ---
+
+    async def _wait_ajax_idle(self, page: Page, timeout: int = 10000):
+        try:
+            await page.wait_for_function(xtiming_ui.AJAX_IDLE_JS, timeout=timeout)
+        except PlaywrightTimeout:
+            logger.debug(f"AJAX no quedó inactivo en {timeout}ms. Continuando.")
+
+    async def _wait_select2_filtered(self, page: Page, query: str, timeout: int = 5000):
+        try:
+            await page.wait_for_function(xtiming_ui.SELECT2_FILTERED_JS, arg=query, timeout=timeout)
+        except PlaywrightTimeout:
+            logger.debug(f"Select2: resultados para '{query}' no se estabilizaron en {timeout}ms. Continuando.")
+
+    async def _select_select2(self, page: Page, selector_id: str, label_text: str):
+        """Mismo flujo de tipeo en Select2 que el motor síncrono (solo ante fallos del índice)."""
+        if not label_text: return
+        clean_id = selector_id.replace("#", "")
+        try:
+            container_selector = f"#select2-{clean_id}-container"
+            if await page.is_visible(container_selector):
+                await page.locator(container_selector).scroll_into_view_if_needed()
+                await page.click(container_selector)
+            else:
+                fallback = f"{selector_id} + .select2 .select2-selection"
+                await page.locator(fallback).scroll_into_view_if_needed()
+                await page.click(fallback)
+
+            await page.wait_for_selector(self.SELECTORS["select2_search"], state="visible", timeout=5000)
+            await page.fill(self.SELECTORS["select2_search"], label_text)
+            await page.wait_for_selector(self.SELECTORS["select2_results"], state="visible", timeout=5000)
+            await self._wait_select2_filtered(page, label_text)
+
+            option = page.locator(f".select2-results__option:text-is('{label_text}')")
+            if await option.count() > 0:
+                await option.first.click()
+            else:
+                await page.locator(self.SELECTORS["select2_option"]).first.click()
+            logger.info(f"Select2: '{label_text}' seleccionado exitosamente en {selector_id}")
+        except Exception as e:
+            logger.error(f"Fallo select2 en {selector_id} para '{label_text}': {e}")
+            await page.keyboard.press("Escape")
+
+    async def _learn_select(self, page: Page, key: str, scope: str = "*", force: bool = False):
+        if not force and (key, scope) in self._indexed_scopes: return
+        options = await page.evaluate(xtiming_ui.READ_OPTIONS_JS, self.SELECTORS[key])
+        self.option_index.update(key, options, scope)
+        self._indexed_scopes.add((key, scope))
+
+    async def _set_select_values(self, page: Page, selector: str, values: List[str]) -> bool:
+        return await page.evaluate(xtiming_ui.SET_SELECT_VALUES_JS, [selector, values])
+
+    async def _wait_option_present(self, page: Page, selector: str, value: str, timeout: int = 5000) -> bool:
+        try:
+            await page.wait_for_function(xtiming_ui.OPTION_PRESENT_JS, arg=[selector, value], timeout=timeout)
+            return True
+        except PlaywrightTimeout:
+            return False
+
+    async def _current_value(self, page: Page, selector: str) -> str:
+        return await page.evaluate(xtiming_ui.CURRENT_VALUE_JS, selector)
+
+    async def _choose_option(self, page: Page, key: str, label: str, scope: str = "*") -> str:
+        selector = self.SELECTORS[key]
+        if not label: return await self._current_value(page, selector)
+
+        value = self.option_index.lookup(key, label, scope)
+        if value and await self._wait_option_present(page, selector, value) and await self._set_select_values(page, selector, [value]):
+            return value
+
+        await self._select_select2(page, selector, label)
+        await self._learn_select(page, key, scope, force=True)
+        return await self._current_value(page, selector)
+
+    async def _choose_tags(self, page: Page, tags: List[str]):
+        tags = [t for t in tags if t]
+        selector = self.SELECTORS["ts_tags"]
+        values = [self.option_index.lookup("ts_tags", t) for t in tags]
+        if tags and all(values) and await self._set_select_values(page, selector, values):
+            return
+        for tag, value in zip(tags, values):
+            if value and await self._set_select_values(page, selector, [value]):
+                continue
+            await self._select_select2(page, selector, tag)
+        await self._learn_select(page, "ts_tags", force=True)
+
+    # --- Registro ---
+
+    async def fetch_existing_entries(self, date_str: str) -> Optional[List[Dict[str, Any]]]:
+        """Registros ya cargados en xtiming para la fecha (YYYY-MM-DD). None si no se pudo consultar."""
+        if not self.context: await self.start_browser()
+        try:
+            resp = await self.context.request.get(f"{self.base_url}/timesheet/", params=self._entries_list_params(date_str), timeout=15000)
+            if resp.status != 200 or "login" in resp.url:
+                raise Exception(f"HTTP {resp.status} en {resp.url}")
+            entries = xtiming_html.parse_timesheet_entries(await resp.text(), default_date=date_str)
+            logger.info(f"Registros existentes en xtiming para {date_str}: {len(entries)}")
+            return entries
+        except Exception as e:
+            logger.warning(f"No se pudieron leer los registros existentes de {date_str}: {e}")
+            return None
+
+    async def _capture_ticket_fields(self, page: Page) -> Optional[List[Dict[str, Any]]]:
+        return xtiming_ui.usable_capture(
+            await page.evaluate(xtiming_ui.CAPTURE_FIELDS_JS, xtiming_ui.ticket_field_selectors())
+        )
+
+    async def _fill_ticket_fields(self, page: Page, entry_data: Dict[str, Any], trace: tracing.SlotTrace):
+        await self._learn_select(page, "ts_customer")
+        await self._learn_select(page, "ts_tags")
+        customer_value = await self._choose_option(page, "ts_customer", entry_data.get('client', self.default_client))
+        await self._wait_ajax_idle(page)
+        trace.checkpoint("customer")
+
+        project_value = await self._choose_option(page, "ts_project", entry_data.get('project', self.default_project), scope=customer_value)
+        await self._wait_ajax_idle(page)
+        trace.checkpoint("project")
+
+        await self._choose_option(page, "ts_activity", entry_data.get('activity', self.default_activity), scope=project_value)
+        trace.checkpoint("activity")
+
+        target_tags = entry_data.get('tags', self.default_tag)
+        await self._choose_tags(page, target_tags if isinstance(target_tags, list) else [target_tags])
+        await page.keyboard.press("Escape")
+        await page.evaluate("document.body.click()")
+        trace.checkpoint("tags")
+
+    async def _recover_session(self, page: Page, attempt: int):
+        """Como WebAutomator._recover_session: re-login, reescritura de la sesión y un único reintento."""
+        if attempt:
+            raise Exception(f"Redirección inesperada tras reintentar: {page.url}")
+        logger.warning(f"Redirección a {page.url}: sesión expirada, reintentando tras login.")
+        # Varias páginas pueden encontrar la sesión vencida a la vez: un solo login para todas
+        async with self._relogin_lock:
+            if not await self._session_is_valid():
+                await self.login(page)
+                await self._save_session()
+
+    async def fill_timesheet_entry(self, entry_data: Dict[str, Any]) -> bool:
+        if not self.context: await self.start_browser()
+        page = await self._pages.get()
+        trace = self.tracer.start(entry_data.get('title', ''))
+        ok = False
+
+        try:
+            logger.info(f"Registrando: {entry_data['title']} [{entry_data['start_time']} - {entry_data['end_time']}]")
+
+            for attempt in range(2):
+                await page.goto(f"{self.base_url}/timesheet/create")
+                await page.wait_for_load_state('domcontentloaded')
+                trace.checkpoint("navigate")
+                if "create" not in page.url:
+                    # La sesión venció antes de abrir el formulario
+                    await self._recover_session(page, attempt)
+                    continue
+
+                # Fechas via JavaScript para NO activar el datepicker
+                await page.evaluate(xtiming_ui.SET_DATES_JS, [self.SELECTORS["ts_start_time"], self.SELECTORS["ts_end_time"],
+                                                              entry_data["start_time"], entry_data["end_time"]])
+                await page.keyboard.press("Escape")
+                trace.checkpoint("dates")
+
+                signature = self._ticket_signature(entry_data)
+                captured = self._ticket_fields.get(signature)
+                if captured and await page.evaluate(xtiming_ui.REPLAY_FIELDS_JS, captured):
+                    trace.checkpoint("replay")
+                else:
+                    captured = None
+                    await self._fill_ticket_fields(page, entry_data, trace)
+
+                await page.fill(self.SELECTORS["ts_description"], entry_data['title'])
+                trace.checkpoint("description")
+
+                ticket_id = entry_data.get('ticket_id')
+                if ticket_id and str(ticket_id).isdigit():
+                    if await page.locator(self.SELECTORS["ts_ticket_glpi"]).is_visible():
+                        await page.fill(self.SELECTORS["ts_ticket_glpi"], str(ticket_id))
+                trace.checkpoint("ticket")
+
+                save_btn = page.locator(xtiming_ui.SAVE_BUTTON).first
+                if await save_btn.count() == 0:
+                    save_btn = page.locator(xtiming_ui.SAVE_BUTTON_FALLBACK).last
+                if captured is None:
+                    captured = await self._capture_ticket_fields(page)
+                await save_btn.scroll_into_view_if_needed()
+                await save_btn.wait_for(state="visible", timeout=5000)
+                await page.wait_for_function(xtiming_ui.BUTTON_ENABLED_JS, arg=await save_btn.element_handle(), timeout=5000)
+
+                async with page.expect_navigation(timeout=15000):
+                    await save_btn.click()
+                    trace.checkpoint("save")
+                trace.checkpoint("redirect")
+
+                # Solo el listado o un registro confirman el guardado
+                if xtiming_ui.is_saved_url(self.base_url, page.url):
+                    logger.info("Redirección detectada. Registro exitoso.")
+                    if captured:
+                        self._ticket_fields[signature] = captured
+                    ok = True
+                    return True
+                if "create" not in page.url:
+                    # Otro destino (p.ej. /login por sesión expirada): el registro no se guardó
+                    await self._recover_session(page, attempt)
+                    continue
+
+                self._ticket_fields.pop(signature, None)
+                if await page.locator(self.SELECTORS["alert_error"]).is_visible():
+                    error_text = await page.locator(self.SELECTORS["alert_error"]).first.inner_text()
+                    raise Exception(f"Error de validación: {error_text}")
+
+                ok = True
+                return True
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error registrando ticket: {e}")
+            self._ticket_fields.pop(self._ticket_signature(entry_data), None)
+            timestamp = int(time.time())
+            screenshot_path = os.path.abspath(f"error_validation_{timestamp}.png")
+            try:
+                await page.screenshot(path=screenshot_path)
+                logger.info(f"Screenshot guardada: {screenshot_path}")
+            except Exception:
+                pass
+            return False
+
+        finally:
+            self.tracer.finish(trace, ok)
+            if self._pages is not None:
+                self._pages.put_nowait(page)
+
+    async def fill_many(self, entries: List[Dict[str, Any]]) -> List[bool]:
+        """Registra varios slots a la vez; la concurrencia la limita el pool de páginas."""
+        return await asyncio.gather(*(self.fill_timesheet_entry(e) for e in entries))
+
+
+if __name__ == "__main__":
+    pass
@@ -1,8 +1,16 @@
 import mysql.connector
+from mysql.connector import pooling
 import os
+import time
+import threading
+import queue
+import logging
+from datetime import datetime, timedelta
+
+logger = logging.getLogger("DBHandler")
 
 class DBHandler:
-    def __init__(self):
+    def __init__(self, local_db=None):
         try:
             self.config = {
                 "host": os.getenv("GLPI_DB_HOST"),
@@ -10,106 +18,531 @@ class DBHandler:
                 "user": os.getenv("GLPI_DB_USER"),
                 "password": os.getenv("GLPI_DB_PASSWORD"),
                 "database": os.getenv("GLPI_DB_NAME"),
+                "connection_timeout": int(os.getenv("GLPI_DB_CONNECT_TIMEOUT", "10")),
             }
+            # Pool de conexiones: evita el handshake TCP + auth (sobre VPN) en cada consulta
+            self.pool_size = int(os.getenv("GLPI_DB_POOL_SIZE", "2"))
+            # Tiempo máximo esperando una conexión libre del pool antes de fallar
+            self.pool_timeout = float(os.getenv("GLPI_DB_POOL_TIMEOUT", "30"))
+            # Solapamiento de la ingesta incremental respecto de la marca de agua
+            self.watermark_overlap_minutes = int(os.getenv("GLPI_WATERMARK_OVERLAP_MINUTES", "10"))
+            # Filas por bloque al recorrer rangos largos con cursor sin buffer
+            self.fetch_chunk_size = int(os.getenv("GLPI_DB_FETCH_CHUNK", "500"))
+            # Desde cuántos técnicos se filtra con tabla temporal en vez de IN (...)
+            self.technicians_temp_table_min = int(os.getenv("GLPI_TECHNICIANS_TEMP_TABLE_MIN", "50"))
+            # Desde cuántos tickets excluidos se usa tabla temporal en vez de NOT IN (...)
+            self.exclude_temp_table_min = int(os.getenv("GLPI_EXCLUDE_TEMP_TABLE_MIN", "500"))
+            # Vigencia del users_id resuelto a partir de GLPI_USER_EMAIL
+            self.user_cache_ttl_hours = float(os.getenv("GLPI_USER_CACHE_TTL_HOURS", "24"))
         except Exception as e:
             raise Exception(f"Error cargando la configuracion de la base de datos: {str(e)}")
 
+        # El pool se crea en el primer uso (el servicio arranca aunque GLPI no responda)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self.metrics = {"checkouts": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0, "reconnects": 0, "errors": 0}
+
+        # Base local donde persiste la marca de agua de ingesta (app_state); opcional
+        self.local_db = local_db
+
+        # Técnicos configurados: se leen una vez; sus users_id se resuelven al primer uso y se
+        # reutilizan en cada consulta (ver technicians)
+        self.user_email = os.getenv("GLPI_USER_EMAIL")
+        self.user_emails = self._env_list("GLPI_USER_EMAILS")
+        self.user_ids = self._env_list("GLPI_USER_IDS")
+        if not (self.user_email or self.user_emails or self.user_ids):
+            logger.warning("GLPI_USER_EMAIL no configurado. La consulta podría fallar o traer datos incorrectos.")
+        self._technicians = None
+        self._technicians_at = 0.0
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = pooling.MySQLConnectionPool(
+                    pool_name="glpi",
+                    pool_size=self.pool_size,
+                    pool_reset_session=True,
+                    **self.config
+                )
+                logger.info(f"Pool MySQL creado ({self.pool_size} conexiones) hacia {self.config['host']}.")
+            return self._pool
+
     def get_connection(self):
-        return mysql.connector.connect(**self.config)
+        """
+        Toma una conexión del pool (esperando si están todas en uso) y verifica que siga viva con
+        ping(reconnect=True): las conexiones ociosas entre corridas pueden haber sido cortadas por la VPN
+        o por wait_timeout. conn.close() la devuelve al pool.
+        """
+        started = time.perf_counter()
+        deadline = started + self.pool_timeout
+        try:
+            pool = self._get_pool()
+            while True:
+                try:
+                    conn = pool.get_connection()
+                    break
+                except pooling.PoolError:
+                    if time.perf_counter() >= deadline:
+                        raise
+                    time.sleep(0.05)
 
-    def fetch_closed_tickets_range(self, days=7):
-        # Obtener el correo del tecnico desde variables de entorno
-        user_email = os.getenv("GLPI_USER_EMAIL")
-        if not user_email:
-            print("ADVERTENCIA: GLPI_USER_EMAIL no configurado.")
+            try:
+                conn.ping(reconnect=False)
+            except mysql.connector.Error:
+                conn.ping(reconnect=True, attempts=2, delay=1)
+                with self._metrics_lock:
+                    self.metrics["reconnects"] += 1
+        except Exception:
+            with self._metrics_lock:
+                self.metrics["errors"] += 1
+            raise
+
+        wait_ms = (time.perf_counter() - started) * 1000
+        with self._metrics_lock:
+            self.metrics["checkouts"] += 1
+            self.metrics["wait_ms_total"] += wait_ms
+            self.metrics["wait_ms_max"] = max(self.metrics["wait_ms_max"], wait_ms)
+        logger.debug(f"Conexión GLPI obtenida en {wait_ms:.0f}ms.")
+        return conn
+
+    def pool_stats(self):
+        """Métricas del pool: obtenciones, espera promedio/máxima (ms), reconexiones y errores."""
+        with self._metrics_lock:
+            stats = dict(self.metrics)
+        stats["wait_ms_avg"] = stats["wait_ms_total"] / stats["checkouts"] if stats["checkouts"] else 0.0
+        return stats
+
+    # Consulta base de tickets cerrados/resueltos de los técnicos; cada método agrega su filtro en {where}
+    # y {users} filtra por técnico (IN (...) o tabla temporal). Se parte de glpi_tickets_users por
+    # (users_id, type): usa directamente el índice `user` de GLPI. Solo trae entities_id: nombre y ruta
+    # de la entidad se resuelven con la copia local de glpi_entities (ENTITIES_QUERY / LocalDB).
+    TICKETS_QUERY = """
+        SELECT 
+            gt.id AS ticket_id,
+            gt.name AS ticket_title,
+            gt.solvedate,
+            gt.entities_id,
+            CONCAT(gu.realname, ' ', gu.firstname) AS technician_name,
+            gu.id AS technician_id
+        FROM glpi_tickets_users gtu
+        -- type=2 es Tecnico asignado
+        INNER JOIN glpi_tickets gt ON gt.id = gtu.tickets_id
+        INNER JOIN glpi_users gu ON gtu.users_id = gu.id
+        WHERE {users}
+            AND gtu.type = 2
+            AND gt.is_deleted = 0
+            AND gt.status > 4 -- Closed/Solved
+            AND ({where})
+        ORDER BY gt.solvedate ASC, gt.id ASC;
+        """
 
-        query = """
+    # Forma anterior (filtra por correo en cada consulta); solo si no se pudo resolver ningún users_id
+    TICKETS_BY_EMAIL_QUERY = """
         SELECT 
             gt.id AS ticket_id,
             gt.name AS ticket_title,
             gt.solvedate,
             gt.entities_id,
-            ge.name AS entity_name,
-            ge.completename AS entity_fullname,
             CONCAT(gu.realname, ' ', gu.firstname) AS technician_name,
             gu.id AS technician_id
         FROM glpi_tickets gt
-        LEFT JOIN glpi_entities ge ON gt.entities_id = ge.id
+        -- Unir con tickets_users (type=2 es Tecnico asignado)
         INNER JOIN glpi_tickets_users gtu ON gt.id = gtu.tickets_id AND gtu.type = 2
+        -- Unir con usuarios
         INNER JOIN glpi_users gu ON gtu.users_id = gu.id
+        -- Unir con emails de usuarios para filtrar por correo
         INNER JOIN glpi_useremails gue ON gu.id = gue.users_id
         WHERE gt.is_deleted = 0
-            AND gt.status > 4 
-            AND gt.solvedate >= DATE_SUB(CURRENT_DATE(), INTERVAL %s DAY)
-            AND gue.email = %s
-        ORDER BY gt.solvedate ASC;
+            AND gt.status > 4 -- Closed/Solved
+            AND gue.email IN ({emails})
+            AND ({where})
+        ORDER BY gt.solvedate ASC, gt.id ASC;
         """
-        
-        results = []
+
+    # Árbol de entidades completo (pocas filas y cambia poco) para la copia local en LocalDB
+    ENTITIES_QUERY = """
+        SELECT id, name, completename, entities_id AS parent_id
+        FROM glpi_entities
+        ORDER BY id;
+        """
+
+    USER_IDS_QUERY = """
+        SELECT gue.email, gu.id
+        FROM glpi_useremails gue
+        INNER JOIN glpi_users gu ON gu.id = gue.users_id
+        WHERE gue.email IN ({emails}) AND gu.is_deleted = 0
+        ORDER BY gue.is_default ASC, gu.id DESC;
+        """
+
+    # Tablas temporales de técnicos y de tickets excluidos (por sesión; el pool las descarta al
+    # devolver la conexión)
+    TECHNICIANS_TEMP_TABLE = "tmp_timesheet_technicians"
+    EXCLUDE_TEMP_TABLE = "tmp_timesheet_exclude"
+    EXCLUDE_PAIRS_TEMP_TABLE = "tmp_timesheet_exclude_pairs"
+    TEMP_TABLE_COLUMNS = {
+        TECHNICIANS_TEMP_TABLE: ("id",),
+        EXCLUDE_TEMP_TABLE: ("id",),
+        EXCLUDE_PAIRS_TEMP_TABLE: ("users_id", "id"),
+    }
+
+    # Clave en app_state de la marca de agua de ingesta (última solvedate / último ID traídos)
+    WATERMARK_KEY = "glpi_watermark"
+
+    @staticmethod
+    def _env_list(name):
+        return [item.strip() for item in os.getenv(name, "").split(",") if item.strip()]
+
+    def technician_emails(self):
+        """Correos de los técnicos: GLPI_USER_EMAILS (lista separada por comas) o el único GLPI_USER_EMAIL."""
+        if self.user_emails:
+            return list(self.user_emails)
+        return [self.user_email] if self.user_email else []
+
+    def is_multi_technician(self):
+        return len(self.technician_emails()) + len(self.user_ids) > 1
+
+    def resolve_user_ids(self, emails):
+        """
+        {correo: glpi_users.id} de los correos dados. Cada correo se resuelve una vez (una sola consulta
+        para todos los que falten) y se cachea en LocalDB (app_state) por GLPI_USER_CACHE_TTL_HOURS horas.
+        Los correos sin usuario GLPI activo no aparecen en el resultado.
+        """
+        resolved, missing = {}, []
+        for email in emails:
+            cached = None
+            if self.local_db:
+                cached = self.local_db.load_state(f"glpi_user_id:{email.lower()}", max_age_hours=self.user_cache_ttl_hours)
+            if cached:
+                resolved[email] = int(cached)
+            else:
+                missing.append(email)
+        if not missing:
+            return resolved
+
+        conn = None
+        cursor = None
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            placeholders = ",".join(["%s"] * len(missing))
+            cursor.execute(self.USER_IDS_QUERY.format(emails=placeholders), tuple(missing))
+            rows = cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Error resolving GLPI user ids for {', '.join(missing)}: {e}")
+            return resolved
+        finally:
+            if cursor: cursor.close()
+            if conn: conn.close()
+
+        # Ordenadas de menor a mayor prioridad: la última fila de cada correo (email por defecto) gana
+        found = {email.lower(): int(user_id) for email, user_id in rows}
+        for email in missing:
+            user_id = found.get(email.lower())
+            if user_id is None:
+                logger.warning(f"No existe un usuario GLPI activo con el correo {email}.")
+                continue
+            logger.info(f"Usuario GLPI {email} resuelto a users_id={user_id}.")
+            resolved[email] = user_id
+            if self.local_db:
+                self.local_db.save_state(f"glpi_user_id:{email.lower()}", user_id)
+        return resolved
+
+    def resolve_user_id(self, user_email):
+        """GLPI_USER_EMAIL -> glpi_users.id (cacheado, ver resolve_user_ids). None si no se pudo resolver."""
+        if not user_email:
+            return None
+        return self.resolve_user_ids([user_email]).get(user_email)
+
+    # Si no se resolvió ningún técnico (p.ej. GLPI caído) se reintenta como mucho cada tantos segundos
+    TECHNICIANS_RETRY_SECONDS = 300
+
+    def technicians(self, refresh=False):
+        """
+        {users_id: etiqueta} de todos los técnicos configurados: correos resueltos (etiqueta = correo)
+        más los IDs de GLPI_USER_IDS (etiqueta = el ID como texto). Se resuelve una vez y se reutiliza
+        por GLPI_USER_CACHE_TTL_HOURS horas (o hasta 'refresh'), sin ir a MySQL en cada consulta.
+        """
+        cached = self._technicians
+        ttl = self.user_cache_ttl_hours * 3600 if cached else self.TECHNICIANS_RETRY_SECONDS
+        if cached is not None and not refresh and time.monotonic() - self._technicians_at < ttl:
+            return dict(cached)
+
+        result = {user_id: email for email, user_id in self.resolve_user_ids(self.technician_emails()).items()}
+        for raw in self.user_ids:
+            try:
+                result.setdefault(int(raw), raw)
+            except ValueError:
+                logger.warning(f"GLPI_USER_IDS contiene un valor no numérico: {raw}")
+        self._technicians, self._technicians_at = result, time.monotonic()
+        return dict(result)
+
+    def primary_technician_id(self):
+        """users_id de GLPI_USER_EMAIL (el técnico de la cuenta por defecto) o None."""
+        for user_id, label in self.technicians().items():
+            if self.user_email and label == self.user_email:
+                return user_id
+        return None
+
+    def _id_filter(self, column, ids, negate, temp_table, temp_min):
+        """
+        Filtro '{column} [NOT] IN (...)': lista de parámetros si es corta, o subconsulta sobre una tabla
+        temporal si tiene 'temp_min' o más IDs. Devuelve (SQL, parámetros, {tabla: filas}).
+        """
+        op = "NOT IN" if negate else "IN"
+        if len(ids) >= temp_min:
+            return f"{column} {op} (SELECT id FROM {temp_table})", (), {temp_table: [(v,) for v in ids]}
+        return f"{column} {op} ({','.join(['%s'] * len(ids))})", tuple(ids), {}
+
+    def _exclusion_filter(self, exclude_ids):
+        """
+        Filtro de tickets ya conocidos. 'exclude_ids' es un conjunto de IDs (se descartan para cualquier
+        técnico) o {users_id: IDs} (solo se descarta la fila de ese técnico: un ticket compartido puede
+        estar registrado para uno y faltarle a otro). Devuelve (SQL, parámetros, {tabla: filas}).
+        """
+        if not isinstance(exclude_ids, dict):
+            return self._id_filter(
+                "gt.id", sorted(exclude_ids), True, self.EXCLUDE_TEMP_TABLE, self.exclude_temp_table_min
+            )
+        pairs = sorted((int(user_id), int(i)) for user_id, ids in exclude_ids.items() for i in ids)
+        if len(pairs) >= self.exclude_temp_table_min:
+            table = self.EXCLUDE_PAIRS_TEMP_TABLE
+            return f"(gtu.users_id, gt.id) NOT IN (SELECT users_id, id FROM {table})", (), {table: pairs}
+        clauses, args = [], []
+        for user_id, ids in sorted(exclude_ids.items()):
+            if ids:
+                clauses.append(f"(gtu.users_id = %s AND gt.id IN ({','.join(['%s'] * len(ids))}))")
+                args.extend([int(user_id)] + sorted(int(i) for i in ids))
+        return f"NOT ({' OR '.join(clauses)})", tuple(args), {}
+
+    def _ticket_query(self, where, params, exclude_ids=None):
+        """
+        (SQL, parámetros, {tabla temporal: filas}) de la consulta de tickets de todos los técnicos en una
+        sola consulta: por users_id si se pudo resolver alguno, si no por correo. Los 'exclude_ids'
+        (tickets que ya están en la base local, ver _exclusion_filter) se descartan en el servidor.
+        """
+        temp_tables = {}
+        if isinstance(exclude_ids, dict):
+            exclude_ids = {user_id: ids for user_id, ids in exclude_ids.items() if ids}
+        if exclude_ids:
+            exclusion, exclude_args, temp = self._exclusion_filter(exclude_ids)
+            where, params = f"({where}) AND {exclusion}", tuple(params) + exclude_args
+            temp_tables.update(temp)
+
+        user_ids = sorted(self.technicians())
+        if not user_ids:
+            emails = self.technician_emails() or [None]
+            query = self.TICKETS_BY_EMAIL_QUERY.format(emails=",".join(["%s"] * len(emails)), where=where)
+            return query, tuple(emails) + tuple(params), temp_tables
+
+        users, user_args, temp = self._id_filter(
+            "gtu.users_id", user_ids, False, self.TECHNICIANS_TEMP_TABLE, self.technicians_temp_table_min
+        )
+        temp_tables.update(temp)
+        return self.TICKETS_QUERY.format(users=users, where=where), user_args + tuple(params), temp_tables
+
+    def _execute_tickets(self, cursor, query, args, temp_tables):
+        """Ejecuta la consulta de tickets, cargando antes las tablas temporales que use."""
+        for table, rows in temp_tables.items():
+            columns = self.TEMP_TABLE_COLUMNS[table]
+            definition = ", ".join(f"{c} INT UNSIGNED NOT NULL" for c in columns)
+            cursor.execute(
+                f"CREATE TEMPORARY TABLE IF NOT EXISTS {table} ({definition}, PRIMARY KEY ({', '.join(columns)}))"
+            )
+            cursor.execute(f"DELETE FROM {table}")
+            insert = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+            for i in range(0, len(rows), self.fetch_chunk_size):
+                cursor.executemany(insert, rows[i:i + self.fetch_chunk_size])
+        # Pasar los parametros de forma segura
+        cursor.execute(query, args)
+
+    def _fetch_tickets(self, where, params, label, exclude_ids=None):
+        query, args, temp_tables = self._ticket_query(where, params, exclude_ids)
         conn = None
         cursor = None
         try:
             conn = self.get_connection()
             cursor = conn.cursor(dictionary=True)
-            cursor.execute(query, (days, user_email))
+            self._execute_tickets(cursor, query, args, temp_tables)
             return cursor.fetchall()
         except Exception as e:
-            print(f"Error fetching tickets range: {e}")
+            logger.error(f"Error fetching {label}: {e}")
             return []
         finally:
             if cursor: cursor.close()
             if conn: conn.close()
 
+    def _stream_tickets(self, where, params, label, chunk_size=None, exclude_ids=None):
+        """
+        Generador de listas de hasta 'chunk_size' filas con un cursor sin buffer: el servidor envía el
+        resultado a medida que se lee, sin materializarlo en el cliente. Un hilo lector trae el bloque
+        siguiente mientras el consumidor procesa el actual (a lo sumo dos bloques en memoria).
+        Ante un error se corta el flujo y la excepción se relanza al consumidor (lo ya entregado queda
+        entregado): un flujo truncado no se confunde con uno completo.
+        """
+        chunk_size = chunk_size or self.fetch_chunk_size
+        query, args, temp_tables = self._ticket_query(where, params, exclude_ids)
+        chunks = queue.Queue(maxsize=1)
+        stop = threading.Event()
+        done = object()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    chunks.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def reader():
+            conn = None
+            cursor = None
+            try:
+                conn = self.get_connection()
+                cursor = conn.cursor(dictionary=True, buffered=False)
+                self._execute_tickets(cursor, query, args, temp_tables)
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows or not put(rows):
+                        break
+            except Exception as e:
+                logger.exception(f"Error streaming {label}: {e}")
+                put(e)
+            finally:
+                try:
+                    # Si el consumidor cortó antes, descartar lo que quede sin leer antes de devolver la conexión
+                    if conn: conn.consume_results()
+                except Exception:
+                    pass
+                if cursor:
+                    try:
+                        cursor.close()
+                    except Exception:
+                        pass
+                if conn: conn.close()
+                put(done)
+
+        thread = threading.Thread(target=reader, name="glpi-stream", daemon=True)
+        thread.start()
+        try:
+            while True:
+                rows = chunks.get()
+                if rows is done:
+                    break
+                if isinstance(rows, Exception):
+                    raise rows
+                yield rows
+        finally:
+            stop.set()
+            thread.join(timeout=self.pool_timeout)
+
+    def fetch_closed_tickets_range(self, days=7, exclude_ids=None):
+        return self._fetch_tickets(
+            "gt.solvedate >= DATE_SUB(CURRENT_DATE(), INTERVAL %s DAY)", (days,), "tickets range", exclude_ids
+        )
+
+    def iter_closed_tickets_range(self, days=7, chunk_size=None, exclude_ids=None):
+        """
+        Como fetch_closed_tickets_range pero en bloques, con memoria acotada para rangos largos.
+        'exclude_ids' (IDs ya procesados o en cola, en total o por técnico) se filtran en MySQL y no
+        viajan por la red.
+        """
+        return self._stream_tickets(
+            "gt.solvedate >= DATE_SUB(CURRENT_DATE(), INTERVAL %s DAY)", (days,), "tickets range",
+            chunk_size, exclude_ids
+        )
+
     def fetch_closed_tickets_today(self):
-        # Obtener el correo del tecnico desde variables de entorno
-        user_email = os.getenv("GLPI_USER_EMAIL")
-        if not user_email:
-            print("ADVERTENCIA: GLPI_USER_EMAIL no configurado. La consulta podría fallar o traer datos incorrectos.")
+        return self._fetch_tickets("DATE(gt.solvedate) = CURRENT_DATE()", (), "tickets")
 
-        query = """
-        SELECT 
-            gt.id AS ticket_id,
-            gt.name AS ticket_title,
-            gt.solvedate,
-            gt.entities_id,
-            ge.name AS entity_name,
-            ge.completename AS entity_fullname,
-            CONCAT(gu.realname, ' ', gu.firstname) AS technician_name,
-            gu.id AS technician_id
-        FROM glpi_tickets gt
-        LEFT JOIN glpi_entities ge ON gt.entities_id = ge.id
-        -- Unir con tickets_users (type=2 es Tecnico asignado)
-        INNER JOIN glpi_tickets_users gtu ON gt.id = gtu.tickets_id AND gtu.type = 2
-        -- Unir con usuarios
-        INNER JOIN glpi_users gu ON gtu.users_id = gu.id
-        -- Unir con emails de usuarios para filtrar por correo
-        INNER JOIN glpi_useremails gue ON gu.id = gue.users_id
-        WHERE gt.is_deleted = 0
-            AND gt.status > 4 -- Closed/Solved
-            AND DATE(gt.solvedate) = CURRENT_DATE()
-            AND gue.email = %s
-        ORDER BY gt.solvedate ASC;
+    def fetch_closed_tickets_since_watermark(self):
         """
-        
-        results = []
+        Trae solo los tickets resueltos (o reabiertos y vueltos a resolver: GLPI actualiza solvedate)
+        después de la marca de agua persistida, retrocediendo 'overlap' minutos para absorber
+        desfasajes de reloj y commits tardíos. Lo que cae en el solapamiento ya está procesado o en
+        cola y se descarta al encolar. Hay una marca por técnico y se lee desde la más atrasada; un
+        técnico sin marca arranca desde el inicio del día (como Rutina A).
+        La marca NO se avanza aquí: hay que llamar a advance_watermark() después de encolar.
+        """
+        marks = self.load_watermarks()
+        if not marks:
+            return self.fetch_closed_tickets_today()
+
+        try:
+            today = (datetime.now().strftime("%Y-%m-%d 00:00:00"), 0)
+            mark = min(
+                (str(marks[str(user_id)]["solvedate"])[:19], int(marks[str(user_id)].get("ticket_id", 0)))
+                if str(user_id) in marks else today
+                for user_id in set(self.technicians()) | set(map(int, marks))
+            )
+            since = datetime.strptime(mark[0], "%Y-%m-%d %H:%M:%S")
+        except Exception as e:
+            logger.warning(f"Marca de agua inválida ({marks}): {e}. Se usa el día actual.")
+            return self.fetch_closed_tickets_today()
+        if self.watermark_overlap_minutes > 0:
+            since -= timedelta(minutes=self.watermark_overlap_minutes)
+            return self._fetch_tickets("gt.solvedate >= %s", (since,), "tickets since watermark")
+
+        # Sin solapamiento: paginación exacta por clave (solvedate, id)
+        return self._fetch_tickets(
+            "gt.solvedate > %s OR (gt.solvedate = %s AND gt.id > %s)",
+            (since, since, mark[1]),
+            "tickets since watermark"
+        )
+
+    def fetch_entities(self):
+        """Árbol de entidades de GLPI (id, name, completename, parent_id) para la copia local."""
         conn = None
         cursor = None
         try:
             conn = self.get_connection()
             cursor = conn.cursor(dictionary=True)
-            # Pasar el parametro de email de forma segura
-            cursor.execute(query, (user_email,))
-            rows = cursor.fetchall()
-            
-            return rows
-            
+            cursor.execute(self.ENTITIES_QUERY)
+            return cursor.fetchall()
         except Exception as e:
-            print(f"Error fetching tickets: {e}")
+            logger.error(f"Error fetching GLPI entities: {e}")
             return []
         finally:
             if cursor: cursor.close()
             if conn: conn.close()
 
+    def load_watermarks(self):
+        """
+        {users_id (texto): {"solvedate", "ticket_id"}} de la ingesta de GLPI. La marca única de versiones
+        anteriores vale como marca de cada técnico configurado.
+        """
+        state = self.local_db.load_state(self.WATERMARK_KEY) if self.local_db else None
+        if not state:
+            return {}
+        if "solvedate" in state:
+            return {str(user_id): state for user_id in self.technicians()}
+        return state
+
+    def advance_watermark(self, tickets, held=()):
+        """
+        Avanza la marca de agua de cada técnico al (solvedate, id) máximo de 'tickets' (nunca retrocede).
+        El lote es todo lo resuelto desde la marca, así que también avanzan los técnicos sin tickets en
+        él; los de 'held' (sus tickets no se pudieron encolar) conservan la suya.
+        """
+        if not self.local_db or not tickets:
+            return
+        best = max(
+            ((str(t["solvedate"])[:19], int(t["ticket_id"])) for t in tickets if t.get("solvedate")),
+            default=None
+        )
+        if best is None:
+            return
+        user_ids = set(self.technicians()) | {t.get("technician_id") for t in tickets}
+        marks = self.load_watermarks()
+        updated = dict(marks)
+        for user_id in user_ids - set(held) - {None, 0}:
+            current = marks.get(str(user_id)) or {}
+            if best > (str(current.get("solvedate", "")), int(current.get("ticket_id", 0))):
+                updated[str(user_id)] = {"solvedate": best[0], "ticket_id": best[1]}
+        if updated != marks:
+            self.local_db.save_state(self.WATERMARK_KEY, updated)
+
 if __name__ == "__main__":
     from dotenv import load_dotenv
     
@@ -151,14 +584,15 @@ if __name__ == "__main__":
                 print("-" * 30)
                 for t in tickets:
                     print(f"ID: {t['ticket_id']} | {t['ticket_title'][:50]}...")
-                    print(f"   - Entidad: {t['entity_name']} | Tecnico: {t['technician_name']}")
+                    print(f"   - Entidad: {t['entities_id']} | Tecnico: {t['technician_name']}")
                 print("-" * 30)
             else:
                 print("No se encontraron tickets cerrados hoy.")
                 print("Asegurate de que los tickets tengan 'Solved Date' con fecha de hoy y el tecnico coincida con el email.")
                 
             conn.close()
-            print("\nConexion cerrada correctamente.")
+            print("\nConexion devuelta al pool correctamente.")
+            print(f"Metricas del pool: {handler.pool_stats()}")
         else:
             print("ERROR: El driver no reportó errores pero la conexión no está activa.")
             
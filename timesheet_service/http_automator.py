@@ -0,0 +1,358 @@
+import os
+import json
+import logging
+from typing import Dict, Any, Optional, List, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import tracing
+import xtiming_html
+import xtiming_ui
+from web_automator import WebAutomator, retry_action
+
+logger = logging.getLogger("HttpBot")
+
+
+class HttpAutomator:
+    """
+    Motor alternativo de registro en xtiming sin navegador.
+    Mantiene el mismo contrato que WebAutomator (start_browser / close_browser / fill_timesheet_entry)
+    pero envía el formulario de /timesheet/create directamente con una sesión HTTP reutilizable.
+    """
+    # Reutilizamos los mismos ids de campos que el motor de navegador
+    SELECTORS = xtiming_ui.SELECTORS
+    _ticket_signature = WebAutomator._ticket_signature
+    _entries_list_params = staticmethod(WebAutomator._entries_list_params)
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None, credentials: Optional[Tuple[str, str]] = None):
+        self.config = config or {}
+        self.user = os.getenv("XTIMING_USER")
+        self.password = os.getenv("XTIMING_PASSWORD")
+        if credentials:
+            self.user, self.password = credentials
+        self.base_url = os.getenv("XTIMING_URL", "https://xtiming.intelix.biz/index.php/es")
+
+        app_cfg = self.config.get("app", {})
+        self.timeout = app_cfg.get("http_timeout_seconds", 30)
+
+        # Mismo archivo de sesión que el motor de navegador (formato storage_state de Playwright)
+        self.persist_session = app_cfg.get("persist_session", True)
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        self.session_state_path = os.path.join(base_dir, "data", WebAutomator._session_filename(credentials and self.user))
+
+        defaults = self.config.get("defaults", {})
+        self.default_client = defaults.get("client_fallback", "Intelix")
+        self.default_project = defaults.get("project_fallback", "Gestión - Intelix")
+        self.default_activity = defaults.get("activity", "Soporte")
+        self.default_tag = defaults.get("tag", "Soporte")
+
+        self.session: Optional[requests.Session] = None
+        self._form: Optional[Dict[str, Any]] = None
+        # Selects ya resueltos por ticket: los sub-bloques siguientes solo cambian fechas y descripción
+        self._ticket_fields: Dict[tuple, Dict[str, List[str]]] = {}
+
+        self.tracer = tracing.StepTracer()
+        self.last_trace: Optional[tracing.SlotTrace] = None
+
+    @staticmethod
+    def _field_id(selector: str) -> str:
+        return selector.lstrip("#")
+
+    # --- Ciclo de vida (mismos nombres que WebAutomator para poder intercambiarlos) ---
+
+    def start_browser(self):
+        if self.session: return
+
+        logger.info("Iniciando sesión HTTP (sin navegador)...")
+        session = requests.Session()
+        # Pool de conexiones keep-alive contra xtiming
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update({"User-Agent": "Mozilla/5.0 (X11; Linux x86_64) timesheet-service"})
+        self.session = session
+
+        try:
+            if self._load_session() and self._session_is_valid():
+                logger.info("Sesión persistida válida. Se omite el login.")
+                return
+            self.login()
+            self._save_session()
+        except Exception as e:
+            logger.error(f"Error crítico iniciando sesión HTTP: {e}")
+            self.close_browser()
+            raise e
+
+    def _load_session(self) -> bool:
+        """Carga las cookies guardadas (storage_state) en la sesión HTTP."""
+        if not self.persist_session or not os.path.exists(self.session_state_path):
+            return False
+        try:
+            with open(self.session_state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            cookies = state.get("cookies", [])
+            for c in cookies:
+                self.session.cookies.set(c["name"], c["value"], domain=c.get("domain"), path=c.get("path", "/"))
+            return bool(cookies)
+        except Exception as e:
+            logger.debug(f"No se pudo cargar la sesión persistida: {e}")
+            return False
+
+    def _session_is_valid(self) -> bool:
+        try:
+            resp = self.session.get(f"{self.base_url}/timesheet/", allow_redirects=False, timeout=self.timeout)
+            # Una sesión expirada redirige a /login
+            return resp.status_code == 200
+        except Exception as e:
+            logger.debug(f"No se pudo validar la sesión persistida: {e}")
+            return False
+
+    def _save_session(self):
+        if not self.persist_session: return
+        try:
+            origins = []
+            if os.path.exists(self.session_state_path):
+                # Conservar el localStorage que haya guardado el motor de navegador
+                with open(self.session_state_path, "r", encoding="utf-8") as f:
+                    origins = json.load(f).get("origins", [])
+            cookies = [{
+                "name": c.name,
+                "value": c.value,
+                "domain": c.domain,
+                "path": c.path,
+                "expires": c.expires if c.expires else -1,
+                "httpOnly": bool(c.has_nonstandard_attr("HttpOnly")),
+                "secure": bool(c.secure),
+                "sameSite": "Lax",
+            } for c in self.session.cookies]
+            os.makedirs(os.path.dirname(self.session_state_path), exist_ok=True)
+            with open(self.session_state_path, "w", encoding="utf-8") as f:
+                json.dump({"cookies": cookies, "origins": origins}, f)
+            os.chmod(self.session_state_path, 0o600)
+        except Exception as e:
+            logger.warning(f"No se pudo guardar la sesión: {e}")
+
+    def close_browser(self):
+        logger.info("Cerrando sesión HTTP...")
+        if self.session: self.session.close()
+        self.session = None
+        self._form = None
+        self._ticket_fields = {}
+
+    @retry_action(max_retries=3, delay=2)
+    def login(self):
+        logger.info(f"Iniciando sesión HTTP para usuario {self.user}...")
+        resp = self.session.get(f"{self.base_url}/login", timeout=self.timeout)
+        resp.raise_for_status()
+
+        if "login" not in resp.url:
+            logger.info("Sesión recuperada.")
+            return True
+
+        forms = xtiming_html.parse_forms(resp.text)
+        form = xtiming_html.find_form(forms, field_name="_username")
+        if not form:
+            raise Exception("No se encontró el formulario de login.")
+
+        payload = dict(xtiming_html.default_payload(form))
+        payload["_username"] = self.user
+        payload["_password"] = self.password
+
+        action = xtiming_html.resolve_url(self.base_url, form["attrs"].get("action") or resp.url)
+        resp = self.session.post(action, data=payload, timeout=self.timeout)
+        resp.raise_for_status()
+
+        if "login" in resp.url:
+            raise Exception("Credenciales inválidas o error de carga.")
+
+        logger.info("Login exitoso.")
+        return True
+
+    def _is_saved_redirect(self, location: str) -> bool:
+        """True solo si la redirección va al listado o a un registro (no a /login ni a /create)."""
+        return xtiming_ui.is_saved_url(self.base_url, location)
+
+    # --- Formulario de creación ---
+
+    def _load_create_form(self, force: bool = False) -> Dict[str, Any]:
+        """Descarga y parsea /timesheet/create (token CSRF + opciones de los selects). Se cachea por sesión."""
+        if self._form and not force:
+            return self._form
+
+        url = f"{self.base_url}/timesheet/create"
+        resp = self.session.get(url, timeout=self.timeout)
+        resp.raise_for_status()
+        if "login" in resp.url:
+            # Sesión expirada: volver a autenticar y reintentar una vez
+            self.login()
+            resp = self.session.get(url, timeout=self.timeout)
+            resp.raise_for_status()
+
+        forms = xtiming_html.parse_forms(resp.text)
+        form = xtiming_html.find_form(forms, field_id=self._field_id(self.SELECTORS["ts_customer"]))
+        if not form:
+            raise Exception("No se encontró el formulario de timesheet en /timesheet/create.")
+
+        form["url"] = xtiming_html.resolve_url(self.base_url, form["attrs"].get("action") or resp.url)
+        self._form = form
+        return form
+
+    def _fetch_related_options(self, parent_field: Dict[str, Any], parent_value: str) -> List[Dict[str, Any]]:
+        """
+        Listas dependientes (p.ej. proyectos según cliente): si el select padre declara
+        'data-api-url', se consultan las opciones del hijo por la API del propio xtiming.
+        """
+        api_url = parent_field["attrs"].get("data-api-url")
+        if not api_url or not parent_value:
+            return []
+        url = xtiming_html.resolve_url(self.base_url, api_url.replace("-s-", str(parent_value)))
+        try:
+            resp = self.session.get(url, timeout=self.timeout, headers={"Accept": "application/json"})
+            resp.raise_for_status()
+            return [{"value": str(item.get("id")), "text": item.get("name", ""), "group": item.get("parentTitle")}
+                    for item in resp.json()]
+        except Exception as e:
+            logger.debug(f"No se pudieron obtener opciones dependientes desde {url}: {e}")
+            return []
+
+    def _resolve_select(self, form, selector: str, label: str, group: Optional[str] = None,
+                        parent_selector: Optional[str] = None, parent_value: Optional[str] = None) -> str:
+        field = xtiming_html.get_field(form, self._field_id(selector))
+        if not field:
+            raise Exception(f"Campo {selector} no encontrado en el formulario.")
+
+        value = xtiming_html.resolve_option(field["options"], label, group=group)
+        if value is None and parent_selector:
+            parent = xtiming_html.get_field(form, self._field_id(parent_selector))
+            if parent:
+                value = xtiming_html.resolve_option(self._fetch_related_options(parent, parent_value), label)
+        if value is None:
+            raise Exception(f"Opción '{label}' no encontrada en {selector}.")
+        return value
+
+    def _resolve_ticket_fields(self, form, entry_data: Dict[str, Any]) -> Dict[str, List[str]]:
+        """Resuelve cliente/proyecto/actividad/tags a sus values (una vez por ticket)."""
+        signature = self._ticket_signature(entry_data)
+        if signature in self._ticket_fields:
+            return self._ticket_fields[signature]
+
+        client = entry_data.get('client', self.default_client)
+        project = entry_data.get('project', self.default_project)
+        activity = entry_data.get('activity', self.default_activity)
+        target_tags = entry_data.get('tags', self.default_tag)
+        tags = target_tags if isinstance(target_tags, list) else [target_tags]
+
+        customer_id = self._resolve_select(form, self.SELECTORS["ts_customer"], client)
+        project_id = self._resolve_select(form, self.SELECTORS["ts_project"], project, group=client,
+                                          parent_selector=self.SELECTORS["ts_customer"], parent_value=customer_id)
+        activity_id = self._resolve_select(form, self.SELECTORS["ts_activity"], activity,
+                                           parent_selector=self.SELECTORS["ts_project"], parent_value=project_id)
+
+        fields = {
+            self.SELECTORS["ts_customer"]: [customer_id],
+            self.SELECTORS["ts_project"]: [project_id],
+            self.SELECTORS["ts_activity"]: [activity_id],
+        }
+
+        tags_field = xtiming_html.get_field(form, self._field_id(self.SELECTORS["ts_tags"]))
+        if tags_field is not None:
+            if tags_field["tag"] == "select":
+                fields[self.SELECTORS["ts_tags"]] = [
+                    self._resolve_select(form, self.SELECTORS["ts_tags"], t) for t in tags if t
+                ]
+            else:
+                fields[self.SELECTORS["ts_tags"]] = [",".join(t for t in tags if t)]
+
+        self._ticket_fields[signature] = fields
+        return fields
+
+    def _build_payload(self, form, entry_data: Dict[str, Any]) -> List[tuple]:
+        overrides = {
+            self.SELECTORS["ts_start_time"]: [entry_data["start_time"]],
+            self.SELECTORS["ts_end_time"]: [entry_data["end_time"]],
+            self.SELECTORS["ts_description"]: [entry_data["title"]],
+        }
+        overrides.update(self._resolve_ticket_fields(form, entry_data))
+
+        # ID Ticket (si es numérico)
+        ticket_id = entry_data.get('ticket_id')
+        if ticket_id and str(ticket_id).isdigit():
+            if xtiming_html.get_field(form, self._field_id(self.SELECTORS["ts_ticket_glpi"])) is not None:
+                overrides[self.SELECTORS["ts_ticket_glpi"]] = [str(ticket_id)]
+
+        names = {}
+        for selector, values in overrides.items():
+            field = xtiming_html.get_field(form, self._field_id(selector))
+            if field and field.get("name"):
+                names[field["name"]] = values
+
+        payload = [(k, v) for k, v in xtiming_html.default_payload(form) if k not in names]
+        for name, values in names.items():
+            payload.extend((name, v) for v in values)
+        return payload
+
+    def fetch_existing_entries(self, date_str: str) -> Optional[List[Dict[str, Any]]]:
+        """Registros ya cargados en xtiming para la fecha (YYYY-MM-DD). None si no se pudo consultar."""
+        if not self.session: self.start_browser()
+        try:
+            resp = self.session.get(f"{self.base_url}/timesheet/", params=self._entries_list_params(date_str),
+                                    timeout=self.timeout, allow_redirects=False)
+            if resp.status_code != 200:
+                raise Exception(f"HTTP {resp.status_code} ({resp.headers.get('Location', '')})")
+            entries = xtiming_html.parse_timesheet_entries(resp.text, default_date=date_str)
+            logger.info(f"Registros existentes en xtiming para {date_str}: {len(entries)}")
+            return entries
+        except Exception as e:
+            logger.warning(f"No se pudieron leer los registros existentes de {date_str}: {e}")
+            return None
+
+    def fill_timesheet_entry(self, entry_data: Dict[str, Any]) -> bool:
+        if not self.session: self.start_browser()
+        trace = self.tracer.start(entry_data.get('title', ''))
+        ok = False
+
+        try:
+            logger.info(f"Registrando (HTTP): {entry_data['title']} [{entry_data['start_time']} - {entry_data['end_time']}]")
+
+            for attempt in range(2):
+                form = self._load_create_form()
+                trace.checkpoint("navigate")
+                payload = self._build_payload(form, entry_data)
+                trace.checkpoint("resolve")
+
+                resp = self.session.post(form["url"], data=payload, timeout=self.timeout, allow_redirects=False)
+                trace.checkpoint("save")
+
+                location = resp.headers.get("Location", "")
+                if resp.status_code not in (301, 302, 303):
+                    break
+                # Éxito = redirección al listado o a un registro; cualquier otro destino (p.ej. /login
+                # por sesión expirada) significa que no se guardó
+                if self._is_saved_redirect(location):
+                    logger.info("Redirección detectada. Registro exitoso.")
+                    ok = True
+                    return True
+                self._form = None
+                if attempt:
+                    raise Exception(f"Redirección inesperada tras reintentar: {location or 'sin destino'}")
+                logger.warning(f"Redirección a {location or 'destino vacío'} al guardar: sesión expirada, reintentando tras login.")
+                self.login()
+                self._save_session()
+
+            errors = xtiming_html.parse_errors(resp.text)
+            # El token CSRF pudo expirar: invalidar cache de formulario para el próximo intento
+            self._form = None
+            self._ticket_fields.pop(self._ticket_signature(entry_data), None)
+            raise Exception(f"Error de validación (HTTP {resp.status_code}): {'; '.join(errors) or 'sin detalle'}")
+
+        except Exception as e:
+            logger.error(f"Error registrando ticket (HTTP): {e}")
+            return False
+
+        finally:
+            self.last_trace = trace
+            self.tracer.finish(trace, ok)
+
+if __name__ == "__main__":
+    pass
@@ -1,12 +1,23 @@
 import sqlite3
 import json
 import os
+import threading
+import zlib
 from datetime import datetime
 import logging
 
+import processed_index
+
 logger = logging.getLogger("LocalDB")
 
 class LocalDB:
+    # Ajustes de conexión: WAL permite leer mientras el otro hilo escribe; NORMAL es seguro con WAL
+    BUSY_TIMEOUT_MS = 5000
+    SYNCHRONOUS = "NORMAL"
+    CACHED_STATEMENTS = 128
+    # Tamaño de lote para consultas IN (...) (límite de parámetros de SQLite)
+    IN_CHUNK = 500
+
     def __init__(self, db_path=None):
         if db_path is None:
             base_dir = os.path.dirname(os.path.abspath(__file__))
@@ -16,24 +27,88 @@ class LocalDB:
             self.db_path = os.path.join(data_dir, "local_state.db")
         else:
             self.db_path = db_path
+
+        # Una conexión persistente por hilo (scheduler, bot de Telegram, workers)
+        self._local = threading.local()
+        self._conns_lock = threading.Lock()
+        self._conns = []
+
+        # Índice en memoria de processed_tickets (evita ir a disco en el caso común "no procesado")
+        self._processed = processed_index.ProcessedIndex()
+        # Caché en memoria de glpi_entities (se carga al primer uso y se invalida al reemplazarla)
+        self._entities = None
             
         self._init_db()
+        self._load_processed_index()
 
     def _get_conn(self):
-        return sqlite3.connect(self.db_path)
+        """
+        Devuelve la conexión del hilo actual, creándola la primera vez.
+        Usar con 'with' confirma/revierte la transacción pero NO cierra la conexión.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.db_path,
+                timeout=self.BUSY_TIMEOUT_MS / 1000,
+                cached_statements=self.CACHED_STATEMENTS,
+                check_same_thread=False,  # Solo la usa su hilo; close() puede llamarse desde otro
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={self.SYNCHRONOUS}")
+            conn.execute(f"PRAGMA busy_timeout={self.BUSY_TIMEOUT_MS}")
+            self._local.conn = conn
+            with self._conns_lock:
+                self._conns.append(conn)
+        return conn
+
+    def close_thread_conn(self):
+        """
+        Cierra la conexión del hilo actual (si tiene). La deben llamar los hilos de vida corta
+        (workers del pool) al terminar; si no, su conexión WAL queda abierta hasta close().
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            return
+        self._local.conn = None
+        with self._conns_lock:
+            self._conns = [c for c in self._conns if c is not conn]
+        try:
+            conn.close()
+        except Exception as e:
+            logger.debug(f"Error cerrando conexión SQLite: {e}")
+
+    def close(self):
+        """Cierra todas las conexiones abiertas (de cualquier hilo)."""
+        with self._conns_lock:
+            conns, self._conns = self._conns, []
+        for conn in conns:
+            try:
+                conn.close()
+            except Exception as e:
+                logger.debug(f"Error cerrando conexión SQLite: {e}")
+        self._local = threading.local()
 
     def _init_db(self):
+        self._enable_incremental_vacuum()
         with self._get_conn() as conn:
             cursor = conn.cursor()
             
-            # Tabla de Tickets Pendientes
+            # Tabla de Tickets Pendientes (JSON completo + columnas indexadas para agrupar/contar en SQL)
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS pending_tickets (
                     ticket_id TEXT PRIMARY KEY,
                     data TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    work_date TEXT,
+                    source TEXT,
+                    manual_hours REAL,
+                    entities_id INTEGER,
+                    status TEXT DEFAULT 'pending',
+                    technician_id INTEGER
                 )
             """)
+            self._migrate_pending_columns(conn)
             
             # Tabla de Tickets Procesados (Histórico)
             cursor.execute("""
@@ -43,6 +118,39 @@ class LocalDB:
                 )
             """)
             
+            # Histórico compactado: una fila por semana ISO de procesamiento con los IDs comprimidos
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS processed_archive (
+                    week TEXT PRIMARY KEY,
+                    ticket_count INTEGER NOT NULL,
+                    ticket_ids BLOB NOT NULL,
+                    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+
+            # Journal de slots ya guardados en xtiming (se confirma/limpia al cerrar el día)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS submitted_slots (
+                    ticket_id TEXT NOT NULL,
+                    work_date TEXT NOT NULL,
+                    start_time TEXT NOT NULL,
+                    end_time TEXT NOT NULL,
+                    submitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (ticket_id, work_date, start_time, end_time)
+                )
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_submitted_work_date ON submitted_slots (work_date)")
+
+            # Copia local del árbol de entidades de GLPI (nombre/ruta sin el JOIN en cada consulta)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS glpi_entities (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT,
+                    completename TEXT,
+                    parent_id INTEGER
+                )
+            """)
+
             # Tabla de Estado de la Aplicación (Key-Value Store)
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS app_state (
@@ -57,6 +165,153 @@ class LocalDB:
         # Intentar migración de archivo antiguo .idx si existe
         self._migrate_from_old_idx()
 
+    def _enable_incremental_vacuum(self):
+        """
+        Activa auto_vacuum=INCREMENTAL (necesario para liberar páginas con incremental_vacuum).
+        En una base existente el cambio solo se aplica tras un VACUUM completo, que se hace una vez.
+        """
+        try:
+            conn = self._get_conn()
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+                return
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            has_tables = conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table'").fetchone()[0]
+            if has_tables:
+                logger.info("Convirtiendo local_state.db a auto_vacuum incremental (VACUUM único)...")
+                conn.execute("VACUUM")
+        except Exception as e:
+            logger.error(f"Error enabling incremental vacuum: {e}")
+
+    # Columnas promovidas desde el JSON de pending_tickets (nombre, tipo SQL)
+    PENDING_COLUMNS = [
+        ("work_date", "TEXT"),
+        ("source", "TEXT"),
+        ("manual_hours", "REAL"),
+        ("entities_id", "INTEGER"),
+        ("status", "TEXT DEFAULT 'pending'"),
+        ("technician_id", "INTEGER"),
+    ]
+
+    @staticmethod
+    def ticket_key(ticket):
+        """
+        Clave del ticket en la cola, el journal y los procesados: su ticket_id, salvo las copias de un
+        ticket compartido para un técnico adicional, que traen 'ticket_key' ("<ticket_id>@<users_id>").
+        """
+        return str(ticket.get('ticket_key') or ticket.get('ticket_id'))
+
+    @staticmethod
+    def _pending_row(ticket, default_date=None):
+        """
+        Fila de pending_tickets: (ticket_id, data, work_date, source, manual_hours, entities_id, status, technician_id).
+        work_date y technician_id se guardan siempre resueltos (nunca NULL) para que los filtros por
+        día y por técnico comparen la columna desnuda y usen sus índices:
+        - Un ticket sin fecha se registra el día en que se encoló ('default_date' o hoy).
+        - technician_id 0 = sin técnico (manuales de Telegram, modo de un solo técnico).
+        """
+        source = ticket.get('source') or 'glpi'
+        # Telegram trae target_date; GLPI la fecha de solución
+        raw_date = ticket.get('target_date') if source == 'telegram' else ticket.get('solvedate')
+        work_date = str(raw_date)[:10] if raw_date else (default_date or datetime.now().strftime("%Y-%m-%d"))
+
+        def number(value, cast):
+            try:
+                return cast(value) if value not in (None, "") else None
+            except (TypeError, ValueError):
+                return None
+
+        return (
+            LocalDB.ticket_key(ticket),
+            json.dumps(ticket, default=str),
+            work_date,
+            source,
+            number(ticket.get('manual_hours'), float),
+            number(ticket.get('entities_id'), int),
+            ticket.get('status') or 'pending',
+            number(ticket.get('technician_id'), int) or 0,
+        )
+
+    def _migrate_pending_columns(self, conn):
+        """Agrega las columnas nuevas a bases existentes y las completa desde el JSON de cada fila."""
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(pending_tickets)")}
+        added = [name for name, _ in self.PENDING_COLUMNS if name not in existing]
+        for name, sql_type in self.PENDING_COLUMNS:
+            if name in added:
+                conn.execute(f"ALTER TABLE pending_tickets ADD COLUMN {name} {sql_type}")
+
+        # Si se agregó alguna columna se recalculan todas las filas; si no, solo las aún sin migrar
+        # (o con fecha/técnico sin resolver, de versiones que los dejaban en NULL)
+        where = "" if added else " WHERE source IS NULL OR work_date IS NULL OR technician_id IS NULL"
+        rows = conn.execute(
+            f"SELECT ticket_id, data, date(created_at, 'localtime') FROM pending_tickets{where}"
+        ).fetchall()
+        if rows:
+            logger.info(f"Migrando {len(rows)} tickets pendientes al esquema con columnas...")
+            updates = []
+            for ticket_id, data, created_date in rows:
+                try:
+                    row = self._pending_row(json.loads(data), default_date=created_date)
+                except Exception as e:
+                    logger.warning(f"Ticket pendiente {ticket_id} con JSON inválido: {e}")
+                    continue
+                updates.append(row[2:] + (ticket_id,))
+            conn.executemany(
+                "UPDATE pending_tickets SET work_date = ?, source = ?, manual_hours = ?, entities_id = ?, status = ?, "
+                "technician_id = ? WHERE ticket_id = ?", updates
+            )
+
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_pending_work_date ON pending_tickets (work_date)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_pending_source ON pending_tickets (source)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_pending_status ON pending_tickets (status)")
+        # Cola de un técnico y de un técnico en un día (también sirve para filtrar solo por técnico)
+        conn.execute("DROP INDEX IF EXISTS idx_pending_technician")
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_pending_technician_date ON pending_tickets (technician_id, work_date)"
+        )
+        # Orden de la cola / paginación por clave (created_at, ticket_id)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_pending_created ON pending_tickets (created_at, ticket_id)")
+
+    def _load_processed_index(self):
+        """Carga (o recarga) el índice de procesados completo desde la base."""
+        try:
+            conn = self._get_conn()
+            string_count = conn.execute(
+                "SELECT COUNT(*) FROM processed_tickets WHERE ticket_id GLOB '*[^0-9]*' OR ticket_id GLOB '0?*'"
+            ).fetchone()[0]
+            watermark = conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM processed_tickets").fetchone()[0]
+            cursor = conn.execute("SELECT ticket_id FROM processed_tickets")
+            self._processed.load((row[0] for row in cursor), string_count, watermark, self._iter_archived_ids(conn))
+        except Exception as e:
+            logger.error(f"Error loading processed index: {e}")
+
+    @staticmethod
+    def _pack_ids(ticket_ids):
+        return zlib.compress("\n".join(sorted(ticket_ids)).encode("utf-8"), 9)
+
+    @staticmethod
+    def _unpack_ids(blob):
+        text = zlib.decompress(blob).decode("utf-8")
+        return text.split("\n") if text else []
+
+    def _iter_archived_ids(self, conn):
+        for (blob,) in conn.execute("SELECT ticket_ids FROM processed_archive"):
+            yield from self._unpack_ids(blob)
+
+    def _sync_processed_index(self):
+        """Incorpora al índice las filas nuevas de processed_tickets (propias o de otro proceso) por rowid."""
+        try:
+            cursor = self._get_conn().execute(
+                "SELECT rowid, ticket_id FROM processed_tickets WHERE rowid > ? ORDER BY rowid",
+                (self._processed.watermark,)
+            )
+            for rowid, ticket_id in cursor:
+                self._processed.add(ticket_id)
+                self._processed.watermark = rowid
+        except Exception as e:
+            logger.error(f"Error syncing processed index: {e}")
+        if self._processed.saturated:
+            self._load_processed_index()
+
     def _migrate_from_old_idx(self):
         """Migra IDs de tickets desde archivos legacy (.idx o sin extensión) a SQLite."""
         data_dir = os.path.dirname(self.db_path)
@@ -86,29 +341,159 @@ class LocalDB:
             except Exception as e:
                 logger.error(f"Error durante la migración de {filename}: {e}")
 
+    PENDING_INSERT_SQL = (
+        "INSERT OR REPLACE INTO pending_tickets "
+        "(ticket_id, data, work_date, source, manual_hours, entities_id, status, technician_id) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+    )
+
     def add_pending_ticket(self, ticket_data):
         ticket_id = str(ticket_data.get('ticket_id'))
         try:
             with self._get_conn() as conn:
-                conn.execute(
-                    "INSERT OR REPLACE INTO pending_tickets (ticket_id, data) VALUES (?, ?)",
-                    (ticket_id, json.dumps(ticket_data, default=str))
-                )
+                conn.execute(self.PENDING_INSERT_SQL, self._pending_row(ticket_data))
             return True
         except Exception as e:
             logger.error(f"Error adding pending ticket {ticket_id}: {e}")
             return False
 
-    def get_pending_tickets(self):
+    def add_pending_tickets(self, tickets):
+        """Encola varios tickets en una sola transacción. Devuelve cuántos se guardaron."""
+        rows = [self._pending_row(t) for t in tickets]
+        if not rows:
+            return 0
         try:
             with self._get_conn() as conn:
-                cursor = conn.execute("SELECT data FROM pending_tickets ORDER BY created_at ASC")
+                conn.executemany(self.PENDING_INSERT_SQL, rows)
+            return len(rows)
+        except Exception as e:
+            logger.error(f"Error adding {len(rows)} pending tickets: {e}")
+            return 0
+
+    def _pending_where(self, work_date=None, source=None, technician_id=None):
+        """Cláusula WHERE (y parámetros) para filtrar la cola por fecha de trabajo, origen y/o técnico."""
+        clauses, params = [], []
+        if work_date is not None:
+            clauses.append("work_date = ?")
+            params.append(work_date)
+        if source is not None:
+            clauses.append("source = ?")
+            params.append(source)
+        if technician_id is not None:
+            clauses.append("technician_id = ?")
+            params.append(int(technician_id))
+        return (f" WHERE {' AND '.join(clauses)}" if clauses else ""), params
+
+    def get_pending_tickets(self, work_date=None, technician_id=None):
+        """Tickets en cola (todos, o solo los de una fecha de trabajo YYYY-MM-DD y/o un técnico)."""
+        where, params = self._pending_where(work_date, technician_id=technician_id)
+        try:
+            with self._get_conn() as conn:
+                cursor = conn.execute(
+                    f"SELECT data FROM pending_tickets{where} ORDER BY created_at ASC, ticket_id ASC", params
+                )
                 rows = cursor.fetchall()
                 return [json.loads(row[0]) for row in rows]
         except Exception as e:
             logger.error(f"Error fetching pending tickets: {e}")
             return []
 
+    def get_pending_page(self, limit=10, offset=0, after=None):
+        """
+        Una página de la cola en orden de llegada. Con 'after' (el cursor devuelto por la página anterior)
+        pagina por clave (created_at, ticket_id) sin recorrer las filas previas; si no, usa OFFSET.
+        Devuelve (tickets, cursor_siguiente o None si no hay más).
+        """
+        query = "SELECT data, created_at, ticket_id FROM pending_tickets"
+        params = []
+        if after is not None:
+            query += " WHERE (created_at, ticket_id) > (?, ?)"
+            params.extend(after)
+        query += " ORDER BY created_at ASC, ticket_id ASC LIMIT ?"
+        params.append(limit + 1)
+        if after is None and offset:
+            query += " OFFSET ?"
+            params.append(offset)
+        try:
+            with self._get_conn() as conn:
+                rows = conn.execute(query, params).fetchall()
+        except Exception as e:
+            logger.error(f"Error fetching pending page: {e}")
+            return [], None
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = (rows[-1][1], rows[-1][2]) if has_more and rows else None
+        return [json.loads(r[0]) for r in rows], next_cursor
+
+    def filter_not_pending(self, ticket_ids):
+        """
+        Devuelve (en el mismo orden) los IDs que no están en la cola, consultando por lotes.
+        None si la base falló: una lista vacía significaría "todos ya encolados".
+        """
+        ids = [str(tid) for tid in ticket_ids]
+        queued = set()
+        try:
+            with self._get_conn() as conn:
+                for i in range(0, len(ids), self.IN_CHUNK):
+                    chunk = ids[i:i + self.IN_CHUNK]
+                    placeholders = ",".join("?" * len(chunk))
+                    cursor = conn.execute(
+                        f"SELECT ticket_id FROM pending_tickets WHERE ticket_id IN ({placeholders})", chunk
+                    )
+                    queued.update(row[0] for row in cursor)
+        except Exception as e:
+            logger.error(f"Error filtering pending tickets: {e}")
+            return None
+        return [tid for tid in ids if tid not in queued]
+
+    def get_pending_dates(self, technician_id=None):
+        """[(fecha de trabajo, cantidad)] de la cola (opcionalmente de un técnico), ordenado por fecha."""
+        where, params = self._pending_where(technician_id=technician_id)
+        try:
+            with self._get_conn() as conn:
+                cursor = conn.execute(
+                    f"SELECT work_date, COUNT(*) FROM pending_tickets{where} GROUP BY work_date ORDER BY work_date",
+                    params
+                )
+                return cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Error grouping pending tickets by date: {e}")
+            return []
+
+    def get_pending_technicians(self):
+        """[(technician_id, cantidad)] de la cola; 0 agrupa los tickets sin técnico."""
+        try:
+            with self._get_conn() as conn:
+                cursor = conn.execute(
+                    "SELECT technician_id, COUNT(*) FROM pending_tickets GROUP BY technician_id ORDER BY technician_id"
+                )
+                return cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Error grouping pending tickets by technician: {e}")
+            return []
+
+    def get_pending_ids_by_date(self, work_date, technician_id=None):
+        where, params = self._pending_where(work_date, technician_id=technician_id)
+        try:
+            with self._get_conn() as conn:
+                cursor = conn.execute(
+                    f"SELECT ticket_id FROM pending_tickets{where} ORDER BY created_at ASC, ticket_id ASC", params
+                )
+                return [row[0] for row in cursor]
+        except Exception as e:
+            logger.error(f"Error fetching pending ids for {work_date}: {e}")
+            return []
+
+    def count_pending(self, work_date=None, source=None, technician_id=None):
+        """Cantidad de tickets en cola, opcionalmente filtrada por fecha de trabajo, origen y/o técnico."""
+        where, params = self._pending_where(work_date, source, technician_id)
+        try:
+            with self._get_conn() as conn:
+                return conn.execute(f"SELECT COUNT(*) FROM pending_tickets{where}", params).fetchone()[0]
+        except Exception as e:
+            logger.error(f"Error counting pending tickets: {e}")
+            return 0
+
     def remove_pending_ticket(self, ticket_id):
         try:
             with self._get_conn() as conn:
@@ -125,12 +510,234 @@ class LocalDB:
                     "INSERT OR IGNORE INTO processed_tickets (ticket_id) VALUES (?)",
                     (str(ticket_id),)
                 )
+            self._sync_processed_index()
             return True
         except Exception as e:
             logger.error(f"Error marking ticket {ticket_id} as processed: {e}")
             return False
 
+    def commit_processed(self, ticket_ids):
+        """
+        Marca como procesados y saca de la cola varios tickets en una única transacción atómica
+        (también limpia sus slots del journal).
+        """
+        rows = [(str(tid),) for tid in ticket_ids]
+        if not rows:
+            return True
+        try:
+            with self._get_conn() as conn:
+                conn.executemany("INSERT OR IGNORE INTO processed_tickets (ticket_id) VALUES (?)", rows)
+                conn.executemany("DELETE FROM pending_tickets WHERE ticket_id = ?", rows)
+                conn.executemany("DELETE FROM submitted_slots WHERE ticket_id = ?", rows)
+            self._sync_processed_index()
+            return True
+        except Exception as e:
+            logger.error(f"Error committing {len(rows)} processed tickets: {e}")
+            return False
+
+    def journal_slot(self, ticket_id, work_date, start_time, end_time):
+        """Anota un slot recién guardado en xtiming, antes de que el día se confirme."""
+        try:
+            with self._get_conn() as conn:
+                conn.execute(
+                    "INSERT OR IGNORE INTO submitted_slots (ticket_id, work_date, start_time, end_time) VALUES (?, ?, ?, ?)",
+                    (str(ticket_id), work_date, start_time, end_time)
+                )
+            return True
+        except Exception as e:
+            logger.error(f"Error journaling slot of {ticket_id} ({start_time} - {end_time}): {e}")
+            return False
+
+    def get_journaled_slots(self, work_date):
+        """{(ticket_id, start_time, end_time)} ya guardados en xtiming para la fecha y aún sin confirmar."""
+        try:
+            with self._get_conn() as conn:
+                cursor = conn.execute(
+                    "SELECT ticket_id, start_time, end_time FROM submitted_slots WHERE work_date = ?", (work_date,)
+                )
+                return set(cursor.fetchall())
+        except Exception as e:
+            logger.error(f"Error fetching journaled slots for {work_date}: {e}")
+            return set()
+
+    # Clave en app_state del último refresco completo de glpi_entities
+    ENTITIES_REFRESHED_KEY = "glpi_entities_refreshed"
+
+    def replace_entities(self, entities):
+        """
+        Reemplaza la copia local de glpi_entities por 'entities' (dicts con id, name, completename,
+        parent_id) en una sola transacción y registra la hora del refresco. Devuelve cuántas quedaron.
+        """
+        rows = [
+            (int(e["id"]), e.get("name"), e.get("completename"),
+             int(e["parent_id"]) if e.get("parent_id") is not None else None)
+            for e in entities
+        ]
+        try:
+            with self._get_conn() as conn:
+                conn.execute("DELETE FROM glpi_entities")
+                conn.executemany(
+                    "INSERT INTO glpi_entities (id, name, completename, parent_id) VALUES (?, ?, ?, ?)", rows
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO app_state (key, value) VALUES (?, ?)",
+                    (self.ENTITIES_REFRESHED_KEY, json.dumps(len(rows)))
+                )
+            self._entities = None
+            return len(rows)
+        except Exception as e:
+            logger.error(f"Error replacing GLPI entities: {e}")
+            return 0
+
+    def get_entity(self, entities_id):
+        """Entidad de la copia local ({'id', 'name', 'completename', 'parent_id'}) o None si no está."""
+        entities = self._entities
+        if entities is None:
+            try:
+                with self._get_conn() as conn:
+                    cursor = conn.execute("SELECT id, name, completename, parent_id FROM glpi_entities")
+                    entities = {
+                        row[0]: {"id": row[0], "name": row[1], "completename": row[2], "parent_id": row[3]}
+                        for row in cursor
+                    }
+            except Exception as e:
+                logger.error(f"Error loading GLPI entities: {e}")
+                return None
+            self._entities = entities
+        try:
+            return entities.get(int(entities_id))
+        except (TypeError, ValueError):
+            return None
+
+    def get_known_glpi_ids(self, days):
+        """
+        IDs numéricos de GLPI que ya no hace falta traer para una ventana de 'days' días: los procesados
+        en ese lapso (más un día de margen; un ticket se procesa después de resolverse) y los que están
+        en cola. Devuelve {technician_id: IDs}: None agrupa las claves simples ("123", del técnico
+        principal) y cada técnico adicional las suyas ("123@8", ver ticket_key). Sirve para excluirlos
+        en la consulta a GLPI; el filtrado local sigue siendo la garantía.
+        """
+        try:
+            with self._get_conn() as conn:
+                cursor = conn.execute(
+                    "SELECT ticket_id FROM processed_tickets WHERE processed_at >= datetime('now', ?) "
+                    "UNION SELECT ticket_id FROM pending_tickets WHERE source = 'glpi'",
+                    (f"-{int(days) + 1} days",)
+                )
+                known = {}
+                for (key,) in cursor:
+                    ticket_id, _, technician = str(key).partition("@")
+                    value = processed_index.as_int_id(ticket_id)
+                    owner = processed_index.as_int_id(technician) if technician else None
+                    if value is not None and (owner is not None or not technician):
+                        known.setdefault(owner, set()).add(value)
+                return known
+        except Exception as e:
+            logger.error(f"Error fetching known GLPI ids: {e}")
+            return {}
+
+    def filter_unprocessed(self, ticket_ids):
+        """
+        Devuelve (en el mismo orden) los IDs que aún no están procesados. Resuelve con el índice en
+        memoria y solo consulta la base, por lotes, los IDs de texto que el filtro de Bloom no descarta.
+        None si la base falló (no se puede saber cuáles faltan).
+        """
+        ids = [str(tid) for tid in ticket_ids]
+        self._sync_processed_index()
+
+        processed, to_check = set(), []
+        for tid in ids:
+            known = self._processed.lookup(tid)
+            if known:
+                processed.add(tid)
+            elif known is None:
+                to_check.append(tid)
+
+        try:
+            with self._get_conn() as conn:
+                for i in range(0, len(to_check), self.IN_CHUNK):
+                    chunk = to_check[i:i + self.IN_CHUNK]
+                    placeholders = ",".join("?" * len(chunk))
+                    cursor = conn.execute(
+                        f"SELECT ticket_id FROM processed_tickets WHERE ticket_id IN ({placeholders})", chunk
+                    )
+                    processed.update(row[0] for row in cursor)
+        except Exception as e:
+            logger.error(f"Error filtering processed tickets: {e}")
+            return None
+        return [tid for tid in ids if tid not in processed]
+
+    def archive_processed(self, retention_weeks):
+        """
+        Compacta en processed_archive (una fila por semana ISO) los procesados de más de 'retention_weeks'
+        semanas y los borra de processed_tickets. Los IDs siguen en el índice en memoria, así que un ticket
+        archivado nunca vuelve a ingresar. Devuelve cuántos tickets se archivaron.
+        """
+        try:
+            conn = self._get_conn()
+            # Nunca se archiva la fila de rowid máximo: sin AUTOINCREMENT SQLite reutilizaría rowids
+            # por debajo de la marca de agua del índice y otras instancias no verían esas filas nuevas.
+            rows = conn.execute(
+                "SELECT ticket_id, processed_at FROM processed_tickets "
+                "WHERE processed_at < datetime('now', ?) "
+                "AND rowid < (SELECT MAX(rowid) FROM processed_tickets)",
+                (f"-{int(retention_weeks) * 7} days",)
+            ).fetchall()
+            if not rows:
+                return 0
+
+            by_week = {}
+            for ticket_id, processed_at in rows:
+                try:
+                    year, week, _ = datetime.strptime(str(processed_at)[:10], "%Y-%m-%d").isocalendar()
+                    key = f"{year}-W{week:02d}"
+                except ValueError:
+                    key = "unknown"
+                by_week.setdefault(key, set()).add(ticket_id)
+
+            with conn:
+                for week, ids in by_week.items():
+                    existing = conn.execute("SELECT ticket_ids FROM processed_archive WHERE week = ?", (week,)).fetchone()
+                    if existing:
+                        ids |= set(self._unpack_ids(existing[0]))
+                    conn.execute(
+                        "INSERT OR REPLACE INTO processed_archive (week, ticket_count, ticket_ids) VALUES (?, ?, ?)",
+                        (week, len(ids), self._pack_ids(ids))
+                    )
+                archived = [(row[0],) for row in rows]
+                conn.executemany("DELETE FROM processed_tickets WHERE ticket_id = ?", archived)
+                # Journal huérfano de tickets ya confirmados/archivados
+                conn.executemany("DELETE FROM submitted_slots WHERE ticket_id = ?", archived)
+
+            self._load_processed_index()
+            logger.info(f"Archivados {len(rows)} tickets procesados en {len(by_week)} semanas.")
+            return len(rows)
+        except Exception as e:
+            logger.error(f"Error archiving processed tickets: {e}")
+            return 0
+
+    def run_maintenance(self, retention_weeks, vacuum_pages=0):
+        """
+        Retención + compactación: archiva procesados viejos, libera páginas (incremental_vacuum;
+        0 = todas las libres) y trunca el WAL. Devuelve un resumen para logs/Telegram.
+        """
+        archived = self.archive_processed(retention_weeks)
+        try:
+            conn = self._get_conn()
+            free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            conn.execute(f"PRAGMA incremental_vacuum({int(vacuum_pages)})").fetchall()
+            free_after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+            conn.execute("PRAGMA optimize")
+        except Exception as e:
+            logger.error(f"Error running local DB maintenance: {e}")
+            return {"archived": archived, "freed_pages": 0}
+        return {"archived": archived, "freed_pages": free_before - free_after}
+
     def is_processed(self, ticket_id):
+        known = self._processed.lookup(ticket_id)
+        if known is not None:
+            return known
         try:
             with self._get_conn() as conn:
                 cursor = conn.execute(
@@ -152,10 +759,17 @@ class LocalDB:
         except Exception as e:
             logger.error(f"Error saving state {key}: {e}")
 
-    def load_state(self, key):
+    def load_state(self, key, max_age_hours=None):
+        """Valor guardado con save_state; con 'max_age_hours' se ignora si es más viejo (caché con TTL)."""
         try:
             with self._get_conn() as conn:
-                cursor = conn.execute("SELECT value FROM app_state WHERE key = ?", (key,))
+                if max_age_hours is None:
+                    cursor = conn.execute("SELECT value FROM app_state WHERE key = ?", (key,))
+                else:
+                    cursor = conn.execute(
+                        "SELECT value FROM app_state WHERE key = ? AND updated_at >= datetime('now', ?)",
+                        (key, f"-{float(max_age_hours) * 3600:.0f} seconds")
+                    )
                 row = cursor.fetchone()
                 if row:
                     return json.loads(row[0])
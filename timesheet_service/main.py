@@ -74,7 +74,7 @@ def main():
     # Iniciar Bot de Telegram en un hilo separado solo si NO estamos en modo de una sola ejecución (sweep/sync)
     if not (args.sweep or args.sync_week):
         try:
-            tg_service = TelegramService(config)
+            tg_service = TelegramService(config, scheduler=service)
             tg_thread = threading.Thread(target=tg_service.run_bot, daemon=True)
             tg_thread.start()
             logger.info("Bot de Telegram lanzado en hilo secundario.")
@@ -0,0 +1,119 @@
+import math
+import hashlib
+import threading
+import logging
+from typing import Iterable
+
+logger = logging.getLogger("ProcessedIndex")
+
+
+def as_int_id(ticket_id):
+    """ID numérico de un ticket, o None si no es un entero canónico."""
+    text = str(ticket_id).strip()
+    # Solo enteros canónicos: '007' se guarda como texto y no debe confundirse con 7
+    return int(text) if text.isdigit() and text == str(int(text)) else None
+
+
+class BloomFilter:
+    """
+    Filtro de Bloom simple sobre un bytearray. Sin falsos negativos: si dice "no está",
+    el elemento nunca fue agregado; si dice "puede estar" hay que confirmarlo en la base.
+    """
+    def __init__(self, capacity: int = 10000, error_rate: float = 0.01):
+        capacity = max(1, capacity)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        # Doble hashing (Kirsch-Mitzenmacher): k posiciones a partir de dos hashes
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item: str):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class ProcessedIndex:
+    """
+    Índice en memoria de tickets procesados:
+    - IDs numéricos de GLPI en un set de enteros (respuesta exacta, sin tocar la base).
+    - IDs de texto (TEL-..., BATCH-...) en un filtro de Bloom: "no está" es definitivo,
+      "puede estar" se confirma en SQLite.
+    - IDs de texto archivados (processed_archive) en un set exacto: ya no están en
+      processed_tickets, así que no se pueden confirmar con una consulta.
+    El filtro se dimensiona al cargar con margen; cuando se supera su capacidad ('saturated')
+    el dueño debe volver a cargarlo desde la base para mantener la tasa de falsos positivos.
+    """
+    def __init__(self, error_rate: float = 0.01):
+        self._lock = threading.Lock()
+        self.error_rate = error_rate
+        self.numeric = set()
+        self.archived = set()
+        self.string_count = 0
+        self._capacity = 1000
+        self.bloom = BloomFilter(self._capacity, error_rate)
+        # Último rowid de processed_tickets incorporado (para sincronizar cambios de otros procesos)
+        self.watermark = 0
+
+    @property
+    def saturated(self) -> bool:
+        return self.string_count > self._capacity
+
+    def load(self, ticket_ids: Iterable, string_count: int, watermark: int = 0, archived_ids: Iterable = ()):
+        """Reconstruye el índice completo (arranque, filtro saturado o tras archivar)."""
+        capacity = max(1000, string_count * 2)
+        numeric, bloom, strings = set(), BloomFilter(capacity, self.error_rate), 0
+        archived = set()
+        for tid in archived_ids:
+            value = as_int_id(tid)
+            if value is None:
+                archived.add(str(tid))
+            else:
+                numeric.add(value)
+        for tid in ticket_ids:
+            value = as_int_id(tid)
+            if value is None:
+                bloom.add(str(tid))
+                strings += 1
+            else:
+                numeric.add(value)
+        with self._lock:
+            self.numeric, self.bloom, self._capacity, self.string_count = numeric, bloom, capacity, strings
+            self.archived = archived
+            self.watermark = max(self.watermark, watermark)
+        logger.info(
+            f"Índice de procesados cargado: {len(numeric)} numéricos, {strings} de texto, "
+            f"{len(archived)} de texto archivados."
+        )
+
+    def add(self, ticket_id):
+        value = as_int_id(ticket_id)
+        with self._lock:
+            if value is not None:
+                self.numeric.add(value)
+                return
+            self.bloom.add(str(ticket_id))
+            self.string_count += 1
+
+    def add_many(self, ticket_ids: Iterable):
+        for tid in ticket_ids:
+            self.add(tid)
+
+    def lookup(self, ticket_id):
+        """True = procesado, False = no procesado, None = hay que confirmarlo en la base."""
+        value = as_int_id(ticket_id)
+        with self._lock:
+            if value is not None:
+                return value in self.numeric
+            if str(ticket_id) in self.archived:
+                return True
+            return None if str(ticket_id) in self.bloom else False
@@ -1,4 +1,6 @@
 import time
+import asyncio
+import threading
 import schedule
 import os
 import json
@@ -8,7 +10,10 @@ from datetime import datetime
 import db_handler
 import time_manager
 import web_automator
+import http_automator
+import async_web_automator
 import local_db
+import xtiming_html
 
 logger = logging.getLogger("Scheduler")
 
@@ -16,10 +21,22 @@ class SchedulerService:
     def __init__(self, config):
         self._validate_config(config)
         self.config = config
-        self.db = db_handler.DBHandler()
         self.local_db = local_db.LocalDB()
+        self.db = db_handler.DBHandler(local_db=self.local_db)
         self.timer = time_manager.TimeManager(config, self.local_db)
-        self.bot = web_automator.WebAutomator(config)
+        self.bot = self._build_submitter(config)
+
+        # Modo multi-técnico: cola activa (technician_id, None = toda la cola) y bot de cada técnico
+        self._default_bot = self.bot
+        self._technician = None
+        self._credentials = None
+        self._technician_bots = {}
+
+        # Evita dos cargas masivas simultáneas (scheduler + comando de Telegram)
+        self._batch_lock = threading.Lock()
+        # Event loop compartido del proceso (lo registra el bot de Telegram) y tarea async en curso
+        self.loop = None
+        self._batch_task = None
         
         self.entity_map = config.get("entity_map", {})
         self.defaults = config.get("defaults", {})
@@ -42,6 +59,66 @@ class SchedulerService:
             logger.error(f"No se pudo cargar mappings.json: {e}")
             return {"entity_rules": {}, "heuristics": []}
 
+    def _build_submitter(self, config, credentials=None):
+        """Elige el motor de registro en xtiming según config.json (app.submit_engine)."""
+        engine = config.get("app", {}).get("submit_engine", "browser")
+        if engine == "http":
+            logger.info("Motor de registro: HTTP directo (sin navegador).")
+            return http_automator.HttpAutomator(config, credentials)
+        if engine == "async":
+            logger.info("Motor de registro: navegador asyncio (varias páginas en un event loop).")
+            return async_web_automator.AsyncWebAutomator(config, credentials)
+        if engine != "browser":
+            logger.warning(f"Motor de registro desconocido '{engine}'. Usando navegador.")
+        return web_automator.WebAutomator(config, credentials)
+
+    def _xtiming_credentials(self, label):
+        """
+        Credenciales de xtiming de un técnico desde XTIMING_CREDENTIALS, un JSON
+        {"correo o users_id": {"user": ..., "password": ...}}. None si no están configuradas.
+        """
+        try:
+            entry = json.loads(os.getenv("XTIMING_CREDENTIALS") or "{}").get(str(label))
+        except Exception as e:
+            logger.error(f"XTIMING_CREDENTIALS inválido: {e}")
+            return None
+        if not entry or not entry.get("user") or not entry.get("password"):
+            return None
+        return entry["user"], entry["password"]
+
+    def _use_technician(self, technician_id, bot, credentials=None):
+        """Activa la cola y el bot de un técnico (None restablece la cola completa y el bot por defecto)."""
+        self._technician = technician_id
+        self.bot = bot
+        self._credentials = credentials
+
+    def _technician_queues(self):
+        """
+        Recorre las colas a procesar dejando activos el filtro y el bot de cada técnico. Con un solo
+        técnico hay una única cola (la de siempre). En modo multi-técnico cada técnico registra con su
+        propia cuenta; los tickets sin técnico (manuales de Telegram) van con la cuenta por defecto.
+        """
+        if not self.db.is_multi_technician():
+            yield "default"
+            return
+
+        labels = self.db.technicians()
+        for technician_id, count in self.local_db.get_pending_technicians():
+            label = labels.get(technician_id, str(technician_id)) if technician_id else "sin técnico"
+            if not technician_id:
+                self._use_technician(0, self._default_bot)
+            else:
+                credentials = self._xtiming_credentials(label)
+                if not credentials:
+                    logger.warning(f"Sin credenciales de xtiming para {label}: sus {count} tickets siguen pendientes.")
+                    self.send_telegram(f"Sin credenciales de xtiming para {label}. {count} tickets quedan pendientes.")
+                    continue
+                if technician_id not in self._technician_bots:
+                    self._technician_bots[technician_id] = self._build_submitter(self.config, credentials)
+                self._use_technician(technician_id, self._technician_bots[technician_id], credentials)
+            logger.info(f"Procesando cola de {label} ({count} tickets)...")
+            yield label
+
     def _validate_config(self, config):
         """Validación básica de estructura de configuración."""
         required_sections = ["app", "schedule", "defaults", "entity_map"]
@@ -62,13 +139,41 @@ class SchedulerService:
             except Exception as e:
                 logger.error(f"Error enviando Telegram: {e}")
 
+    def _entity_fullname(self, ticket_data):
+        """Ruta completa de la entidad: la del ticket si la trae (colas viejas), si no la copia local."""
+        if ticket_data.get('entity_fullname'):
+            return ticket_data['entity_fullname']
+        entity = self.local_db.get_entity(ticket_data.get('entities_id'))
+        return (entity or {}).get('completename') or ''
+
+    def refresh_entities(self, max_age_hours=None):
+        """
+        Refresca la copia local de glpi_entities si tiene más de 'max_age_hours' horas
+        (por defecto app.entity_refresh_hours; 0 = siempre). Si GLPI no responde se conserva la copia.
+        """
+        if max_age_hours is None:
+            max_age_hours = float(self.config.get("app", {}).get("entity_refresh_hours", 24))
+        if max_age_hours > 0 and self.local_db.load_state(self.local_db.ENTITIES_REFRESHED_KEY, max_age_hours=max_age_hours):
+            return
+        entities = self.db.fetch_entities()
+        if not entities:
+            logger.warning("No se pudieron leer las entidades de GLPI; se mantiene la copia local.")
+            return
+        count = self.local_db.replace_entities(entities)
+        logger.info(f"Copia local de entidades GLPI actualizada: {count} entidades.")
+        # Mismo ciclo para los users_id de los técnicos (altas/bajas de usuarios en GLPI)
+        self.db.technicians(refresh=True)
+
+    # Con entidades desconocidas en tickets nuevos se refresca la copia, como mucho una vez por hora
+    ENTITY_MISS_REFRESH_HOURS = 1
+
     def _determine_ticket_metadata(self, ticket_data):
         """
         Determina cliente/proyecto usando reglas externas de mappings.json.
         """
         title = ticket_data.get('ticket_title', '')
         entity_id = str(ticket_data.get('entities_id', ''))
-        fullname = ticket_data.get('entity_fullname', '')
+        fullname = self._entity_fullname(ticket_data)
         
         # Valores base por defecto
         meta = {
@@ -127,7 +232,7 @@ class SchedulerService:
         self.routine_sync_backlog(days=days)
         
         # 2. Procesar silenciosamente
-        pending_after_sync = self.local_db.get_pending_tickets()
+        pending_after_sync = self.local_db.count_pending()
         if not pending_after_sync:
             logger.info("Barrido finalizado: No hay tickets pendientes por registrar.")
             self.send_telegram("Barrido completado: Todo está al día.")
@@ -135,36 +240,107 @@ class SchedulerService:
 
         # Filtrar solo tickets que pertenezcan al pasado (evitar procesar lo de HOY si se prefiere separar)
         # En este caso procesaremos TODO lo que esté en cola.
-        logger.info(f"Barrido: Procesando {len(pending_after_sync)} tickets detectados.")
+        logger.info(f"Barrido: Procesando {pending_after_sync} tickets detectados.")
         self.routine_b() # Reutilizamos la lógica de procesamiento batch
         
         logger.info("BARRIDO DE BACKLOG COMPLETADO.")
 
+    def _assign_ticket_key(self, ticket):
+        """
+        En modo multi-técnico cada técnico asignado registra el ticket en su cuenta: las filas de los
+        técnicos que no son el principal (GLPI_USER_EMAIL) llevan la clave "<ticket_id>@<users_id>", así
+        tienen su propia entrada en la cola y en procesados. El principal conserva la clave simple de
+        siempre (la del modo de un solo técnico).
+        """
+        technician_id = ticket.get('technician_id')
+        if not technician_id or not self.db.is_multi_technician():
+            return
+        if technician_id != self.db.primary_technician_id():
+            ticket['ticket_key'] = f"{ticket['ticket_id']}@{technician_id}"
+
+    def _known_glpi_ids(self, days):
+        """Tickets ya procesados o en cola para excluir en la consulta a GLPI (por técnico si hay varios)."""
+        known = self.local_db.get_known_glpi_ids(days)
+        if not self.db.is_multi_technician():
+            return set().union(*known.values())
+        primary = self.db.primary_technician_id()
+        by_technician = {}
+        for technician_id, ids in known.items():
+            technician_id = primary if technician_id is None else technician_id
+            if technician_id is not None:
+                by_technician.setdefault(technician_id, set()).update(ids)
+        return by_technician
+
+    def _enqueue_new_tickets(self, tickets, advance_watermark=True):
+        """
+        Encola los tickets de GLPI que no estén procesados ni ya en cola, con consultas por lote
+        (procesados, cola, conteo) y una inserción por técnico. Con 'advance_watermark' la marca de
+        agua de ingesta de GLPI avanza para cada técnico cuyos tickets quedaron guardados.
+        Devuelve (agregados, total en cola, técnicos cuyos tickets no se pudieron encolar).
+        """
+        by_id = {}
+        for ticket in tickets:
+            self._assign_ticket_key(ticket)
+            by_id.setdefault(local_db.LocalDB.ticket_key(ticket), ticket)
+
+        unprocessed = self.local_db.filter_unprocessed(list(by_id))
+        new_ids = self.local_db.filter_not_pending(unprocessed) if unprocessed is not None else None
+        if new_ids is None:
+            # Sin poder filtrar no se sabe qué falta: ninguna marca avanza y el lote se vuelve a leer
+            logger.error("No se pudo consultar la base local; la marca de agua de GLPI no avanza.")
+            failed = set(self.db.technicians()) | {t.get('technician_id') for t in tickets}
+            return 0, self.local_db.count_pending(), failed - {None}
+        entity_ids = {by_id[tid].get('entities_id') for tid in new_ids} - {None}
+        if any(self.local_db.get_entity(eid) is None for eid in entity_ids):
+            self.refresh_entities(max_age_hours=self.ENTITY_MISS_REFRESH_HOURS)
+
+        by_technician = {}
+        for tid in new_ids:
+            by_technician.setdefault(by_id[tid].get('technician_id'), []).append(by_id[tid])
+        added_count, failed = 0, set()
+        for technician_id, batch in by_technician.items():
+            added = self.local_db.add_pending_tickets(batch)
+            added_count += added
+            if added != len(batch):
+                failed.add(technician_id)
+        if failed:
+            logger.warning(f"No se encolaron los tickets nuevos de los técnicos {sorted(failed, key=str)}; "
+                           "su marca de agua de GLPI no avanza.")
+        if advance_watermark:
+            self.db.advance_watermark(tickets, held=failed)
+        return added_count, self.local_db.count_pending(), failed
+
     def routine_sync_backlog(self, days=7):
         logger.info(f"Ejecutando Sincronizacion de Backlog ({days} dias)...")
         try:
-            # 1. Obtener tickets del rango de la ultima semana
-            backlog_tickets = self.db.fetch_closed_tickets_range(days=days)
-            if not backlog_tickets:
+            # 1. Recorrer los tickets del rango por bloques (memoria acotada aunque el rango sea largo)
+            # 2-3. Encolar cada bloque (solo los que no estan en procesados ni en la cola actual)
+            #      mientras el siguiente se sigue leyendo de GLPI
+            #    Lo ya procesado o en cola en la ventana se excluye en la propia consulta a GLPI
+            known_ids = self._known_glpi_ids(days)
+            fetched, added_count, pending_total = 0, 0, 0
+            # La marca de agua avanza recién al leer todo el rango (si la lectura se corta, el error
+            # sale del iterador y no se mueve), y no para los técnicos con algún bloque fallido
+            held, last_chunk = set(), None
+            for chunk in self.db.iter_closed_tickets_range(days=days, exclude_ids=known_ids):
+                fetched += len(chunk)
+                added, pending_total, failed = self._enqueue_new_tickets(chunk, advance_watermark=False)
+                held |= failed
+                added_count += added
+                last_chunk = chunk
+            if last_chunk:
+                # Las filas llegan ordenadas por (solvedate, id): el último bloque tiene el máximo
+                self.db.advance_watermark(last_chunk, held=held)
+
+            if not fetched:
                 logger.info("No se encontraron tickets en el periodo especificado.")
                 return
-
-            # 2. Cargar pendientes actuales
-            pending_list = self.local_db.get_pending_tickets()
-            pending_ids = {str(t['ticket_id']) for t in pending_list}
-            
-            # 3. Filtrar: Solo los que no estan en procesados ni en la cola actual
-            added_count = 0
-            for ticket in backlog_tickets:
-                tid = str(ticket['ticket_id'])
-                if not self.local_db.is_processed(tid) and tid not in pending_ids:
-                    self.local_db.add_pending_ticket(ticket)
-                    pending_ids.add(tid)
-                    added_count += 1
+            excluded = sum(map(len, known_ids.values())) if isinstance(known_ids, dict) else len(known_ids)
+            logger.info(f"Backlog: {fetched} tickets leidos de GLPI ({excluded} excluidos en la consulta).")
             
             # 4. Notificar
             if added_count > 0:
-                msg = f"Sincronizacion: Se recuperaron {added_count} tickets de la semana. Total pendiente: {len(pending_ids)}"
+                msg = f"Sincronizacion: Se recuperaron {added_count} tickets de la semana. Total pendiente: {pending_total}"
                 logger.info(msg)
                 self.send_telegram(msg)
             else:
@@ -173,31 +349,39 @@ class SchedulerService:
         except Exception as e:
             logger.error(f"Error en Sincronizacion de Backlog: {e}", exc_info=True)
 
+    # Retención mínima: la semana anterior sigue editable hasta el miércoles (_is_ticket_locked)
+    # y el backlog se sincroniza hacia atrás; por debajo de esto un ticket archivado no sería seguro.
+    MIN_RETENTION_WEEKS = 2
+
+    def routine_maintenance(self):
+        """Retención de local_state.db: archiva procesados viejos y compacta el archivo."""
+        app_cfg = self.config.get("app", {})
+        weeks = max(self.MIN_RETENTION_WEEKS, int(app_cfg.get("retention_weeks", 8)))
+        logger.info(f"Ejecutando mantenimiento de base local (retención {weeks} semanas)...")
+        try:
+            result = self.local_db.run_maintenance(weeks, app_cfg.get("vacuum_pages", 0))
+            logger.info(
+                f"Mantenimiento completado: {result['archived']} tickets archivados, "
+                f"{result['freed_pages']} páginas liberadas."
+            )
+        except Exception as e:
+            logger.error(f"Error en mantenimiento de base local: {e}", exc_info=True)
+
     def routine_a(self):
         logger.info("Ejecutando Rutina A (Recoleccion de Tickets)...")
         try:
-            # 1. Obtener tickets nuevos de DB
-            new_tickets = self.db.fetch_closed_tickets_today()
+            # 1. Obtener tickets nuevos de DB (solo los resueltos desde la marca de agua)
+            new_tickets = self.db.fetch_closed_tickets_since_watermark()
             if not new_tickets:
                 logger.info("No hay tickets nuevos en GLPI.")
                 return
 
-            # 2. Cargar pendientes actuales
-            pending_list = self.local_db.get_pending_tickets()
-            pending_ids = {str(t['ticket_id']) for t in pending_list}
-            
-            # 3. Filtrar: No procesados HOY y No en cola pendiente
-            added_count = 0
-            for ticket in new_tickets:
-                tid = str(ticket['ticket_id'])
-                if not self.local_db.is_processed(tid) and tid not in pending_ids:
-                    self.local_db.add_pending_ticket(ticket)
-                    pending_ids.add(tid)
-                    added_count += 1
+            # 2-3. Filtrar: No procesados y No en cola pendiente
+            added_count, pending_total, _ = self._enqueue_new_tickets(new_tickets)
             
             # 4. Notificar
             if added_count > 0:
-                msg = f"Se encolaron {added_count} tickets nuevos. Total pendiente: {len(pending_ids)}"
+                msg = f"Se encolaron {added_count} tickets nuevos. Total pendiente: {pending_total}"
                 logger.info(msg)
                 self.send_telegram(msg)
             else:
@@ -239,157 +423,463 @@ class SchedulerService:
 
         return is_past_week and is_locked_day
 
-    def routine_b(self):
-        logger.info("Ejecutando Rutina B (Procesamiento Batch)...")
-        successful_ids = set()
-        
+    MAX_FAILURES_PER_TICKET = 3
+
+    def _enrich_slot(self, item):
+        """Completa cliente/proyecto/actividad/tags de un slot según su origen."""
+        raw_data = item.get('raw_ticket', {})
+
+        if raw_data.get('source') == 'telegram':
+            item['client'] = raw_data.get('client') or self.defaults.get('client_fallback', 'Intelix')
+            item['project'] = raw_data.get('project') or self.defaults.get('project_fallback', 'Gestión - Intelix')
+            item['activity'] = raw_data.get('activity') or self.defaults.get('activity', 'Soporte')
+            item['tags'] = raw_data.get('tags') or self.defaults.get('tag', 'Soporte')
+            logger.info(f"Procesando ticket manual de Telegram: {item.get('ticket_id')}")
+        else:
+            item.update(self._determine_ticket_metadata(raw_data))
+        return item
+
+    @staticmethod
+    def _slot_key(item):
+        """Clave (cola / journal / procesados) del ticket al que pertenece un slot planificado."""
+        return local_db.LocalDB.ticket_key(item.get('raw_ticket') or item)
+
+    def _new_day_state(self, schedule_plan):
+        return {
+            "successful_ids": set(),
+            "skipped_ids": set(),   # Tickets que superaron el máximo de reintentos
+            "failure_counter": {},  # {ticket_id: int} — contador de fallos por ticket
+            "success_count": 0,
+            "remaining": len(schedule_plan),
+        }
+
+    def _plan_day(self, date_str, daily_tickets, existing_entries=None):
+        """
+        Calcula los slots del día y descarta los que ya están en xtiming (guardados antes de una caída
+        sin llegar a confirmarse localmente): los del journal local y los leídos de xtiming.
+        Los tickets ya presentes cuentan como registrados.
+        """
+        schedule_plan = self.timer.calculate_distributed_slots(daily_tickets)
+        journaled = self.local_db.get_journaled_slots(date_str)
+
+        existing = set()
+        for entry in existing_entries or []:
+            existing |= xtiming_html.entry_keys(entry)
+
+        pending, present_ids = [], set()
+        for item in schedule_plan:
+            date, begin = xtiming_html.normalize_datetime(item['start_time'])
+            _, end = xtiming_html.normalize_datetime(item['end_time'], date)
+            keys = xtiming_html.entry_keys({
+                "date": date, "begin": begin, "end": end,
+                "ticket_id": item.get('ticket_id'), "description": item.get('title'),
+            })
+            tid_str = self._slot_key(item)
+            if (tid_str, item['start_time'], item['end_time']) in journaled or (existing and keys & existing):
+                present_ids.add(tid_str)
+                continue
+            pending.append(item)
+
+        if len(pending) < len(schedule_plan):
+            logger.info(f"Dia {date_str}: {len(schedule_plan) - len(pending)} slots ya estaban en xtiming. Se omiten.")
+
+        day = self._new_day_state(pending)
+        day["successful_ids"] |= present_ids
+        return pending, day
+
+    def _existing_entries(self, bot, date_str):
+        """Registros ya cargados en xtiming para el día (motores síncronos). None si está desactivado."""
+        if not self.config.get("app", {}).get("skip_existing_entries", True):
+            return None
+        fetch = getattr(bot, "fetch_existing_entries", None)
+        return fetch(date_str) if fetch else None
+
+    def _register_slot_result(self, day, date_str, item, ok, error=None):
+        """Actualiza contadores del día tras intentar un slot (éxito, fallo o excepción)."""
+        ticket_id = item.get('ticket_id')
+        tid_str = self._slot_key(item)
+
+        if ok:
+            # Journal inmediato: si el proceso cae antes de cerrar el día, este slot no se reenvía
+            self.local_db.journal_slot(tid_str, date_str, item['start_time'], item['end_time'])
+            day["successful_ids"].add(tid_str)
+            day["success_count"] += 1
+            day["failure_counter"].pop(tid_str, None)
+            logger.info(f"Registrado con exito [{date_str}]: {item['title']} (ID: {ticket_id})")
+            return
+
+        failures = day["failure_counter"].get(tid_str, 0) + 1
+        day["failure_counter"][tid_str] = failures
+        if error is None:
+            logger.error(f"Fallo al registrar Ticket ID {ticket_id} en fecha {date_str} (intento {failures}/{self.MAX_FAILURES_PER_TICKET})")
+        else:
+            logger.error(f"Error critico procesando Ticket ID {ticket_id}: {str(error)}")
+
+        if failures >= self.MAX_FAILURES_PER_TICKET and tid_str not in day["skipped_ids"]:
+            if error is None:
+                logger.warning(f"TICKET IRRECUPERABLE: {ticket_id} falló {self.MAX_FAILURES_PER_TICKET} veces. Saltando todos sus slots restantes.")
+                self.send_telegram(f"Ticket {ticket_id} falló {self.MAX_FAILURES_PER_TICKET} veces seguidas. Se omitió para continuar con los demás.")
+            else:
+                logger.warning(f"TICKET IRRECUPERABLE (excepción): {ticket_id} falló {self.MAX_FAILURES_PER_TICKET} veces. Saltando.")
+                self.send_telegram(f"Ticket {ticket_id} falló {self.MAX_FAILURES_PER_TICKET} veces (error crítico). Omitido.")
+            day["skipped_ids"].add(tid_str)
+
+    def _commit_day(self, date_str, day, successful_ids):
+        """Marca como procesados y elimina de pendientes SOLO al final del bloque diario."""
+        if not self.local_db.commit_processed(day["successful_ids"]):
+            logger.error(f"No se pudo confirmar el dia {date_str} en la base local. Sus tickets siguen pendientes.")
+            return
+        successful_ids.update(day["successful_ids"])
+
+        logger.info(f"Completado dia {date_str}: {day['success_count']} bloques registrados para {len(day['successful_ids'])} tickets.")
+
+    def _process_days_sequential(self, tickets_by_date, successful_ids):
+        """Registra los slots de cada día uno por uno con el automator principal."""
+        slots_done = 0
+        if getattr(self.bot, "tracer", None): self.bot.tracer.reset()
+        self.bot.start_browser()
+
+        for date_str, daily_tickets in sorted(tickets_by_date.items()):
+            logger.info(f"Procesando dia {date_str} ({len(daily_tickets)} tickets)...")
+
+            # 2. Calcular distribucion para ESTE dia especifico (sin los slots que ya están en xtiming)
+            schedule_plan, day = self._plan_day(date_str, daily_tickets, self._existing_entries(self.bot, date_str))
+
+            for item in schedule_plan:
+                tid_str = self._slot_key(item)
+
+                # --- SKIP si este ticket ya fue marcado como irrecuperable ---
+                if tid_str in day["skipped_ids"]:
+                    logger.info(f"Saltando slot de ticket {tid_str} (ya marcado como irrecuperable).")
+                    continue
+
+                try:
+                    self._enrich_slot(item)
+
+                    # Enviar a la web
+                    ok = self.bot.fill_timesheet_entry(item)
+                    slots_done += 1
+                    self._register_slot_result(day, date_str, item, ok)
+
+                except Exception as e:
+                    self._register_slot_result(day, date_str, item, False, error=e)
+
+                    # Intentar recuperar el navegador para que el siguiente ticket no falle en cascada
+                    try:
+                        logger.info("Intentando recuperar navegador tras excepción...")
+                        self.bot.close_browser()
+                        time.sleep(2)
+                        self.bot.start_browser()
+                        logger.info("Navegador recuperado exitosamente.")
+                    except Exception as recovery_err:
+                        logger.error(f"No se pudo recuperar el navegador: {recovery_err}")
+                        # Si no se puede recuperar, abortamos el día completo
+                        self.send_telegram(f"Navegador no recuperable. Abortando procesamiento del día {date_str}.")
+                        break
+
+                    continue
+
+            self._commit_day(date_str, day, successful_ids)
+
+        tracer = getattr(self.bot, "tracer", None)
+        if tracer:
+            logger.info(f"Latencia por paso: {tracer.format_stats()}")
+        return slots_done
+
+    def _process_days_pooled(self, tickets_by_date, pool_size, successful_ids):
+        """
+        Registra los slots de todos los días en paralelo con un pool de contextos de navegador.
+        Cada día se confirma (mark_as_processed / remove_pending_ticket) cuando terminan todos sus slots.
+        """
+        pool = web_automator.BrowserPool(self.config, size=pool_size, credentials=self._credentials)
         try:
-            pending_tickets = self.local_db.get_pending_tickets()
-            if not pending_tickets:
-                logger.info("No hay tickets pendientes para procesar.")
-                self.send_telegram("Fin de jornada: No hubo tickets para registrar.")
-                return
+            pool.start()
+            return self._run_pool(pool, tickets_by_date, successful_ids)
+        finally:
+            pool.close()
+
+    def _run_pool(self, pool, tickets_by_date, successful_ids):
+        lock = threading.Lock()
+        days = {}
+        jobs = []
+        for date_str, daily_tickets in sorted(tickets_by_date.items()):
+            logger.info(f"Planificando dia {date_str} ({len(daily_tickets)} tickets)...")
+            schedule_plan, days[date_str] = self._plan_day(date_str, daily_tickets, self._existing_entries(pool.main, date_str))
+            jobs.extend((date_str, item) for item in schedule_plan)
+
+        # Días sin slots (p.ej. feriados o ya cargados) solo tienen que confirmarse
+        for date_str, day in days.items():
+            if day["remaining"] == 0:
+                self._commit_day(date_str, day, successful_ids)
+
+        slots_done = [0]
+
+        def process(bot, job):
+            date_str, item = job
+            day = days[date_str]
+            tid_str = self._slot_key(item)
+            try:
+                with lock:
+                    skip = tid_str in day["skipped_ids"]
+                if skip:
+                    logger.info(f"Saltando slot de ticket {tid_str} (ya marcado como irrecuperable).")
+                    return
 
-            # 1. Agrupar tickets por fecha (YYYY-MM-DD) y Filtrar Bloqueados
-            tickets_by_date = {}
-            locked_count = 0
-            
-            for t in pending_tickets:
                 try:
-                    # Soporte para tickets de Telegram (target_date) o GLPI (solvedate)
-                    if t.get('source') == 'telegram':
-                        raw_date = t.get('target_date', datetime.now().strftime("%Y-%m-%d"))
-                    else:
-                        sdate = t.get('solvedate')
-                        raw_date = sdate if sdate else datetime.now().strftime("%Y-%m-%d")
-                        
-                    date_str = raw_date[:10] if isinstance(raw_date, str) else raw_date.strftime("%Y-%m-%d")
+                    self._enrich_slot(item)
+                    ok = bot.fill_timesheet_entry(item)
                 except Exception as e:
-                    logger.warning(f"Error parseando fecha de ticket: {e}. Usando HOY.")
-                    date_str = datetime.now().strftime("%Y-%m-%d")
-                    raw_date = date_str
-                
-                # --- REGLA DE NEGOCIO: FECHA LÍMITE ---
-                ticket_id = t.get('ticket_id')
-                if self._is_ticket_locked(raw_date):
+                    with lock:
+                        self._register_slot_result(day, date_str, item, False, error=e)
+                    raise
+
+                with lock:
+                    slots_done[0] += 1
+                    self._register_slot_result(day, date_str, item, ok)
+            finally:
+                with lock:
+                    day["remaining"] -= 1
+                    finished = day["remaining"] == 0
+                    if finished:
+                        self._commit_day(date_str, day, successful_ids)
+
+        # Los workers escriben (journal / confirmación del día) con su propia conexión: se cierra al salir
+        pool.run(jobs, process, on_worker_exit=self.local_db.close_thread_conn)
+        logger.info(f"Latencia por paso: {pool.main.tracer.format_stats()}")
+        return slots_done[0]
+
+    def _group_pending_by_date(self):
+        """
+        Agrupa los tickets pendientes por fecha (YYYY-MM-DD) descartando los de semanas cerradas.
+        Devuelve None si no queda nada que registrar (los avisos ya fueron enviados).
+        """
+        pending_dates = self.local_db.get_pending_dates(technician_id=self._technician)
+        if not pending_dates:
+            logger.info("No hay tickets pendientes para procesar.")
+            self.send_telegram("Fin de jornada: No hubo tickets para registrar.")
+            return
+
+        # 1. Agrupar tickets por fecha de trabajo (columna indexada) y Filtrar Bloqueados
+        tickets_by_date = {}
+        locked_ids = []
+
+        for date_str, count in pending_dates:
+            # --- REGLA DE NEGOCIO: FECHA LÍMITE ---
+            if self._is_ticket_locked(date_str):
+                for ticket_id in self.local_db.get_pending_ids_by_date(date_str, technician_id=self._technician):
                     logger.warning(f"TICKET BLOQUEADO: El ticket {ticket_id} ({date_str}) pertenece a una semana ya cerrada.")
                     self.send_telegram(f"Bloqueado: Ticket {ticket_id} ({date_str}) es de la semana pasada y el sistema ya cerró (Miércoles o posterior).")
-                    
                     # Lo marcamos procesado para que no vuelva a ser pendiente nunca más
-                    self.timer.mark_as_processed(ticket_id)
-                    self.local_db.remove_pending_ticket(ticket_id)
-                    locked_count += 1
-                    continue
-                
-                if date_str not in tickets_by_date:
-                    tickets_by_date[date_str] = []
-                tickets_by_date[date_str].append(t)
+                    locked_ids.append(ticket_id)
+                continue
+
+            tickets_by_date[date_str] = self.local_db.get_pending_tickets(work_date=date_str, technician_id=self._technician)
+
+        if locked_ids:
+             self.local_db.commit_processed(locked_ids)
+             logger.info(f"Se descartaron {len(locked_ids)} tickets por reglas de semana cerrada.")
+
+        if not tickets_by_date:
+            logger.info("Tras el filtrado de bloqueo, no quedaron tickets viables para procesar.")
+            self.send_telegram("Sin tickets procesables (Los pendientes estaban bloqueados por fecha).")
+            return
 
-            if locked_count > 0:
-                 logger.info(f"Se descartaron {locked_count} tickets por reglas de semana cerrada.")
+        logger.info(f"Se detectaron tickets para {len(tickets_by_date)} dias diferentes.")
+        self.send_telegram(f"Iniciando carga masiva. Dias a procesar: {', '.join(tickets_by_date.keys())}")
+        return tickets_by_date
 
+    def attach_loop(self, loop):
+        """Registra el event loop del proceso (el del bot de Telegram) para correr ahí la rutina async."""
+        self.loop = loop
+
+    def cancel_batch(self) -> bool:
+        """Cancela la carga masiva async en curso. Devuelve False si no hay ninguna."""
+        task = self._batch_task
+        if task is None or task.done():
+            return False
+        task.get_loop().call_soon_threadsafe(task.cancel)
+        return True
+
+    async def routine_b_async(self):
+        """
+        Variante de la Rutina B sobre AsyncWebAutomator: todos los slots de todos los días se lanzan
+        como tareas del mismo event loop y cada día se confirma cuando terminan sus slots.
+        Se puede esperar o cancelar desde el bot de Telegram.
+        """
+        if not self._batch_lock.acquire(blocking=False):
+            logger.warning("Rutina B ya está en ejecución. Se omite esta invocación.")
+            return
+
+        logger.info("Ejecutando Rutina B async (Procesamiento Batch)...")
+        self._batch_task = asyncio.current_task()
+        try:
+            # Elegir la cola puede consultar GLPI o avisar por Telegram: fuera del event loop
+            queues = self._technician_queues()
+            while await asyncio.to_thread(next, queues, None) is not None:
+                await self._process_queue_async()
+        finally:
+            self._use_technician(None, self._default_bot)
+            self._batch_task = None
+            self._batch_lock.release()
+
+    async def _process_queue_async(self):
+        """Registra la cola activa (toda, o la del técnico en curso) con el bot async activo."""
+        successful_ids = set()
+        bot = self.bot
+
+        try:
+            tickets_by_date = await asyncio.to_thread(self._group_pending_by_date)
             if not tickets_by_date:
-                logger.info("Tras el filtrado de bloqueo, no quedaron tickets viables para procesar.")
-                self.send_telegram("Sin tickets procesables (Los pendientes estaban bloqueados por fecha).")
                 return
 
-            logger.info(f"Se detectaron tickets para {len(tickets_by_date)} dias diferentes.")
-            self.send_telegram(f"Iniciando carga masiva. Dias a procesar: {', '.join(tickets_by_date.keys())}")
+            skip_existing = self.config.get("app", {}).get("skip_existing_entries", True)
+            days = {}
+            jobs = []
 
-            try:
-                self.bot.start_browser()
-                
-                for date_str, daily_tickets in sorted(tickets_by_date.items()):
-                    logger.info(f"Procesando dia {date_str} ({len(daily_tickets)} tickets)...")
-                    
-                    # 2. Calcular distribucion para ESTE dia especifico
-                    schedule_plan = self.timer.calculate_distributed_slots(daily_tickets)
-                    
-                    day_successful_ids = set()
-                    skipped_ids = set()  # Tickets que superaron el máximo de reintentos
-                    failure_counter = {}  # {ticket_id: int} — contador de fallos por ticket
-                    MAX_FAILURES_PER_TICKET = 3
-                    success_count = 0
-                    
-                    for item in schedule_plan:
-                        ticket_id = item.get('ticket_id')
-                        tid_str = str(ticket_id)
-                        
-                        # --- SKIP si este ticket ya fue marcado como irrecuperable ---
-                        if tid_str in skipped_ids:
+            slots_done = 0
+            # Un slot en vuelo por página: los demás esperan aquí y no arrancan hasta tener página
+            slots = asyncio.Semaphore(bot.concurrency)
+            # SQLite y Telegram son bloqueantes: van en hilos, serializados sobre el estado de los días
+            lock = threading.Lock()
+
+            def register(day, date_str, item, ok, error=None):
+                with lock:
+                    self._register_slot_result(day, date_str, item, ok, error=error)
+
+            async def process(date_str, item):
+                nonlocal slots_done
+                day = days[date_str]
+                tid_str = self._slot_key(item)
+                try:
+                    async with slots:
+                        # Se comprueba al tener página: los fallos de slots anteriores ya se contaron
+                        if tid_str in day["skipped_ids"]:
                             logger.info(f"Saltando slot de ticket {tid_str} (ya marcado como irrecuperable).")
-                            continue
-                        
+                            return
                         try:
-                            # Enriquecer metadata
-                            raw_data = item.get('raw_ticket', {})
-                            
-                            if raw_data.get('source') == 'telegram':
-                                item['client'] = raw_data.get('client') or self.defaults.get('client_fallback', 'Intelix')
-                                item['project'] = raw_data.get('project') or self.defaults.get('project_fallback', 'Gestión - Intelix')
-                                item['activity'] = raw_data.get('activity') or self.defaults.get('activity', 'Soporte')
-                                item['tags'] = raw_data.get('tags') or self.defaults.get('tag', 'Soporte')
-                                logger.info(f"Procesando ticket manual de Telegram: {ticket_id}")
-                            else:
-                                item.update(self._determine_ticket_metadata(raw_data))
-                            
-                            # Enviar a la web
-                            if self.bot.fill_timesheet_entry(item):
-                                day_successful_ids.add(tid_str)
-                                success_count += 1
-                                failure_counter.pop(tid_str, None)
-                                logger.info(f"Registrado con exito [{date_str}]: {item['title']} (ID: {ticket_id})")
-                            else:
-                                failure_counter[tid_str] = failure_counter.get(tid_str, 0) + 1
-                                logger.error(f"Fallo al registrar Ticket ID {ticket_id} en fecha {date_str} (intento {failure_counter[tid_str]}/{MAX_FAILURES_PER_TICKET})")
-                                
-                                if failure_counter[tid_str] >= MAX_FAILURES_PER_TICKET:
-                                    logger.warning(f"TICKET IRRECUPERABLE: {ticket_id} falló {MAX_FAILURES_PER_TICKET} veces. Saltando todos sus slots restantes.")
-                                    self.send_telegram(f"Ticket {ticket_id} falló {MAX_FAILURES_PER_TICKET} veces seguidas. Se omitió para continuar con los demás.")
-                                    skipped_ids.add(tid_str)
-
+                            await asyncio.to_thread(self._enrich_slot, item)
+                            ok = await bot.fill_timesheet_entry(item)
+                        except asyncio.CancelledError:
+                            raise
                         except Exception as e:
-                            logger.error(f"Error critico procesando Ticket ID {ticket_id}: {str(e)}")
-                            failure_counter[tid_str] = failure_counter.get(tid_str, 0) + 1
-                            
-                            if failure_counter[tid_str] >= MAX_FAILURES_PER_TICKET:
-                                logger.warning(f"TICKET IRRECUPERABLE (excepción): {ticket_id} falló {MAX_FAILURES_PER_TICKET} veces. Saltando.")
-                                self.send_telegram(f"Ticket {ticket_id} falló {MAX_FAILURES_PER_TICKET} veces (error crítico). Omitido.")
-                                skipped_ids.add(tid_str)
-                            
-                            # Intentar recuperar el navegador para que el siguiente ticket no falle en cascada
-                            try:
-                                logger.info("Intentando recuperar navegador tras excepción...")
-                                self.bot.close_browser()
-                                import time as _time
-                                _time.sleep(2)
-                                self.bot.start_browser()
-                                logger.info("Navegador recuperado exitosamente.")
-                            except Exception as recovery_err:
-                                logger.error(f"No se pudo recuperar el navegador: {recovery_err}")
-                                # Si no se puede recuperar, abortamos el día completo
-                                self.send_telegram(f"Navegador no recuperable. Abortando procesamiento del día {date_str}.")
-                                break
-                            
-                            continue
-                    
-                    # Marcar como procesados y eliminar de pendientes SOLO al final del bloque diario
-                    for sid in day_successful_ids:
-                        self.timer.mark_as_processed(sid)
-                        self.local_db.remove_pending_ticket(sid)
-                        successful_ids.add(sid)
-
-                    logger.info(f"Completado dia {date_str}: {success_count} bloques registrados para {len(day_successful_ids)} tickets.")
-                self.send_telegram(f"Proceso finalizado. Total IDs procesados: {len(successful_ids)}")
+                            await asyncio.to_thread(register, day, date_str, item, False, e)
+                            return
+                        slots_done += 1
+                        await asyncio.to_thread(register, day, date_str, item, ok)
+                finally:
+                    day["remaining"] -= 1
+                    if day["remaining"] == 0:
+                        await asyncio.to_thread(self._commit_day, date_str, day, successful_ids)
+
+            bot.tracer.reset()
+            started_at = time.perf_counter()
+            try:
+                await bot.start_browser()
+
+                for date_str, daily_tickets in sorted(tickets_by_date.items()):
+                    logger.info(f"Planificando dia {date_str} ({len(daily_tickets)} tickets)...")
+                    existing = await bot.fetch_existing_entries(date_str) if skip_existing else None
+                    schedule_plan, days[date_str] = await asyncio.to_thread(self._plan_day, date_str, daily_tickets, existing)
+                    jobs.extend((date_str, item) for item in schedule_plan)
+
+                for date_str, day in days.items():
+                    if day["remaining"] == 0:
+                        await asyncio.to_thread(self._commit_day, date_str, day, successful_ids)
+
+                logger.info(f"Procesando {len(jobs)} slots con {bot.concurrency} páginas concurrentes.")
+                await asyncio.gather(*(process(d, item) for d, item in jobs))
+                logger.info(f"Latencia por paso: {bot.tracer.format_stats()}")
+
+                elapsed = time.perf_counter() - started_at
+                throughput = slots_done / elapsed if elapsed > 0 else 0.0
+                logger.info(f"Rendimiento: {slots_done} slots en {elapsed:.1f}s ({throughput:.2f} slots/s).")
+                await asyncio.to_thread(
+                    self.send_telegram,
+                    f"Proceso finalizado. Total IDs procesados: {len(successful_ids)}\n"
+                    f"{slots_done} slots en {elapsed:.0f}s ({throughput:.2f} slots/s)"
+                )
+            finally:
+                await bot.close_browser()
+
+                pending_after = await asyncio.to_thread(self.local_db.count_pending, technician_id=self._technician)
+                if pending_after:
+                    logger.warning(f"Quedaron {pending_after} tickets pendientes.")
+                    await asyncio.to_thread(self.send_telegram, f"Quedaron {pending_after} tickets sin registrar. Ver log.")
+
+        except asyncio.CancelledError:
+            # Los días ya completados quedaron confirmados; el resto sigue pendiente
+            logger.warning(f"Rutina B async cancelada. Tickets confirmados hasta ahora: {len(successful_ids)}.")
+            raise
+        except Exception as e:
+            logger.error(f"Error fatal en Rutina B async: {e}", exc_info=True)
+            await asyncio.to_thread(self.send_telegram, f"Error critico en cierre de jornada: {e}")
+
+    def routine_b(self):
+        if isinstance(self.bot, async_web_automator.AsyncWebAutomator):
+            if self.loop is not None and self.loop.is_running():
+                # Un solo event loop por proceso: se ejecuta en el loop del bot de Telegram
+                future = asyncio.run_coroutine_threadsafe(self.routine_b_async(), self.loop)
+                try:
+                    future.result()
+                except (Exception, asyncio.CancelledError) as e:
+                    logger.warning(f"Rutina B async terminó sin completarse: {e!r}")
+            else:
+                try:
+                    asyncio.run(self.routine_b_async())
+                except asyncio.CancelledError:
+                    logger.warning("Rutina B async cancelada.")
+            return
+
+        if not self._batch_lock.acquire(blocking=False):
+            logger.warning("Rutina B ya está en ejecución. Se omite esta invocación.")
+            return
+
+        logger.info("Ejecutando Rutina B (Procesamiento Batch)...")
+        try:
+            for _ in self._technician_queues():
+                self._process_queue()
+        finally:
+            self._use_technician(None, self._default_bot)
+            self._batch_lock.release()
+
+    def _process_queue(self):
+        """Registra la cola activa (toda, o la del técnico en curso) con el bot activo."""
+        successful_ids = set()
+        
+        try:
+            tickets_by_date = self._group_pending_by_date()
+            if not tickets_by_date:
+                return
+
+            # El pool de contextos solo aplica al motor de navegador
+            pool_size = int(self.config.get("app", {}).get("browser_pool_size", 1) or 1)
+            use_pool = pool_size > 1 and isinstance(self.bot, web_automator.WebAutomator)
+
+            started_at = time.perf_counter()
+            slots_done = 0
+            try:
+                if use_pool:
+                    logger.info(f"Procesando con pool de {pool_size} contextos de navegador en paralelo.")
+                    slots_done = self._process_days_pooled(tickets_by_date, pool_size, successful_ids)
+                else:
+                    slots_done = self._process_days_sequential(tickets_by_date, successful_ids)
+
+                elapsed = time.perf_counter() - started_at
+                throughput = slots_done / elapsed if elapsed > 0 else 0.0
+                logger.info(f"Rendimiento: {slots_done} slots en {elapsed:.1f}s ({throughput:.2f} slots/s).")
+                self.send_telegram(
+                    f"Proceso finalizado. Total IDs procesados: {len(successful_ids)}\n"
+                    f"{slots_done} slots en {elapsed:.0f}s ({throughput:.2f} slots/s)"
+                )
 
             finally:
                 self.bot.close_browser()
                 
                 # Verificar remanentes
-                pending_after = self.local_db.get_pending_tickets()
+                pending_after = self.local_db.count_pending(technician_id=self._technician)
                 if pending_after:
-                    logger.warning(f"Quedaron {len(pending_after)} tickets pendientes.")
-                    self.send_telegram(f"Quedaron {len(pending_after)} tickets sin registrar. Ver log.")
+                    logger.warning(f"Quedaron {pending_after} tickets pendientes.")
+                    self.send_telegram(f"Quedaron {pending_after} tickets sin registrar. Ver log.")
 
         except Exception as e:
             logger.error(f"Error fatal en Rutina B: {e}", exc_info=True)
@@ -397,13 +887,21 @@ class SchedulerService:
 
     def run(self, force_now=False, force_sync=False):
         # Programar tareas regulares
-        schedule.every(2).hours.do(self.routine_a)
+        poll_minutes = int(self.config.get("app", {}).get("poll_interval_minutes", 120))
+        schedule.every(poll_minutes).minutes.do(self.routine_a)
         schedule.every().day.at("18:00").do(self.routine_b)
         
         # Sincronización semanal opcional (ej: todos los Lunes a las 08:00)
         schedule.every().monday.at("08:00").do(self.routine_sync_backlog)
+
+        # Copia local de entidades GLPI (solo consulta GLPI si tiene más de app.entity_refresh_hours)
+        schedule.every().day.at("06:00").do(self.refresh_entities)
+
+        # Retención y compactación de la base local (fuera de horario)
+        schedule.every().sunday.at("03:00").do(self.routine_maintenance)
         
         logger.info("Scheduler iniciado. Esperando tareas...")
+        self.refresh_entities()
         
         # Ejecuciones iniciales si se solicitan
         if force_sync:
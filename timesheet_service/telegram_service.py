@@ -1,4 +1,5 @@
 import os
+import asyncio
 import logging
 import json
 from datetime import datetime, timedelta
@@ -31,8 +32,10 @@ logger = logging.getLogger("TelegramBot")
 ) = range(9)
 
 class TelegramService:
-    def __init__(self, config):
+    def __init__(self, config, scheduler=None):
         self.config = config
+        # SchedulerService opcional: permite lanzar/cancelar la carga masiva async desde el chat
+        self.scheduler = scheduler
         self.token = os.getenv("TG_BOT_TOKEN")
         self.allowed_chat_id = int(os.getenv("TG_CHAT_ID", "0"))
         
@@ -42,7 +45,8 @@ class TelegramService:
         os.makedirs(self.data_dir, exist_ok=True)
         
         from time_manager import TimeManager
-        self.local_db = local_db.LocalDB()
+        # Misma LocalDB que el scheduler (conexiones por hilo en WAL) si se comparte el servicio
+        self.local_db = scheduler.local_db if scheduler else local_db.LocalDB()
         self.timer = TimeManager(config, self.local_db)
         self.persistence_path = os.path.join(self.data_dir, "bot_persistence.pickle")
 
@@ -62,7 +66,9 @@ class TelegramService:
             "/batch - Carga masiva (Varios días/tareas)\n"
             "/status - Ver estado del sistema\n"
             "/pendientes - Ver tickets en cola\n"
-            "/borrar <ID> - Eliminar un ticket pendiente"
+            "/borrar <ID> - Eliminar un ticket pendiente\n"
+            "/procesar - Registrar ahora los pendientes\n"
+            "/detener - Detener el registro en curso"
         )
 
     # --- FLUJO DE REGISTRO BATCH (CARGA MASIVA) ---
@@ -166,6 +172,7 @@ class TelegramService:
         # Calcular horas por actividad por día
         hours_per_activity = float(hours_per_day) / len(activities)
         total_inserted = 0
+        batch_entries = []
 
         for dt in days:
             for i, act in enumerate(activities):
@@ -182,9 +189,12 @@ class TelegramService:
                     "target_date": dt.strftime("%Y-%m-%d"),
                     "status": "pending"
                 }
-                self.local_db.add_pending_ticket(new_entry)
+                batch_entries.append(new_entry)
                 total_inserted += 1
 
+        # Toda la carga masiva en una sola transacción
+        self.local_db.add_pending_tickets(batch_entries)
+
         await query.edit_message_text(
             " **CARGA MASIVA FINALIZADA**\n\n"
             f"Se han ajustado **{hours_per_day} horas diarias** automáticamente.\n\n"
@@ -201,39 +211,53 @@ class TelegramService:
     async def status_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         if not self._is_authorized(update): return
         
-        pending = self.local_db.get_pending_tickets()
         today_str = datetime.now().strftime("%Y-%m-%d")
         
-        # Conteo básico
-        pending_count = len(pending)
-        today_pending = sum(1 for t in pending if t.get('target_date', '') == today_str or t.get('solvedate', '').startswith(today_str))
+        # Conteo básico (agregados SQL sobre columnas indexadas)
+        pending_count = self.local_db.count_pending()
+        today_pending = self.local_db.count_pending(work_date=today_str)
         
         msg = (
             f" *Estado del Sistema*\n"
             f"Tickets Pendientes Totales: `{pending_count}`\n"
             f"Pendientes para HOY: `{today_pending}`\n"
         )
+        if self.scheduler:
+            pool = self.scheduler.db.pool_stats()
+            msg += (
+                f"Conexiones GLPI: `{pool['checkouts']}` (espera prom. `{pool['wait_ms_avg']:.0f}ms`, "
+                f"máx. `{pool['wait_ms_max']:.0f}ms`, reconexiones `{pool['reconnects']}`)\n"
+            )
         await update.message.reply_text(msg, parse_mode='Markdown')
 
     async def list_pending(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         if not self._is_authorized(update): return
         
-        pending = self.local_db.get_pending_tickets()
-        if not pending:
+        # /pendientes [página]: solo se lee y decodifica la página pedida
+        page_size = 10 # Limitar a 10 para no spammear
+        try:
+            page = max(1, int(context.args[0])) if context.args else 1
+        except ValueError:
+            page = 1
+
+        total = self.local_db.count_pending()
+        if not total:
             await update.message.reply_text("No hay nada pendiente, todo limpio.")
             return
 
-        msg = " *Cola de Pendientes:*\n\n"
-        for t in pending[:10]: # Limitar a 10 para no spammear
-            tid = t.get('ticket_id')
+        pending, _ = self.local_db.get_pending_page(limit=page_size, offset=(page - 1) * page_size)
+        msg = f" *Cola de Pendientes ({total}):*\n\n"
+        for t in pending:
+            tid = self.local_db.ticket_key(t)
             title = t.get('ticket_title', 'Sin titulo')[:30]
             date = t.get('target_date') or t.get('solvedate', '')[:10]
             source = t.get('source', 'glpi')
             
             msg += f" `{tid}` ({source})\n {date} | {title}...\n\n"
         
-        if len(pending) > 10:
-            msg += f"... y {len(pending)-10} más."
+        remaining = total - (page - 1) * page_size - len(pending)
+        if remaining > 0:
+            msg += f"... y {remaining} más. Usa /pendientes {page + 1}"
             
         await update.message.reply_text(msg, parse_mode='Markdown')
 
@@ -253,6 +277,34 @@ class TelegramService:
         except Exception as e:
             await update.message.reply_text(f"Error borrando: {e}")
 
+    # --- CONTROL DE LA CARGA MASIVA ---
+
+    async def process_now(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if not self._is_authorized(update): return
+
+        if not self.scheduler:
+            await update.message.reply_text("El procesamiento no está disponible desde el bot.")
+            return
+        if self.scheduler._batch_task is not None:
+            await update.message.reply_text("Ya hay un registro en curso. Usa /detener para cancelarlo.")
+            return
+
+        if asyncio.iscoroutinefunction(getattr(self.scheduler.bot, "fill_timesheet_entry", None)):
+            # Motor async: la rutina corre como tarea de este mismo event loop
+            context.application.create_task(self.scheduler.routine_b_async())
+        else:
+            # Motores síncronos: se ejecuta en un hilo para no bloquear el bot
+            context.application.create_task(asyncio.to_thread(self.scheduler.routine_b))
+        await update.message.reply_text("Registro de pendientes iniciado.")
+
+    async def stop_processing(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if not self._is_authorized(update): return
+
+        if self.scheduler and self.scheduler.cancel_batch():
+            await update.message.reply_text("Cancelando registro. Los días ya completados quedan confirmados.")
+        else:
+            await update.message.reply_text("No hay ningún registro async en curso.")
+
     # --- FLUJO DE REGISTRO MANUAL ---
 
     async def iniciar_registro(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -334,6 +386,7 @@ class TelegramService:
             dates_to_register.append((today + timedelta(days=1), half))
 
         # Generar IDs únicos y guardar
+        new_entries = []
         for i, (dt, hours) in enumerate(dates_to_register):
             # Timestamp + index para evitar colisiones en split
             ts_id = int(datetime.now().timestamp() * 1000) + i
@@ -349,7 +402,8 @@ class TelegramService:
                 "target_date": dt.strftime("%Y-%m-%d"),
                 "status": "pending"
             }
-            self.local_db.add_pending_ticket(new_entry)
+            new_entries.append(new_entry)
+        self.local_db.add_pending_tickets(new_entries)
 
         msg = (
             "Ya se encolo lo que dijiste\n"
@@ -365,10 +419,15 @@ class TelegramService:
         await update.message.reply_text("Registro cancelado.")
         return ConversationHandler.END
 
+    async def _on_startup(self, application):
+        """Comparte el event loop del bot con el scheduler (un solo loop para la rutina async)."""
+        if self.scheduler:
+            self.scheduler.attach_loop(asyncio.get_running_loop())
+
     def run_bot(self):
         """Inicia el bot con persistencia."""
         persistence = PicklePersistence(filepath=self.persistence_path)
-        application = Application.builder().token(self.token).persistence(persistence).build()
+        application = Application.builder().token(self.token).persistence(persistence).post_init(self._on_startup).build()
 
         conv_handler = ConversationHandler(
             entry_points=[
@@ -397,6 +456,8 @@ class TelegramService:
         application.add_handler(CommandHandler("status", self.status_command))
         application.add_handler(CommandHandler("pendientes", self.list_pending))
         application.add_handler(CommandHandler("borrar", self.delete_pending))
+        application.add_handler(CommandHandler("procesar", self.process_now))
+        application.add_handler(CommandHandler("detener", self.stop_processing))
         
         application.add_handler(conv_handler)
 
@@ -0,0 +1,123 @@
+"""
+Benchmark de ingesta GLPI a distintas escalas sobre datos sintéticos (tests/glpi_fixture.py).
+Mide las consultas de DBHandler y el camino completo de Rutina A / sincronización de backlog hacia
+una LocalDB vacía (frío) y ya sincronizada (caliente: marca de agua y procesados en memoria).
+n = filas leídas en las consultas, tickets en cola tras cada rutina.
+
+Uso:
+    python tests/bench_ingest.py [--scales 10000,100000,1000000] [--technicians 1] [--mysql]
+
+Por defecto usa el shim SQLite; con --mysql carga cada escala en el servidor de GLPI_TEST_DB_*.
+"""
+import sys
+import os
+import time
+import tempfile
+import argparse
+import logging
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import glpi_fixture
+from db_handler import DBHandler
+from local_db import LocalDB
+from scheduler_service import SchedulerService
+
+
+def timed(fn, *args):
+    t = time.perf_counter()
+    result = fn(*args)
+    return (time.perf_counter() - t) * 1000, result
+
+
+def make_service(handler, local_db):
+    # Solo se usan las rutinas de ingesta: sin bot, navegador ni la base local del servicio real
+    service = SchedulerService.__new__(SchedulerService)
+    service.config = {"app": {}}
+    service.local_db = local_db
+    service.db = handler
+    handler.local_db = local_db
+    return service
+
+
+def make_handler(scale, args, workdir):
+    if args.mysql:
+        conn = glpi_fixture.mysql_test_connection()
+        glpi_fixture.load_mysql(conn, tickets=scale, technicians=args.technicians_total, seed=args.seed)
+        conn.close()
+        for name in ("HOST", "PORT", "USER", "PASSWORD", "NAME"):
+            if os.getenv(f"GLPI_TEST_DB_{name}"):
+                os.environ[f"GLPI_DB_{name}"] = os.environ[f"GLPI_TEST_DB_{name}"]
+        os.environ.setdefault("GLPI_DB_USER", "root")
+        os.environ.setdefault("GLPI_DB_NAME", "glpi_test")
+        return DBHandler()
+
+    path = os.path.join(workdir, f"glpi_{scale}.db")
+    glpi_fixture.load_sqlite(path, tickets=scale, technicians=args.technicians_total, seed=args.seed)
+    return glpi_fixture.SqliteGlpiHandler(path)
+
+
+def bench_scale(scale, args, workdir):
+    t = time.perf_counter()
+    handler = make_handler(scale, args, workdir)
+    print(f"\n--- {scale:,} tickets (carga de datos {time.perf_counter() - t:.1f}s) ---")
+
+    rows = []
+    ms, result = timed(handler.fetch_closed_tickets_today)
+    rows.append(("fetch_closed_tickets_today", ms, len(result)))
+    ms, result = timed(handler.fetch_closed_tickets_range, 7)
+    rows.append(("fetch_closed_tickets_range(7)", ms, len(result)))
+    ms, result = timed(handler.fetch_closed_tickets_range, args.days)
+    rows.append((f"fetch_closed_tickets_range({args.days})", ms, len(result)))
+    ms, count = timed(lambda: sum(len(c) for c in handler.iter_closed_tickets_range(args.days)))
+    rows.append((f"iter_closed_tickets_range({args.days})", ms, count))
+
+    # Rutina A: la primera corrida (sin marca de agua) lee el día; la segunda solo lo nuevo
+    service = make_service(handler, LocalDB(os.path.join(workdir, f"local_a_{scale}.db")))
+    for label in ("routine_a (frío)", "routine_a (caliente)"):
+        ms, _ = timed(service.routine_a)
+        rows.append((label, ms, service.local_db.count_pending()))
+
+    service = make_service(handler, LocalDB(os.path.join(workdir, f"local_b_{scale}.db")))
+    for label in (f"routine_sync_backlog({args.days}) (frío)", f"routine_sync_backlog({args.days}) (caliente)"):
+        ms, _ = timed(service.routine_sync_backlog, args.days)
+        rows.append((label, ms, service.local_db.count_pending()))
+
+    for label, ms, count in rows:
+        print(f"  {label:<42} {ms:>9.1f} ms  n={count}")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de ingesta GLPI a escala")
+    parser.add_argument("--scales", default="10000,100000")
+    parser.add_argument("--technicians", type=int, default=1, help="Técnicos a ingerir (modo multi-técnico si > 1)")
+    parser.add_argument("--technicians-total", type=int, default=20, help="Técnicos en los datos generados")
+    parser.add_argument("--days", type=int, default=30, help="Ventana del backlog")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--mysql", action="store_true", help="Usar el MySQL de GLPI_TEST_DB_* en vez de SQLite")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    os.environ.pop("TG_BOT_TOKEN", None)
+    emails = [glpi_fixture.technician_email(i) for i in range(1, args.technicians + 1)]
+    os.environ["GLPI_USER_EMAIL"] = emails[0]
+    if len(emails) > 1:
+        os.environ["GLPI_USER_EMAILS"] = ",".join(emails)
+    else:
+        os.environ.pop("GLPI_USER_EMAILS", None)
+
+    print("=" * 70)
+    print(f" BENCHMARK DE INGESTA GLPI ({'MySQL' if args.mysql else 'SQLite shim'}) - "
+          f"{args.technicians} técnico(s) de {args.technicians_total}")
+    print("=" * 70)
+    with tempfile.TemporaryDirectory() as workdir:
+        for scale in [int(s) for s in args.scales.split(",") if s.strip()]:
+            bench_scale(scale, args, workdir)
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Benchmark de motores de registro (navegador, asyncio y HTTP directo) contra el servidor stub local.
+Mide login, slots/segundo y latencia p50/p95 por slot para cada motor usando el mismo plan de jornada.
+
+Uso:
+    python tests/bench_submitters.py [--slots 20] [--engines http,browser,async]
+                                     [--latency-ms 0] [--error-rate 0] [--ajax] [--form-dump form_dump.html]
+"""
+import sys
+import os
+import time
+import asyncio
+import argparse
+import logging
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from xtiming_stub import XtimingStub, STUB_USER, STUB_PASSWORD
+
+CONFIG = {
+    "app": {"headless_browser": True, "persist_session": False},
+    "defaults": {
+        "client_fallback": "Comercializadoras EPA",
+        "project_fallback": "Continuidad de Aplicaciones - Comercializadoras EPA",
+        "activity": "Caja Registradora",
+        "tag": "Soporte"
+    }
+}
+
+
+def build_slots(count):
+    slots = []
+    for i in range(count):
+        hour = 7 + (i % 9)
+        slots.append({
+            "ticket_id": str(1000 + i),
+            "title": f"Ticket de benchmark {i}",
+            "start_time": f"02.03.2026 {hour:02d}:00",
+            "end_time": f"02.03.2026 {hour:02d}:30",
+            "client": "EPA SV",
+            "project": "Continuidad de Aplicaciones - EPA SV",
+            "activity": "Caja Registradora",
+            "tags": "Soporte",
+        })
+    return slots
+
+
+def make_engine(name):
+    if name == "http":
+        from http_automator import HttpAutomator
+        return HttpAutomator(CONFIG)
+    if name == "async":
+        from async_web_automator import AsyncWebAutomator
+        return AsyncWebAutomator(CONFIG)
+    from web_automator import WebAutomator
+    return WebAutomator(CONFIG)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def _submit_sync(engine, slots):
+    t0 = time.perf_counter()
+    engine.start_browser()
+    t_login = time.perf_counter() - t0
+
+    results = []
+    for slot in slots:
+        t = time.perf_counter()
+        ok = engine.fill_timesheet_entry(dict(slot))
+        results.append((ok, time.perf_counter() - t))
+    return t_login, results
+
+
+async def _submit_async(engine, slots):
+    t0 = time.perf_counter()
+    await engine.start_browser()
+    t_login = time.perf_counter() - t0
+
+    async def one(slot):
+        t = time.perf_counter()
+        ok = await engine.fill_timesheet_entry(dict(slot))
+        return ok, time.perf_counter() - t
+
+    try:
+        return t_login, await asyncio.gather(*(one(s) for s in slots))
+    finally:
+        await engine.close_browser()
+
+
+def run_engine(name, slots, stub):
+    engine = make_engine(name)
+    saved_before = len(stub.state.entries)
+    try:
+        t1 = time.perf_counter()
+        if name == "async":
+            t_login, results = asyncio.run(_submit_async(engine, slots))
+        else:
+            t_login, results = _submit_sync(engine, slots)
+        elapsed = time.perf_counter() - t1 - t_login
+    except Exception as e:
+        return {"engine": name, "error": str(e)}
+    finally:
+        if name != "async":
+            try:
+                engine.close_browser()
+            except Exception:
+                pass
+
+    ok = sum(1 for r, _ in results if r)
+    latencies = [dt * 1000 for _, dt in results]
+    return {
+        "engine": name,
+        "ok": ok,
+        "saved": len(stub.state.entries) - saved_before,
+        "login_s": t_login,
+        "elapsed_s": elapsed,
+        "slots_per_s": ok / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de motores de registro")
+    parser.add_argument("--slots", type=int, default=20)
+    parser.add_argument("--engines", default="http,browser")
+    parser.add_argument("--latency-ms", type=int, default=0, help="Latencia simulada por petición")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probabilidad de rechazo al guardar")
+    parser.add_argument("--ajax", action="store_true", help="Proyectos cargados por AJAX según el cliente")
+    parser.add_argument("--form-dump", default=None, help="Catálogos desde el form_dump.html real")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    stub = XtimingStub(form_dump=args.form_dump, latency_ms=args.latency_ms, error_rate=args.error_rate,
+                       ajax_projects=args.ajax, seed=1).start()
+    os.environ["XTIMING_URL"] = stub.base_url
+    os.environ["XTIMING_USER"] = STUB_USER
+    os.environ["XTIMING_PASSWORD"] = STUB_PASSWORD
+
+    slots = build_slots(args.slots)
+
+    print("=" * 60)
+    print(f" BENCHMARK DE MOTORES DE REGISTRO ({args.slots} slots) - {stub.base_url}")
+    print(f" latencia={args.latency_ms}ms errores={args.error_rate:.0%} ajax={'si' if args.ajax else 'no'}")
+    print("=" * 60)
+    try:
+        for name in [e.strip() for e in args.engines.split(",") if e.strip()]:
+            r = run_engine(name, slots, stub)
+            if "error" in r:
+                print(f"[{name:7}] no disponible: {r['error'].splitlines()[0]}")
+                continue
+            print(f"[{name:7}] ok={r['ok']}/{len(slots)} guardados={r['saved']} "
+                  f"login={r['login_s']:.2f}s total={r['elapsed_s']:.2f}s -> {r['slots_per_s']:.2f} slots/s "
+                  f"(p50={r['p50_ms']:.0f}ms p95={r['p95_ms']:.0f}ms)")
+    finally:
+        stub.stop()
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+import sys
+import os
+
+import pytest
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import local_db
+
+
+@pytest.fixture(autouse=True)
+def isolated_local_db(monkeypatch, tmp_path):
+    """LocalDB() sin ruta explícita usa una base temporal: los tests nunca tocan data/local_state.db."""
+    monkeypatch.setattr(local_db.LocalDB.__init__, "__defaults__", (str(tmp_path / "local_state.db"),))
@@ -0,0 +1,80 @@
+-- Subconjunto del esquema de GLPI 10 usado por db_handler.py (mismas columnas e índices).
+-- Se carga en un MySQL/MariaDB local para pruebas de planes de ejecución (EXPLAIN).
+
+DROP TABLE IF EXISTS `glpi_useremails`;
+DROP TABLE IF EXISTS `glpi_tickets_users`;
+DROP TABLE IF EXISTS `glpi_tickets`;
+DROP TABLE IF EXISTS `glpi_users`;
+DROP TABLE IF EXISTS `glpi_entities`;
+
+CREATE TABLE `glpi_entities` (
+  `id` int unsigned NOT NULL AUTO_INCREMENT,
+  `name` varchar(255) DEFAULT NULL,
+  `entities_id` int unsigned DEFAULT '0',
+  `completename` text,
+  `level` int NOT NULL DEFAULT '0',
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `unicity` (`entities_id`,`name`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+CREATE TABLE `glpi_users` (
+  `id` int unsigned NOT NULL AUTO_INCREMENT,
+  `name` varchar(255) DEFAULT NULL,
+  `realname` varchar(255) DEFAULT NULL,
+  `firstname` varchar(255) DEFAULT NULL,
+  `is_active` tinyint NOT NULL DEFAULT '1',
+  `is_deleted` tinyint NOT NULL DEFAULT '0',
+  `entities_id` int unsigned NOT NULL DEFAULT '0',
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `unicityloginauth` (`name`),
+  KEY `realname` (`realname`),
+  KEY `firstname` (`firstname`),
+  KEY `is_active` (`is_active`),
+  KEY `is_deleted` (`is_deleted`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+CREATE TABLE `glpi_useremails` (
+  `id` int unsigned NOT NULL AUTO_INCREMENT,
+  `users_id` int unsigned NOT NULL DEFAULT '0',
+  `is_default` tinyint NOT NULL DEFAULT '0',
+  `is_dynamic` tinyint NOT NULL DEFAULT '0',
+  `email` varchar(255) DEFAULT NULL,
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `unicity` (`users_id`,`email`),
+  KEY `email` (`email`),
+  KEY `is_default` (`is_default`),
+  KEY `is_dynamic` (`is_dynamic`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+CREATE TABLE `glpi_tickets` (
+  `id` int unsigned NOT NULL AUTO_INCREMENT,
+  `entities_id` int unsigned NOT NULL DEFAULT '0',
+  `name` varchar(255) DEFAULT NULL,
+  `date` timestamp NULL DEFAULT NULL,
+  `closedate` timestamp NULL DEFAULT NULL,
+  `solvedate` timestamp NULL DEFAULT NULL,
+  `date_mod` timestamp NULL DEFAULT NULL,
+  `status` int NOT NULL DEFAULT '1',
+  `content` longtext,
+  `is_deleted` tinyint NOT NULL DEFAULT '0',
+  PRIMARY KEY (`id`),
+  KEY `date` (`date`),
+  KEY `closedate` (`closedate`),
+  KEY `solvedate` (`solvedate`),
+  KEY `date_mod` (`date_mod`),
+  KEY `status` (`status`),
+  KEY `entities_id` (`entities_id`),
+  KEY `is_deleted` (`is_deleted`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+CREATE TABLE `glpi_tickets_users` (
+  `id` int unsigned NOT NULL AUTO_INCREMENT,
+  `tickets_id` int unsigned NOT NULL DEFAULT '0',
+  `users_id` int unsigned NOT NULL DEFAULT '0',
+  `type` int NOT NULL DEFAULT '1',
+  `use_notification` tinyint NOT NULL DEFAULT '1',
+  `alternative_email` varchar(255) DEFAULT NULL,
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `unicity` (`tickets_id`,`type`,`users_id`,`alternative_email`),
+  KEY `user` (`users_id`,`type`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
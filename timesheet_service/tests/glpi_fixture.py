@@ -0,0 +1,295 @@
+"""
+Generador de datos GLPI sintéticos (glpi_entities, glpi_users, glpi_useremails, glpi_tickets,
+glpi_tickets_users) con jerarquía de entidades y varios técnicos, más un shim SQLite que expone la
+misma interfaz que DBHandler para correr la ingesta sin un MySQL.
+
+Uso:
+    python tests/glpi_fixture.py --tickets 100000 --sqlite /tmp/glpi.db
+    python tests/glpi_fixture.py --tickets 100000 --mysql   (usa GLPI_TEST_DB_* como tests/test_glpi_queries.py)
+"""
+import sys
+import os
+import re
+import random
+import sqlite3
+import argparse
+from datetime import datetime, timedelta
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db_handler import DBHandler
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "glpi_schema.sql")
+
+# Países con los mismos entities_id que entity_map de config.json
+COUNTRIES = [(150, "EPA SV"), (155, "EPA GT"), (123, "EPA VE"), (142, "EPA CR")]
+BATCH = 10000
+
+
+def technician_email(index):
+    return f"tecnico{index}@example.com"
+
+
+def generate(tickets=10000, technicians=10, requesters=500, days=90, stores_per_country=25, seed=1, now=None):
+    """
+    Devuelve {tabla: iterador de filas} listo para insertar. Los tickets se reparten en los últimos
+    'days' días (hasta 'now'): ~85% resueltos/cerrados, el resto abiertos o borrados; ~5% con dos técnicos.
+    Los técnicos son los users_id 1..technicians con correo tecnicoN@example.com.
+    """
+    now = now or datetime.now()
+
+    entities = [(0, "Raíz", None, "Raíz", 0)]
+    store_ids = []
+    next_id = 1000
+    for country_id, country in COUNTRIES:
+        entities.append((country_id, country, 0, f"Raíz > {country}", 1))
+        for n in range(1, stores_per_country + 1):
+            entities.append((next_id, f"Tienda {n:03d}", country_id, f"Raíz > {country} > Tienda {n:03d}", 2))
+            store_ids.append(next_id)
+            next_id += 1
+
+    users, emails = [], []
+    for uid in range(1, technicians + requesters + 1):
+        is_tech = uid <= technicians
+        users.append((uid, f"user{uid}", f"Apellido{uid}", f"Nombre{uid}", 1, 0))
+        if is_tech:
+            emails.append((uid, 1, technician_email(uid)))
+            # Algunos técnicos tienen además un correo secundario
+            if uid % 3 == 0:
+                emails.append((uid, 0, f"alias{uid}@example.com"))
+        else:
+            emails.append((uid, 1, f"solicitante{uid}@example.com"))
+
+    span_minutes = days * 24 * 60
+
+    def fmt(value):
+        return value.strftime("%Y-%m-%d %H:%M:%S") if value else None
+
+    def ticket_rows():
+        local = random.Random(seed + 1)
+        for tid in range(1, tickets + 1):
+            solved = now - timedelta(minutes=local.randrange(span_minutes))
+            opened = solved - timedelta(minutes=local.randrange(15, 3 * 24 * 60))
+            roll = local.random()
+            if roll < 0.85:
+                status, solvedate, deleted = local.choice((5, 6)), solved, 0
+            elif roll < 0.97:
+                status, solvedate, deleted = local.choice((1, 2, 3, 4)), None, 0
+            else:
+                status, solvedate, deleted = 6, solved, 1
+            entity = local.choice(store_ids) if local.random() < 0.9 else local.choice(COUNTRIES)[0]
+            yield (tid, entity, f"Incidencia {tid}: caja registradora sin conexión", fmt(opened), fmt(solvedate),
+                   fmt(solvedate), fmt(solvedate or opened), status, deleted)
+
+    def ticket_user_rows():
+        local = random.Random(seed + 2)
+        for tid in range(1, tickets + 1):
+            tech = local.randint(1, technicians)
+            yield (tid, tech, 2)
+            if local.random() < 0.05 and technicians > 1:
+                yield (tid, tech % technicians + 1, 2)
+            yield (tid, technicians + local.randint(1, requesters), 1)
+
+    return {
+        "glpi_entities": ("id, name, entities_id, completename, level", iter(entities)),
+        "glpi_users": ("id, name, realname, firstname, is_active, is_deleted", iter(users)),
+        "glpi_useremails": ("users_id, is_default, email", iter(emails)),
+        "glpi_tickets": ("id, entities_id, name, date, solvedate, closedate, date_mod, status, is_deleted", ticket_rows()),
+        "glpi_tickets_users": ("tickets_id, users_id, type", ticket_user_rows()),
+    }
+
+
+def _batches(rows, size=BATCH):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _insert_all(conn, placeholder, data):
+    cursor = conn.cursor()
+    total = 0
+    for table, (columns, rows) in data.items():
+        sql = f"INSERT INTO {table} ({columns}) VALUES ({', '.join([placeholder] * len(columns.split(',')))})"
+        for batch in _batches(rows):
+            cursor.executemany(sql, batch)
+            total += len(batch)
+        conn.commit()
+    cursor.close()
+    return total
+
+
+def sqlite_schema():
+    """Traduce fixtures/glpi_schema.sql (MySQL) a DDL de SQLite con los mismos índices."""
+    statements = []
+    with open(SCHEMA_PATH, encoding="utf-8") as f:
+        text = re.sub(r"--[^\n]*", "", f.read()).replace("`", "")
+    for block in re.findall(r"CREATE TABLE (\w+) \((.*?)\n\)[^;]*;", text, re.S):
+        table, body = block
+        columns, indexes = [], []
+        for line in (l.strip().rstrip(",") for l in body.strip().splitlines()):
+            unique = re.match(r"UNIQUE KEY (\w+) \((.*)\)", line)
+            key = re.match(r"KEY (\w+) \((.*)\)", line)
+            if unique:
+                indexes.append(f"CREATE UNIQUE INDEX {table}_{unique.group(1)} ON {table} ({unique.group(2)})")
+            elif key:
+                indexes.append(f"CREATE INDEX {table}_{key.group(1)} ON {table} ({key.group(2)})")
+            elif line.startswith("PRIMARY KEY"):
+                continue
+            elif line.startswith("id "):
+                columns.append("id INTEGER PRIMARY KEY")
+            else:
+                columns.append(line.replace("AUTO_INCREMENT", ""))
+        statements.append(f"CREATE TABLE {table} ({', '.join(columns)})")
+        statements.extend(indexes)
+    return statements
+
+
+def load_sqlite(path, **options):
+    """Crea (o recrea) una base SQLite con el esquema GLPI y los datos generados. Devuelve filas insertadas."""
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    for statement in sqlite_schema():
+        conn.execute(statement)
+    total = _insert_all(conn, "?", generate(**options))
+    conn.execute("ANALYZE")
+    conn.close()
+    return total
+
+
+def load_mysql(conn, **options):
+    """Recrea las tablas de fixtures/glpi_schema.sql en un MySQL/MariaDB y las llena."""
+    cursor = conn.cursor()
+    # La entidad raíz de GLPI tiene id 0 (con AUTO_INCREMENT MySQL lo cambiaría por el siguiente)
+    cursor.execute("SET SESSION sql_mode = CONCAT(@@sql_mode, ',NO_AUTO_VALUE_ON_ZERO')")
+    with open(SCHEMA_PATH, encoding="utf-8") as f:
+        for statement in f.read().split(";"):
+            if statement.strip():
+                cursor.execute(statement)
+    cursor.close()
+    total = _insert_all(conn, "%s", generate(**options))
+    cursor = conn.cursor()
+    for table in ("glpi_entities", "glpi_users", "glpi_useremails", "glpi_tickets", "glpi_tickets_users"):
+        cursor.execute(f"ANALYZE TABLE {table}")
+        cursor.fetchall()
+    cursor.close()
+    return total
+
+
+def mysql_test_connection():
+    import mysql.connector
+    return mysql.connector.connect(
+        host=os.getenv("GLPI_TEST_DB_HOST"),
+        port=int(os.getenv("GLPI_TEST_DB_PORT", "3306")),
+        user=os.getenv("GLPI_TEST_DB_USER", "root"),
+        password=os.getenv("GLPI_TEST_DB_PASSWORD", ""),
+        database=os.getenv("GLPI_TEST_DB_NAME", "glpi_test"),
+    )
+
+
+class _SqliteCursor:
+    """Cursor estilo mysql.connector sobre sqlite3 que traduce el dialecto de las consultas de DBHandler."""
+    def __init__(self, conn, dictionary=False):
+        self._cursor = conn.cursor()
+        self._dictionary = dictionary
+
+    @staticmethod
+    def translate(sql):
+        sql = sql.replace("%s", "?")
+        sql = re.sub(r"DATE_SUB\(CURRENT_DATE\(\), INTERVAL \? DAY\)", "date('now', 'localtime', '-' || ? || ' days')", sql)
+        sql = sql.replace("CURRENT_DATE()", "date('now', 'localtime')")
+        sql = re.sub(r"CONCAT\(([^)]*)\)", lambda m: "(" + " || ".join(a.strip() for a in m.group(1).split(",")) + ")", sql)
+        return sql
+
+    @staticmethod
+    def _params(params):
+        return tuple(p.strftime("%Y-%m-%d %H:%M:%S") if isinstance(p, datetime) else p for p in params or ())
+
+    def execute(self, sql, params=()):
+        self._cursor.execute(self.translate(sql), self._params(params))
+
+    def executemany(self, sql, rows):
+        self._cursor.executemany(self.translate(sql), [self._params(r) for r in rows])
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return dict(zip([d[0] for d in self._cursor.description], row))
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._row(r) for r in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._row(r) for r in self._cursor.fetchall()]
+
+    def close(self):
+        self._cursor.close()
+
+
+class _SqliteConnection:
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+
+    def cursor(self, dictionary=False, buffered=None):
+        return _SqliteCursor(self._conn, dictionary)
+
+    def is_connected(self):
+        return True
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        pass
+
+    def consume_results(self):
+        pass
+
+    def close(self):
+        self._conn.close()
+
+
+class SqliteGlpiHandler(DBHandler):
+    """DBHandler que lee de una base SQLite generada con load_sqlite (mismas consultas, sin MySQL)."""
+    def __init__(self, path, local_db=None):
+        super().__init__(local_db=local_db)
+        self.path = path
+
+    def get_connection(self):
+        with self._metrics_lock:
+            self.metrics["checkouts"] += 1
+        return _SqliteConnection(self.path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generador de datos GLPI sintéticos")
+    parser.add_argument("--tickets", type=int, default=10000)
+    parser.add_argument("--technicians", type=int, default=10)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--sqlite", default=None, help="Ruta de la base SQLite a generar")
+    parser.add_argument("--mysql", action="store_true", help="Cargar en el MySQL de GLPI_TEST_DB_*")
+    args = parser.parse_args()
+
+    options = dict(tickets=args.tickets, technicians=args.technicians, days=args.days, seed=args.seed)
+    if args.mysql:
+        conn = mysql_test_connection()
+        total = load_mysql(conn, **options)
+        conn.close()
+        print(f"MySQL: {total} filas insertadas.")
+    else:
+        path = args.sqlite or os.path.join(os.path.dirname(os.path.abspath(__file__)), "glpi_fixture.db")
+        total = load_sqlite(path, **options)
+        print(f"SQLite {path}: {total} filas insertadas.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import sys
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+mysql_connector = pytest.importorskip("mysql.connector")
+
+from db_handler import DBHandler
+
+# MySQL/MariaDB local descartable, p.ej.:
+#   docker run -d -p 3307:3306 -e MYSQL_ROOT_PASSWORD=test -e MYSQL_DATABASE=glpi_test mysql:8
+# GLPI_TEST_DB_HOST=127.0.0.1 GLPI_TEST_DB_PORT=3307 GLPI_TEST_DB_PASSWORD=test pytest tests/test_glpi_queries.py -s
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "glpi_schema.sql")
+
+
+@pytest.fixture(scope="module")
+def glpi_conn():
+    if not os.getenv("GLPI_TEST_DB_HOST"):
+        pytest.skip("GLPI_TEST_DB_HOST no configurado (se necesita un MySQL local de prueba).")
+    try:
+        conn = mysql_connector.connect(
+            host=os.getenv("GLPI_TEST_DB_HOST"),
+            port=int(os.getenv("GLPI_TEST_DB_PORT", "3306")),
+            user=os.getenv("GLPI_TEST_DB_USER", "root"),
+            password=os.getenv("GLPI_TEST_DB_PASSWORD", ""),
+            database=os.getenv("GLPI_TEST_DB_NAME", "glpi_test"),
+        )
+    except Exception as e:
+        pytest.skip(f"MySQL de prueba no disponible: {e}")
+
+    cursor = conn.cursor()
+    with open(SCHEMA_PATH, encoding="utf-8") as f:
+        for statement in f.read().split(";"):
+            if statement.strip():
+                cursor.execute(statement)
+    seed(cursor)
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def seed(cursor, users=50, tickets=5000):
+    cursor.executemany(
+        "INSERT INTO glpi_entities (id, name, completename) VALUES (%s, %s, %s)",
+        [(i, f"E{i}", f"Raíz > E{i}") for i in range(1, 6)]
+    )
+    cursor.executemany(
+        "INSERT INTO glpi_users (id, name, realname, firstname) VALUES (%s, %s, %s, %s)",
+        [(i, f"user{i}", f"Apellido{i}", f"Nombre{i}") for i in range(1, users + 1)]
+    )
+    cursor.executemany(
+        "INSERT INTO glpi_useremails (users_id, is_default, email) VALUES (%s, 1, %s)",
+        [(i, f"user{i}@example.com") for i in range(1, users + 1)]
+    )
+    base = datetime(2026, 1, 1, 8, 0)
+    cursor.executemany(
+        "INSERT INTO glpi_tickets (id, entities_id, name, solvedate, status) VALUES (%s, %s, %s, %s, %s)",
+        [(i, i % 5 + 1, f"Ticket {i}", base + timedelta(minutes=17 * i), 5 + i % 2) for i in range(1, tickets + 1)]
+    )
+    cursor.executemany(
+        "INSERT INTO glpi_tickets_users (tickets_id, users_id, type) VALUES (%s, %s, %s)",
+        [(i, i % users + 1, 2) for i in range(1, tickets + 1)] + [(i, (i + 7) % users + 1, 1) for i in range(1, tickets + 1)]
+    )
+    for table in ("glpi_tickets", "glpi_tickets_users", "glpi_users", "glpi_useremails"):
+        cursor.execute(f"ANALYZE TABLE {table}")
+        cursor.fetchall()
+
+
+BY_USER = DBHandler.TICKETS_QUERY.format(users="gtu.users_id IN (%s)", where="gt.solvedate >= %s")
+BY_EMAIL = DBHandler.TICKETS_BY_EMAIL_QUERY.format(emails="%s", where="gt.solvedate >= %s")
+
+
+def explain(conn, query, params):
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("EXPLAIN " + query.rstrip().rstrip(";"), params)
+    plan = cursor.fetchall()
+    cursor.close()
+    return plan
+
+
+def test_users_id_query_uses_tickets_users_index(glpi_conn):
+    since = datetime(2026, 1, 20)
+    by_email = explain(glpi_conn, BY_EMAIL, ("user3@example.com", since))
+    by_user = explain(glpi_conn, BY_USER, (3, since))
+
+    for label, plan in (("por email", by_email), ("por users_id", by_user)):
+        print(f"\nEXPLAIN {label}:")
+        for row in plan:
+            print(f"  {row['table']:>4} type={row['type']} key={row['key']} rows={row['rows']}")
+
+    tables = {row["table"]: row for row in by_user}
+    assert "gue" not in tables
+    assert tables["gtu"]["key"] == "user"
+    assert tables["gtu"]["type"] == "ref"
+    assert "gue" in {row["table"] for row in by_email}
+
+    # Ambas formas devuelven lo mismo
+    cursor = glpi_conn.cursor()
+    cursor.execute(BY_EMAIL, ("user3@example.com", since))
+    email_rows = cursor.fetchall()
+    cursor.execute(BY_USER, (3, since))
+    assert cursor.fetchall() == email_rows
+    cursor.close()
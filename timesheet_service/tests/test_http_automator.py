@@ -0,0 +1,54 @@
+import sys
+import os
+
+import pytest
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+pytest.importorskip("requests")
+
+from xtiming_stub import XtimingStub, STUB_USER, STUB_PASSWORD
+from http_automator import HttpAutomator
+
+
+def entry(n):
+    return {"title": f"Ticket {n}", "ticket_id": str(n), "start_time": f"02.03.2026 0{n}:00",
+            "end_time": f"02.03.2026 0{n}:30", "client": "Intelix", "project": "Gestión - Intelix",
+            "activity": "Soporte", "tags": "Soporte"}
+
+
+def test_expired_session_is_not_reported_as_saved(monkeypatch):
+    stub = XtimingStub().start()
+    monkeypatch.setenv("XTIMING_URL", stub.base_url)
+    bot = HttpAutomator({"app": {"persist_session": False}}, credentials=(STUB_USER, STUB_PASSWORD))
+    try:
+        assert bot.fill_timesheet_entry(entry(1))
+        assert len(stub.state.entries) == 1
+
+        # La sesión vence entre dos guardados: el POST redirige a /login y hay que reautenticar
+        stub.state.expire_sessions()
+        assert bot.fill_timesheet_entry(entry(2))
+        assert len(stub.state.entries) == 2
+        assert stub.state.logins == 2
+
+        # Si el login no recupera la sesión, el guardado se informa como fallido
+        monkeypatch.setattr("web_automator.time.sleep", lambda seconds: None)
+        bot.password = "incorrecta"
+        stub.state.expire_sessions()
+        assert not bot.fill_timesheet_entry(entry(3))
+        assert len(stub.state.entries) == 2
+    finally:
+        bot.close_browser()
+        stub.stop()
+
+
+def test_only_list_or_detail_redirects_count_as_saved():
+    bot = HttpAutomator({"app": {"persist_session": False}})
+    bot.base_url = "https://xtiming.example/index.php/es"
+    assert bot._is_saved_redirect("/index.php/es/timesheet/")
+    assert bot._is_saved_redirect("https://xtiming.example/index.php/es/timesheet/42/edit")
+    assert not bot._is_saved_redirect("/index.php/es/login")
+    assert not bot._is_saved_redirect("/index.php/es/timesheet/create")
+    assert not bot._is_saved_redirect("")
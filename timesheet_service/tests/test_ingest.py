@@ -0,0 +1,115 @@
+import sys
+import os
+import tempfile
+
+import pytest
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import glpi_fixture
+from bench_ingest import make_service
+from local_db import LocalDB
+
+
+def make_ingest(monkeypatch, tickets=3000, technicians=3, emails=1):
+    monkeypatch.delenv("TG_BOT_TOKEN", raising=False)
+    monkeypatch.delenv("GLPI_USER_IDS", raising=False)
+    monkeypatch.setenv("GLPI_USER_EMAIL", glpi_fixture.technician_email(1))
+    if emails > 1:
+        monkeypatch.setenv("GLPI_USER_EMAILS", ",".join(glpi_fixture.technician_email(i) for i in range(1, emails + 1)))
+    else:
+        monkeypatch.delenv("GLPI_USER_EMAILS", raising=False)
+    workdir = tempfile.mkdtemp()
+    path = os.path.join(workdir, "glpi.db")
+    glpi_fixture.load_sqlite(path, tickets=tickets, technicians=technicians, days=3)
+    return make_service(glpi_fixture.SqliteGlpiHandler(path), LocalDB(os.path.join(workdir, "local.db")))
+
+
+def test_watermark_holds_when_local_db_fails(monkeypatch):
+    service = make_ingest(monkeypatch)
+    real_filter = service.local_db.filter_unprocessed
+
+    # Error transitorio de SQLite: el lote no se encola y la marca de agua no se mueve
+    monkeypatch.setattr(service.local_db, "filter_unprocessed", lambda ids: None)
+    service.routine_sync_backlog(days=3)
+    assert service.local_db.count_pending() == 0
+    assert service.local_db.load_state(service.db.WATERMARK_KEY) is None
+
+    monkeypatch.setattr(service.local_db, "filter_unprocessed", real_filter)
+    service.routine_a()
+    assert service.local_db.count_pending() > 0
+    assert service.local_db.load_state(service.db.WATERMARK_KEY)
+
+
+def test_watermark_is_held_per_technician(monkeypatch):
+    service = make_ingest(monkeypatch, tickets=600, technicians=2, emails=2)
+    real_add = service.local_db.add_pending_tickets
+
+    # Falla solo la inserción del técnico 2: el técnico 1 avanza su marca y el 2 conserva la suya
+    monkeypatch.setattr(service.local_db, "add_pending_tickets",
+                        lambda batch: 0 if batch[0].get("technician_id") == 2 else real_add(batch))
+    service.routine_sync_backlog(days=3)
+    marks = service.db.load_watermarks()
+    assert "1" in marks and "2" not in marks
+    assert dict(service.local_db.get_pending_technicians()).get(2) is None
+
+    # La siguiente Rutina A lee desde la marca más atrasada y recupera los tickets del técnico 2
+    monkeypatch.setattr(service.local_db, "add_pending_tickets", real_add)
+    service.routine_a()
+    assert dict(service.local_db.get_pending_technicians()).get(2)
+    assert service.db.load_watermarks()["2"] == marks["1"]
+
+
+def test_truncated_stream_holds_watermark(monkeypatch):
+    service = make_ingest(monkeypatch, tickets=600)
+    service.db.fetch_chunk_size = 100
+    real_fetchmany = glpi_fixture._SqliteCursor.fetchmany
+    calls = []
+
+    def fetchmany(cursor, size=1):
+        calls.append(size)
+        if len(calls) == 3:
+            raise RuntimeError("Lost connection to MySQL server during query")
+        return real_fetchmany(cursor, size)
+
+    # La conexión se corta en el tercer bloque: el iterador relanza el error en vez de terminar
+    monkeypatch.setattr(glpi_fixture._SqliteCursor, "fetchmany", fetchmany)
+    with pytest.raises(RuntimeError):
+        list(service.db.iter_closed_tickets_range(days=3))
+
+    # La sincronización encola lo leído pero no mueve la marca de agua sobre lo que no llegó a leer
+    calls.clear()
+    service.routine_sync_backlog(days=3)
+    assert service.local_db.count_pending() > 0
+    assert service.db.load_watermarks() == {}
+
+
+def test_technicians_resolved_once_per_handler(monkeypatch):
+    service = make_ingest(monkeypatch, tickets=200)
+    handler = service.db
+    handler.local_db = None  # Sin caché en app_state: solo la del propio handler
+
+    handler.fetch_closed_tickets_range(3)
+    checkouts = handler.metrics["checkouts"]
+    handler.fetch_closed_tickets_range(3)
+    handler.fetch_closed_tickets_today()
+    assert handler.metrics["checkouts"] == checkouts + 2
+
+
+def test_shared_ticket_is_queued_for_each_technician(monkeypatch):
+    service = make_ingest(monkeypatch, tickets=400, technicians=2, emails=2)
+    service.routine_sync_backlog(days=3)
+
+    with service.local_db._get_conn() as conn:
+        rows = conn.execute("SELECT ticket_id, technician_id FROM pending_tickets").fetchall()
+    # El técnico principal conserva la clave simple; el adicional usa "<ticket_id>@<users_id>"
+    assert all(("@" in key) == (technician == 2) for key, technician in rows)
+    keys = {key for key, _ in rows}
+    assert any(f"{key}@2" in keys for key in keys)
+
+    # Ya encolados para ambos técnicos: la siguiente sincronización no agrega nada
+    pending = service.local_db.count_pending()
+    service.routine_sync_backlog(days=3)
+    assert service.local_db.count_pending() == pending
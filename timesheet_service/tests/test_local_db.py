@@ -0,0 +1,152 @@
+import sys
+import os
+import tempfile
+import threading
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from local_db import LocalDB
+
+
+def make_db():
+    return LocalDB(os.path.join(tempfile.mkdtemp(), "local_state.db"))
+
+
+def test_bulk_ingest_and_commit():
+    db = make_db()
+    tickets = [{"ticket_id": i, "ticket_title": f"T{i}", "solvedate": "2026-03-02 10:00:00"} for i in range(10)]
+    tickets.append({"source": "telegram", "ticket_id": "TEL-1", "target_date": "2026-03-03", "manual_hours": 2})
+
+    assert db.add_pending_tickets(tickets) == 11
+    assert db.get_pending_dates() == [("2026-03-02", 10), ("2026-03-03", 1)]
+    assert db.count_pending(source="telegram") == 1
+
+    db.journal_slot("1", "2026-03-02", "02.03.2026 07:30", "02.03.2026 08:00")
+    assert db.commit_processed(["1", "2", "TEL-1"])
+    assert db.count_pending() == 8
+    assert db.get_journaled_slots("2026-03-02") == set()
+    assert db.filter_unprocessed(["1", "3", "TEL-1", "TEL-2"]) == ["3", "TEL-2"]
+
+
+def test_batch_order_is_stable():
+    db = make_db()
+    # Un lote comparte created_at: el orden lo desempata ticket_id, igual en cada corrida
+    db.add_pending_tickets([{"ticket_id": i, "solvedate": "2026-03-02 10:00:00"} for i in (3, 1, 2)])
+
+    assert [t["ticket_id"] for t in db.get_pending_tickets("2026-03-02")] == [1, 2, 3]
+    assert db.get_pending_ids_by_date("2026-03-02") == ["1", "2", "3"]
+
+
+def test_pending_queue_per_technician():
+    db = make_db()
+    db.add_pending_tickets([
+        {"ticket_id": 1, "solvedate": "2026-03-02 10:00:00", "technician_id": 7},
+        {"ticket_id": 2, "solvedate": "2026-03-02 11:00:00", "technician_id": 8},
+        {"ticket_id": 3, "solvedate": "2026-03-03 09:00:00", "technician_id": 7},
+        {"source": "telegram", "ticket_id": "TEL-1", "target_date": "2026-03-02"},
+    ])
+
+    assert db.get_pending_technicians() == [(0, 1), (7, 2), (8, 1)]
+    assert db.get_pending_dates(technician_id=7) == [("2026-03-02", 1), ("2026-03-03", 1)]
+    assert [t["ticket_id"] for t in db.get_pending_tickets("2026-03-02", technician_id=0)] == ["TEL-1"]
+    assert db.count_pending(technician_id=8) == 1 and db.count_pending() == 4
+
+
+def test_per_day_lookups_use_work_date_index():
+    db = make_db()
+    db.add_pending_tickets([{"ticket_id": i, "solvedate": f"2026-03-{i % 28 + 1:02d} 10:00:00"} for i in range(500)])
+    db.add_pending_ticket({"source": "telegram", "ticket_id": "TEL-1", "manual_hours": 1})
+    # Un ticket sin fecha queda en el día en que se encoló (guardado, no calculado al consultar)
+    assert db._get_conn().execute("SELECT COUNT(*) FROM pending_tickets WHERE work_date IS NULL").fetchone()[0] == 0
+
+    where, params = db._pending_where("2026-03-02")
+    plan = " ".join(row[3] for row in db._get_conn().execute(
+        f"EXPLAIN QUERY PLAN SELECT data FROM pending_tickets{where}", params))
+    assert "USING INDEX idx_pending_work_date" in plan
+    where, params = db._pending_where("2026-03-02", technician_id=0)
+    plan = " ".join(row[3] for row in db._get_conn().execute(
+        f"EXPLAIN QUERY PLAN SELECT COUNT(*) FROM pending_tickets{where}", params))
+    assert "idx_pending_technician_date" in plan
+
+
+def test_worker_threads_release_their_connection():
+    db = make_db()
+
+    def worker(n):
+        try:
+            db.journal_slot(str(n), "2026-03-02", "02.03.2026 07:30", "02.03.2026 08:00")
+        finally:
+            db.close_thread_conn()
+
+    for batch in range(3):
+        threads = [threading.Thread(target=worker, args=(batch * 10 + i,)) for i in range(4)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+
+    assert len(db._conns) == 1
+    assert len(db.get_journaled_slots("2026-03-02")) == 12
+
+
+def test_known_glpi_ids_for_query_exclusion():
+    db = make_db()
+    db.add_pending_tickets([{"ticket_id": 5, "solvedate": "2026-03-02 10:00:00"},
+                            {"source": "telegram", "ticket_id": "TEL-1", "target_date": "2026-03-02"}])
+    db.commit_processed(["1", "2", "007", "TEL-9", "5@8"])
+    with db._get_conn() as conn:
+        conn.execute("UPDATE processed_tickets SET processed_at = '2025-01-08 10:00:00' WHERE ticket_id = '2'")
+
+    assert db.get_known_glpi_ids(days=30) == {None: {1, 5}, 8: {5}}
+
+
+def test_entities_mirror():
+    db = make_db()
+    db.replace_entities([{"id": 0, "name": "Raíz", "completename": "Raíz", "parent_id": None},
+                         {"id": 150, "name": "EPA SV", "completename": "Raíz > EPA SV", "parent_id": 0}])
+    assert db.get_entity("150")["completename"] == "Raíz > EPA SV"
+    assert db.load_state(LocalDB.ENTITIES_REFRESHED_KEY, max_age_hours=1) == 2
+
+    db.replace_entities([{"id": 150, "name": "EPA SV", "completename": "Raíz > EPA El Salvador", "parent_id": 0}])
+    assert db.get_entity(150)["completename"] == "Raíz > EPA El Salvador"
+    assert db.get_entity(0) is None and db.get_entity(None) is None
+
+
+def test_processed_index_matches_database():
+    db = make_db()
+    db.commit_processed([str(i) for i in range(0, 2000, 2)] + [f"BATCH-{i}" for i in range(1500)])
+
+    assert db.is_processed("10") and not db.is_processed("11")
+    assert db.is_processed("BATCH-7") and not db.is_processed("BATCH-99999")
+    assert not db.is_processed("010")
+
+    # Escrituras de otra instancia (p.ej. un barrido en otro proceso) se ven al filtrar por lote
+    LocalDB(db.db_path).mark_processed("12345")
+    assert db.filter_unprocessed(["12345", "12347"]) == ["12347"]
+
+
+def test_archive_keeps_processed_proof():
+    db = make_db()
+    db.commit_processed(["100", "TEL-OLD", "200", "TEL-NEW"])
+    with db._get_conn() as conn:
+        conn.execute("UPDATE processed_tickets SET processed_at = '2025-01-08 10:00:00' WHERE ticket_id != 'TEL-NEW'")
+
+    assert db.archive_processed(retention_weeks=4) == 3
+    assert db._get_conn().execute("SELECT week, ticket_count FROM processed_archive").fetchall() == [("2025-W02", 3)]
+    # Archivados: siguen figurando como procesados, también en otra instancia recién abierta
+    fresh = LocalDB(db.db_path)
+    assert fresh.filter_unprocessed(["100", "TEL-OLD", "TEL-NEW", "300"]) == ["300"]
+    assert fresh.is_processed("TEL-OLD")
+    assert fresh._get_conn().execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+
+if __name__ == "__main__":
+    test_bulk_ingest_and_commit()
+    test_batch_order_is_stable()
+    test_pending_queue_per_technician()
+    test_per_day_lookups_use_work_date_index()
+    test_worker_threads_release_their_connection()
+    test_known_glpi_ids_for_query_exclusion()
+    test_entities_mirror()
+    test_processed_index_matches_database()
+    test_archive_keeps_processed_proof()
+    print("OK")
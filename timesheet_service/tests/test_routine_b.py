@@ -0,0 +1,52 @@
+import sys
+import os
+import json
+import asyncio
+from datetime import datetime
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tracing
+from scheduler_service import SchedulerService
+
+
+class FailingAsyncBot:
+    """Bot async mínimo cuyo guardado siempre falla (cuenta los intentos)."""
+    concurrency = 1
+
+    def __init__(self):
+        self.tracer = tracing.StepTracer()
+        self.attempts = 0
+
+    async def start_browser(self):
+        pass
+
+    async def close_browser(self):
+        pass
+
+    async def fill_timesheet_entry(self, entry_data):
+        self.attempts += 1
+        await asyncio.sleep(0.01)
+        return False
+
+
+def test_async_queue_skips_ticket_after_max_failures(monkeypatch):
+    monkeypatch.delenv("TG_BOT_TOKEN", raising=False)
+    config_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config.json")
+    with open(config_path, "r") as f:
+        config = json.load(f)
+    config["app"].update(submit_engine="http", skip_existing_entries=False)
+
+    # conftest.isolated_local_db: el LocalDB() de __init__ es una base temporal, no data/local_state.db
+    service = SchedulerService(config)
+    service.bot = service._default_bot = FailingAsyncBot()
+    today = datetime.now().strftime("%Y-%m-%d")
+    service.local_db.add_pending_ticket({"ticket_id": 900, "ticket_title": "Caja", "solvedate": f"{today} 10:00:00",
+                                         "entities_id": 150})
+
+    asyncio.run(service.routine_b_async())
+
+    # Con una página los slots van de a uno: tras MAX_FAILURES_PER_TICKET fallos el resto se salta
+    assert service.bot.attempts == SchedulerService.MAX_FAILURES_PER_TICKET
+    assert service.local_db.count_pending() == 1
@@ -0,0 +1,82 @@
+import sys
+import os
+import asyncio
+
+import pytest
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+pytest.importorskip("playwright")
+
+from playwright.sync_api import sync_playwright
+from xtiming_stub import XtimingStub, STUB_USER, STUB_PASSWORD
+
+
+def chromium_missing():
+    try:
+        with sync_playwright() as p:
+            p.chromium.launch(headless=True).close()
+        return False
+    except Exception:
+        return True
+
+
+pytestmark = pytest.mark.skipif(chromium_missing(), reason="Chromium de Playwright no instalado")
+
+CONFIG = {"app": {"persist_session": False, "headless_browser": True, "async_concurrency": 1}}
+
+
+def entry(n):
+    return {"title": f"Ticket {n}", "ticket_id": str(n), "start_time": f"02.03.2026 0{n}:00",
+            "end_time": f"02.03.2026 0{n}:30", "client": "Intelix", "project": "Gestión - Intelix",
+            "activity": "Soporte", "tags": "Soporte"}
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    server = XtimingStub().start()
+    monkeypatch.setenv("XTIMING_URL", server.base_url)
+    yield server
+    server.stop()
+
+
+def test_expired_session_is_not_reported_as_saved(stub, monkeypatch):
+    from web_automator import WebAutomator
+    bot = WebAutomator(CONFIG, credentials=(STUB_USER, STUB_PASSWORD))
+    try:
+        assert bot.fill_timesheet_entry(entry(1))
+        assert len(stub.state.entries) == 1
+
+        # La sesión vence entre dos guardados: el formulario redirige a /login y hay que reautenticar
+        stub.state.expire_sessions()
+        assert bot.fill_timesheet_entry(entry(2))
+        assert len(stub.state.entries) == 2
+        assert stub.state.logins == 2
+
+        # Si el login no recupera la sesión, el guardado se informa como fallido
+        monkeypatch.setattr("web_automator.time.sleep", lambda seconds: None)
+        bot.password = "incorrecta"
+        stub.state.expire_sessions()
+        assert not bot.fill_timesheet_entry(entry(3))
+        assert len(stub.state.entries) == 2
+    finally:
+        bot.close_browser()
+
+
+def test_async_expired_session_is_not_reported_as_saved(stub):
+    from async_web_automator import AsyncWebAutomator
+
+    async def run():
+        bot = AsyncWebAutomator(CONFIG, credentials=(STUB_USER, STUB_PASSWORD))
+        try:
+            assert await bot.fill_timesheet_entry(entry(1))
+            stub.state.expire_sessions()
+            assert await bot.fill_timesheet_entry(entry(2))
+        finally:
+            await bot.close_browser()
+
+    asyncio.run(run())
+    assert len(stub.state.entries) == 2
+    assert stub.state.logins == 2
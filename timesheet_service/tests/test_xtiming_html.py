@@ -0,0 +1,23 @@
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import xtiming_html
+
+
+def test_error_block_with_void_tags_closes():
+    html = """
+    <form><div class="alert alert-danger">El horario se superpone<br>con otro registro <img src="x.png"></div>
+    <input type="text" name="title" value="Ticket"><label>Descripción</label><br/>
+    <textarea name="desc">Texto</textarea></form>
+    """
+    assert xtiming_html.parse_errors(html) == ["El horario se superpone con otro registro"]
+    fields = xtiming_html.parse_forms(html)[0]["fields"]
+    assert [f["name"] for f in fields] == ["title", "desc"]
+
+
+if __name__ == "__main__":
+    test_error_block_with_void_tags_closes()
+    print("OK")
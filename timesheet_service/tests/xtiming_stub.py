@@ -0,0 +1,431 @@
+"""
+Servidor HTTP local que imita las páginas de xtiming que usa el servicio
+(/login, /timesheet/ y /timesheet/create) para poder medir los motores de registro
+sin tocar producción.
+
+Los catálogos (clientes, proyectos, actividades, tags) salen del form_dump.html que genera
+tests/inspect_form.py si se indica; si no, se usa un catálogo fijo de ejemplo.
+
+Uso:
+    server = XtimingStub(form_dump="form_dump.html", latency_ms=80, error_rate=0.05)
+    server.start()
+    os.environ["XTIMING_URL"] = server.base_url
+    ...
+    server.stop()
+
+    python tests/xtiming_stub.py [--port 8088] [--form-dump form_dump.html] [--latency-ms 80] [--error-rate 0.05] [--ajax]
+"""
+import os
+import sys
+import json
+import html
+import time
+import random
+import secrets
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import xtiming_html
+
+PREFIX = "/index.php/es"
+
+STUB_USER = "bench.user"
+STUB_PASSWORD = "bench.pass"
+
+CUSTOMERS = {
+    "1": "Comercializadoras EPA",
+    "2": "EPA SV",
+    "3": "EPA GT",
+    "4": "EPA VE",
+    "5": "EPA CR",
+    "6": "Intelix",
+}
+PROJECTS = {
+    "10": ("1", "Continuidad de Aplicaciones - Comercializadoras EPA"),
+    "20": ("2", "Continuidad de Aplicaciones - EPA SV"),
+    "30": ("3", "Continuidad de Aplicaciones - EPA GT"),
+    "40": ("4", "Continuidad de Aplicaciones - EPA VE"),
+    "50": ("5", "Continuidad de Aplicaciones - EPA CR"),
+    "60": ("6", "Gestión - Intelix"),
+}
+ACTIVITIES = {"100": "Caja Registradora", "101": "Soporte", "102": "Desarrollo"}
+TAGS = ["Soporte", "Desarrollo", "Reunión"]
+
+# Shim mínimo con la misma estructura DOM que Select2 (contenedor, buscador, resultados)
+SELECT2_SHIM = """
+<script>
+(function () {
+  function closeAll() {
+    document.querySelectorAll('.select2-dropdown-open').forEach(function (d) { d.remove(); });
+  }
+  function label(sel) {
+    var picked = Array.prototype.filter.call(sel.options, function (o) { return o.selected && o.value; });
+    return picked.length ? picked.map(function (o) { return o.text; }).join(', ') : 'Seleccionar...';
+  }
+  function open(sel, rendered) {
+    closeAll();
+    var dd = document.createElement('span');
+    dd.className = 'select2-container select2-dropdown-open';
+    dd.innerHTML = '<span class="select2-search"><input class="select2-search__field" type="search"></span>' +
+                   '<ul class="select2-results__options" style="min-height:20px"></ul>';
+    document.body.appendChild(dd);
+    var input = dd.querySelector('.select2-search__field');
+    var ul = dd.querySelector('.select2-results__options');
+    function render() {
+      var q = input.value.toLowerCase();
+      ul.innerHTML = '';
+      Array.prototype.forEach.call(sel.options, function (o) {
+        if (!o.value || o.text.toLowerCase().indexOf(q) === -1) return;
+        var li = document.createElement('li');
+        li.className = 'select2-results__option';
+        li.textContent = o.text;
+        li.addEventListener('click', function () {
+          if (sel.multiple) { o.selected = true; } else { sel.value = o.value; }
+          sel.dispatchEvent(new Event('change', { bubbles: true }));
+          rendered.textContent = label(sel);
+          closeAll();
+        });
+        ul.appendChild(li);
+      });
+    }
+    input.addEventListener('input', render);
+    render();
+    input.focus();
+  }
+  document.querySelectorAll('select[data-select2]').forEach(function (sel) {
+    var wrap = document.createElement('span');
+    wrap.className = 'select2 select2-container';
+    wrap.innerHTML = '<span class="select2-selection"><span class="select2-selection__rendered" id="select2-' +
+                     sel.id + '-container"></span></span>';
+    var rendered = wrap.querySelector('.select2-selection__rendered');
+    rendered.textContent = label(sel);
+    sel.style.display = 'none';
+    sel.parentNode.insertBefore(wrap, sel.nextSibling);
+    wrap.querySelector('.select2-selection').addEventListener('click', function () { open(sel, rendered); });
+  });
+  // Listas dependientes: el select padre declara data-api-url y el id del select hijo
+  document.querySelectorAll('select[data-api-url][data-related-select]').forEach(function (sel) {
+    sel.addEventListener('change', function () {
+      var target = document.getElementById(sel.getAttribute('data-related-select'));
+      target.innerHTML = '<option value=""></option>';
+      if (!sel.value) return;
+      fetch(sel.getAttribute('data-api-url').replace('-s-', sel.value), { credentials: 'same-origin' })
+        .then(function (r) { return r.json(); })
+        .then(function (items) {
+          items.forEach(function (it) { target.add(new Option(it.name, String(it.id))); });
+        });
+    });
+  });
+  document.addEventListener('keydown', function (e) { if (e.key === 'Escape') closeAll(); });
+})();
+</script>
+"""
+
+
+def _options(items, selected=None, blank=True):
+    out = ['<option value=""></option>'] if blank else []
+    for value, text in items:
+        sel = " selected" if selected and value in selected else ""
+        out.append(f'<option value="{html.escape(value)}"{sel}>{html.escape(text)}</option>')
+    return "".join(out)
+
+
+def _day_key(text):
+    """'02.03.2026' -> '2026-03-02' (comparable como texto)."""
+    d, m, y = (text.strip().split(".") + ["", "", ""])[:3]
+    return f"{y}-{m}-{d}"
+
+
+def load_catalog(form_dump_path):
+    """
+    Extrae clientes, proyectos (con su cliente por optgroup), actividades y tags
+    del formulario real guardado por tests/inspect_form.py.
+    """
+    with open(form_dump_path, "r", encoding="utf-8") as f:
+        forms = xtiming_html.parse_forms(f.read())
+    form = xtiming_html.find_form(forms, field_id="timesheet_edit_form_customer")
+    if not form:
+        raise ValueError(f"{form_dump_path} no contiene el formulario timesheet_edit_form.")
+
+    def options(field_id):
+        field = xtiming_html.get_field(form, field_id)
+        return [o for o in (field or {}).get("options", []) if o["value"]]
+
+    customers = {o["value"]: o["text"] for o in options("timesheet_edit_form_customer")}
+    by_name = {name: cid for cid, name in customers.items()}
+    projects = {o["value"]: (by_name.get(o["group"] or "", ""), o["text"]) for o in options("timesheet_edit_form_project")}
+    activities = {o["value"]: o["text"] for o in options("timesheet_edit_form_activity")}
+    tags = [o["text"] for o in options("timesheet_edit_form_tags")] or TAGS
+    return customers, projects, activities, tags
+
+
+class StubState:
+    """Estado compartido del servidor: sesiones, token CSRF, catálogos, registros guardados y fallas simuladas."""
+    def __init__(self, form_dump=None, latency_ms=0, error_rate=0.0, ajax_projects=False, seed=None):
+        self.lock = threading.Lock()
+        self.sessions = set()
+        self.csrf = secrets.token_hex(16)
+        self.entries = []
+        self.logins = 0
+        self.requests = 0
+        self.injected_errors = 0
+
+        if form_dump:
+            self.customers, self.projects, self.activities, self.tags = load_catalog(form_dump)
+        else:
+            self.customers, self.projects, self.activities, self.tags = CUSTOMERS, PROJECTS, ACTIVITIES, TAGS
+
+        # Latencia fija por petición y probabilidad de rechazar un guardado válido
+        self.latency = latency_ms / 1000.0
+        self.error_rate = error_rate
+        self.ajax_projects = ajax_projects
+        self._random = random.Random(seed)
+
+    def expire_sessions(self):
+        """Invalida todas las sesiones (como un timeout del servidor): el próximo pedido va a /login."""
+        with self.lock:
+            self.sessions.clear()
+
+    def inject_error(self) -> bool:
+        with self.lock:
+            failed = self._random.random() < self.error_rate
+            if failed:
+                self.injected_errors += 1
+            return failed
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    state: StubState = None
+
+    def log_message(self, fmt, *args):
+        pass
+
+    # --- utilidades ---
+
+    def _session(self):
+        cookie = self.headers.get("Cookie", "")
+        for part in cookie.split(";"):
+            k, _, v = part.strip().partition("=")
+            if k == "STUBSESSID" and v in self.state.sessions:
+                return v
+        return None
+
+    def _send(self, status, body="", headers=None):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _redirect(self, location, headers=None):
+        h = {"Location": location}
+        h.update(headers or {})
+        self._send(302, "", h)
+
+    def _form_data(self):
+        length = int(self.headers.get("Content-Length", "0"))
+        return parse_qs(self.rfile.read(length).decode("utf-8"), keep_blank_values=True)
+
+    def _page(self, body):
+        return f"<!doctype html><html><head><meta charset='utf-8'><title>xtiming stub</title></head><body>{body}</body></html>"
+
+    # --- páginas ---
+
+    def _login_page(self, error=""):
+        err = f'<div class="alert alert-danger">{html.escape(error)}</div>' if error else ""
+        return self._page(
+            f"""{err}<form action="{PREFIX}/login_check" method="post">
+            <input type="text" name="_username"><input type="password" name="_password">
+            <input type="hidden" name="_csrf_token" value="{self.state.csrf}">
+            <button type="submit">Entrar</button></form>"""
+        )
+
+    def _home_page(self, query=None):
+        """Listado de registros; 'daterange=dd.mm.yyyy - dd.mm.yyyy' filtra por día de inicio."""
+        days = None
+        daterange = (query or {}).get("daterange", [""])[0]
+        if daterange:
+            start, _, end = daterange.partition(" - ")
+            days = (_day_key(start), _day_key(end or start))
+
+        rows = []
+        with self.state.lock:
+            entries = list(self.state.entries)
+        for e in entries:
+            date, _, begin = e["begin"].partition(" ")
+            if days and not (days[0] <= _day_key(date) <= days[1]):
+                continue
+            rows.append("<tr>" + "".join(f"<td>{html.escape(v)}</td>" for v in (
+                date, begin, e["end"].partition(" ")[2], self.state.customers.get(e["customer"], ""),
+                e["description"], e["ticket_glpi"],
+            )) + "</tr>")
+        return self._page(
+            '<div class="user-menu">bench.user</div><h1>Timesheet</h1>'
+            '<table class="table"><thead><tr><th>Fecha</th><th>Inicio</th><th>Fin</th><th>Cliente</th>'
+            f'<th>Descripción</th><th>Ticket GLPI</th></tr></thead><tbody>{"".join(rows)}</tbody></table>'
+        )
+
+    def _create_page(self, errors=None):
+        err = "".join(f'<div class="alert alert-danger">{html.escape(e)}</div>' for e in (errors or []))
+        st = self.state
+        customers = _options(st.customers.items())
+        projects = ['<option value=""></option>']
+        customer_attrs = ""
+        if st.ajax_projects:
+            # Proyectos cargados por AJAX al elegir el cliente (como el data-api-url de xtiming)
+            customer_attrs = f' data-api-url="{PREFIX}/api/projects?customer=-s-" data-related-select="timesheet_edit_form_project"'
+        else:
+            for cid, cname in st.customers.items():
+                items = [(pid, pname) for pid, (pcid, pname) in st.projects.items() if pcid == cid]
+                projects.append(f'<optgroup label="{html.escape(cname)}">{_options(items, blank=False)}</optgroup>')
+        activities = _options(st.activities.items())
+        tags = _options([(t, t) for t in st.tags])
+        return self._page(
+            f"""<div class="user-menu">bench.user</div>{err}
+            <form name="timesheet_edit_form" method="post" action="{PREFIX}/timesheet/create">
+              <input type="text" id="timesheet_edit_form_begin" name="timesheet_edit_form[begin]" value="">
+              <input type="text" id="timesheet_edit_form_end" name="timesheet_edit_form[end]" value="">
+              <select id="timesheet_edit_form_customer" name="timesheet_edit_form[customer]" data-select2{customer_attrs}>{customers}</select>
+              <select id="timesheet_edit_form_project" name="timesheet_edit_form[project]" data-select2>{"".join(projects)}</select>
+              <select id="timesheet_edit_form_activity" name="timesheet_edit_form[activity]" data-select2>{activities}</select>
+              <textarea id="timesheet_edit_form_description" name="timesheet_edit_form[description]"></textarea>
+              <select id="timesheet_edit_form_tags" name="timesheet_edit_form[tags][]" multiple data-select2>{tags}</select>
+              <input type="text" id="timesheet_edit_form_metaFields_ticket_glpi_value"
+                     name="timesheet_edit_form[metaFields][ticket_glpi][value]" value="">
+              <input type="hidden" name="timesheet_edit_form[_token]" value="{st.csrf}">
+              <button type="submit" class="btn btn-primary">Guardar</button>
+            </form>{SELECT2_SHIM}"""
+        )
+
+    def _projects_json(self, query):
+        customer = (query.get("customer") or [""])[0]
+        items = [{"id": pid, "name": pname, "parentTitle": self.state.customers.get(pcid, "")}
+                 for pid, (pcid, pname) in self.state.projects.items() if pcid == customer]
+        data = json.dumps(items).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    # --- rutas ---
+
+    def _delay(self):
+        with self.state.lock:
+            self.state.requests += 1
+        if self.state.latency:
+            time.sleep(self.state.latency)
+
+    def do_GET(self):
+        self._delay()
+        url = urlparse(self.path)
+        path = url.path
+        if path == f"{PREFIX}/login":
+            if self._session():
+                return self._redirect(f"{PREFIX}/timesheet/")
+            return self._send(200, self._login_page())
+        if not self._session():
+            return self._redirect(f"{PREFIX}/login")
+        if path in (f"{PREFIX}/timesheet/", f"{PREFIX}/timesheet", f"{PREFIX}/"):
+            return self._send(200, self._home_page(parse_qs(url.query)))
+        if path == f"{PREFIX}/timesheet/create":
+            return self._send(200, self._create_page())
+        if path == f"{PREFIX}/api/projects":
+            return self._projects_json(parse_qs(url.query))
+        return self._send(404, self._page("Not found"))
+
+    def do_POST(self):
+        self._delay()
+        path = urlparse(self.path).path
+        data = self._form_data()
+        first = lambda k: (data.get(k) or [""])[0]
+
+        if path == f"{PREFIX}/login_check":
+            if (first("_csrf_token") != self.state.csrf or first("_username") != STUB_USER
+                    or first("_password") != STUB_PASSWORD):
+                return self._redirect(f"{PREFIX}/login")
+            sid = secrets.token_hex(16)
+            with self.state.lock:
+                self.state.sessions.add(sid)
+                self.state.logins += 1
+            return self._redirect(f"{PREFIX}/timesheet/", {"Set-Cookie": f"STUBSESSID={sid}; Path=/"})
+
+        if not self._session():
+            return self._redirect(f"{PREFIX}/login")
+
+        if path == f"{PREFIX}/timesheet/create":
+            f = "timesheet_edit_form"
+            errors = []
+            if first(f"{f}[_token]") != self.state.csrf:
+                errors.append("El token CSRF no es válido.")
+            for key in ("begin", "end", "customer", "project", "activity"):
+                if not first(f"{f}[{key}]"):
+                    errors.append(f"El campo {key} es obligatorio.")
+            if first(f"{f}[project]") and self.state.projects.get(first(f"{f}[project]"), (None,))[0] != first(f"{f}[customer]"):
+                errors.append("El proyecto no pertenece al cliente.")
+            if not errors and self.state.inject_error():
+                errors.append("Error interno simulado. Intente nuevamente.")
+            if errors:
+                return self._send(200, self._create_page(errors))
+            with self.state.lock:
+                self.state.entries.append({
+                    "begin": first(f"{f}[begin]"),
+                    "end": first(f"{f}[end]"),
+                    "customer": first(f"{f}[customer]"),
+                    "project": first(f"{f}[project]"),
+                    "activity": first(f"{f}[activity]"),
+                    "description": first(f"{f}[description]"),
+                    "tags": data.get(f"{f}[tags][]", []),
+                    "ticket_glpi": first(f"{f}[metaFields][ticket_glpi][value]"),
+                })
+            return self._redirect(f"{PREFIX}/timesheet/")
+
+        return self._send(404, self._page("Not found"))
+
+
+class XtimingStub:
+    """Envoltorio para arrancar/parar el servidor en un hilo de fondo."""
+    def __init__(self, host="127.0.0.1", port=0, **options):
+        self.state = StubState(**options)
+        handler = type("BoundStubHandler", (StubHandler,), {"state": self.state})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}{PREFIX}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor stub de xtiming")
+    parser.add_argument("--port", type=int, default=8088)
+    parser.add_argument("--form-dump", default=None, help="form_dump.html generado por tests/inspect_form.py")
+    parser.add_argument("--latency-ms", type=int, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--ajax", action="store_true", help="Cargar proyectos por AJAX según el cliente")
+    args = parser.parse_args()
+
+    stub = XtimingStub(port=args.port, form_dump=args.form_dump, latency_ms=args.latency_ms,
+                       error_rate=args.error_rate, ajax_projects=args.ajax)
+    print(f"Servidor stub de xtiming en {stub.base_url} (usuario: {STUB_USER} / {STUB_PASSWORD})")
+    try:
+        stub.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,82 @@
+import time
+import threading
+import logging
+from collections import deque
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger("Tracing")
+
+
+class SlotTrace:
+    """
+    Traza de latencia de un slot: cada checkpoint cierra un span que va desde el checkpoint
+    anterior hasta ahora (navigate, dates, customer, ..., save, redirect).
+    """
+    def __init__(self, label: str):
+        self.label = label
+        self.started = time.perf_counter()
+        self._last = self.started
+        self.spans: List[tuple] = []  # (nombre, inicio_ms relativo al slot, duración_ms)
+        self.ok: Optional[bool] = None
+        self.extra: Dict[str, Any] = {}  # Métricas adicionales del slot (p.ej. tráfico de red)
+
+    def checkpoint(self, name: str):
+        now = time.perf_counter()
+        self.spans.append((name, (self._last - self.started) * 1000, (now - self._last) * 1000))
+        self._last = now
+
+    @property
+    def total_ms(self) -> float:
+        return (self._last - self.started) * 1000
+
+    def summary(self) -> str:
+        steps = " ".join(f"{name}={dur:.0f}ms" for name, _, dur in self.spans)
+        extra = "".join(f" | {k}={v}" for k, v in self.extra.items())
+        return f"total={self.total_ms:.0f}ms | {steps}{extra}"
+
+
+class StepTracer:
+    """Acumula las trazas de los últimos slots y calcula estadísticas por paso (thread-safe)."""
+    def __init__(self, keep: int = 500):
+        self._lock = threading.Lock()
+        self.traces = deque(maxlen=keep)
+
+    def start(self, label: str) -> SlotTrace:
+        return SlotTrace(label)
+
+    def finish(self, trace: SlotTrace, ok: bool):
+        trace.ok = ok
+        with self._lock:
+            self.traces.append(trace)
+        logger.info(f"Traza slot '{trace.label}' ({'ok' if ok else 'fallo'}): {trace.summary()}")
+
+    def reset(self):
+        with self._lock:
+            self.traces.clear()
+
+    def step_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Devuelve {paso: {count, avg_ms, p95_ms, max_ms}} ordenado por tiempo total consumido."""
+        with self._lock:
+            traces = list(self.traces)
+
+        by_step: Dict[str, List[float]] = {}
+        for trace in traces:
+            for name, _, dur in trace.spans:
+                by_step.setdefault(name, []).append(dur)
+
+        stats = {}
+        for name, durations in sorted(by_step.items(), key=lambda kv: -sum(kv[1])):
+            ordered = sorted(durations)
+            stats[name] = {
+                "count": len(ordered),
+                "avg_ms": sum(ordered) / len(ordered),
+                "p95_ms": ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))],
+                "max_ms": ordered[-1],
+            }
+        return stats
+
+    def format_stats(self) -> str:
+        stats = self.step_stats()
+        if not stats:
+            return "Sin trazas registradas."
+        return " | ".join(f"{name}: avg={s['avg_ms']:.0f}ms p95={s['p95_ms']:.0f}ms" for name, s in stats.items())
@@ -1,9 +1,20 @@
 from playwright.sync_api import sync_playwright, Page, Browser, BrowserContext, Playwright, TimeoutError as PlaywrightTimeout
 import os
+import json
+import re
 import time
+import socket
+import queue
+import threading
 import logging
 import functools
-from typing import Dict, Any, Union, Optional, List
+from typing import Dict, Any, Union, Optional, List, Tuple
+from urllib.parse import urlparse
+from datetime import datetime
+
+import tracing
+import xtiming_html
+import xtiming_ui
 
 import logging
 import sys
@@ -46,43 +57,176 @@ def retry_action(max_retries=3, delay=1):
         return wrapper
     return decorator
 
+class SelectOptionIndex:
+    """
+    Índice persistente texto -> value de las opciones de los <select> del formulario de timesheet.
+    Las listas dependientes se guardan por 'scope' (p.ej. proyectos por value de cliente);
+    el scope "*" contiene las opciones leídas sin dependencia.
+    """
+    def __init__(self, path: str, ttl_hours: float = 24):
+        self.path = path
+        self.ttl_seconds = ttl_hours * 3600
+        self.built_at = time.time()
+        self.fields: Dict[str, Dict[str, Dict[str, str]]] = {}
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if time.time() - data.get("built_at", 0) > self.ttl_seconds:
+                logger.info("Índice de opciones Select2 expirado. Se reconstruirá en esta sesión.")
+                return
+            self.built_at = data.get("built_at", self.built_at)
+            self.fields = data.get("fields", {})
+        except Exception as e:
+            logger.warning(f"No se pudo cargar el índice de opciones: {e}")
+
+    def save(self):
+        if not self.dirty: return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump({"built_at": self.built_at, "fields": self.fields}, f, ensure_ascii=False)
+            self.dirty = False
+        except Exception as e:
+            logger.warning(f"No se pudo guardar el índice de opciones: {e}")
+
+    def update(self, field_key: str, options: List[Dict[str, str]], scope: str = "*"):
+        mapping = {" ".join(o["text"].split()): o["value"] for o in options if o.get("value")}
+        if not mapping: return
+        scopes = self.fields.setdefault(field_key, {})
+        if scopes.get(scope) != mapping:
+            scopes[scope] = mapping
+            self.dirty = True
+
+    def lookup(self, field_key: str, label: str, scope: str = "*") -> Optional[str]:
+        if not label: return None
+        wanted = " ".join(str(label).split())
+        scopes = self.fields.get(field_key, {})
+        for sc in ([scope, "*"] if scope != "*" else ["*"]):
+            mapping = scopes.get(sc or "*", {})
+            if wanted in mapping:
+                return mapping[wanted]
+            for text, value in mapping.items():
+                if text.lower() == wanted.lower():
+                    return value
+        return None
+
+
+class NetworkFilter:
+    """
+    Intercepta las peticiones de un BrowserContext y bloquea lo que el formulario no necesita
+    (imágenes, fuentes, media y recursos de terceros). Lleva contadores de peticiones
+    permitidas/bloqueadas y bytes descargados, que se reinician por cada registro.
+    """
+    DEFAULT_BLOCKED_TYPES = ["image", "media", "font"]
+
+    def __init__(self, settings: Optional[Dict[str, Any]], base_url: str):
+        settings = settings or {}
+        self.enabled = settings.get("enabled", False)
+        self.blocked_types = set(settings.get("blocked_resource_types", self.DEFAULT_BLOCKED_TYPES))
+        self.block_third_party = settings.get("block_third_party", True)
+        self.allowed_hosts = {urlparse(base_url).hostname} | set(settings.get("allowed_hosts", []))
+        self.allow_patterns = list(settings.get("allow_url_patterns", []))
+
+        self._lock = threading.Lock()
+        self.reset()
+        self.totals = {"allowed": 0, "blocked": 0, "bytes": 0}
+
+    def is_allowed(self, url: str, resource_type: str) -> bool:
+        if any(p in url for p in self.allow_patterns):
+            return True
+        if resource_type in self.blocked_types:
+            return False
+        if self.block_third_party and url.startswith("http") and urlparse(url).hostname not in self.allowed_hosts:
+            return False
+        return True
+
+    def install(self, context: BrowserContext):
+        if not self.enabled: return
+        context.route("**/*", self._handle_route)
+        context.on("response", self.on_response)
+        logger.info(f"Filtro de red activo (bloqueando: {', '.join(sorted(self.blocked_types))}"
+                    f"{', terceros' if self.block_third_party else ''}).")
+
+    def decide(self, request) -> bool:
+        """Decide y contabiliza una petición interceptada (compartido con el motor async)."""
+        if self.is_allowed(request.url, request.resource_type):
+            self._count("allowed")
+            return True
+        self._count("blocked")
+        logger.debug(f"Bloqueado [{request.resource_type}] {request.url}")
+        return False
+
+    def _handle_route(self, route):
+        if self.decide(route.request):
+            route.continue_()
+        else:
+            route.abort("blockedbyclient")
+
+    def on_response(self, response):
+        """Contabiliza los bytes de una respuesta (handler de 'response', compartido con el motor async)."""
+        # Content-Length viene en las cabeceras ya recibidas (sin ida y vuelta extra al navegador)
+        try:
+            size = int(response.headers.get("content-length", 0))
+        except ValueError:
+            size = 0
+        self._count("bytes", size)
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self.current[key] += amount
+            self.totals[key] += amount
+
+    def reset(self):
+        with self._lock:
+            self.current = {"allowed": 0, "blocked": 0, "bytes": 0}
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.current)
+
+
 class WebAutomator:
-    # Centralized Selectors for easier maintenance
-    SELECTORS = {
-        "login_user": "input[name='_username']",
-        "login_pass": "input[name='_password']",
-        "login_btn": "button[type='submit']",
-        "user_menu": ".user-menu, .dropdown-user", 
-        
-        "ts_start_time": "#timesheet_edit_form_begin",
-        "ts_end_time": "#timesheet_edit_form_end",
-        
-        "ts_customer": "#timesheet_edit_form_customer",
-        "ts_project": "#timesheet_edit_form_project",
-        "ts_activity": "#timesheet_edit_form_activity",
-        "ts_description": "#timesheet_edit_form_description",
-        "ts_tags": "#timesheet_edit_form_tags",
-        
-        "ts_ticket_glpi": "#timesheet_edit_form_metaFields_ticket_glpi_value",
-        "ts_save_btn": "button[type='submit']",
-        
-        "select2_container": ".select2-container",
-        "select2_search": ".select2-search__field",
-        "select2_results": ".select2-results__options",
-        "select2_option": ".select2-results__option",
-        
-        "alert_success": ".alert-success, .flash-success",
-        "alert_error": ".alert-danger, .has-error, .flash-error"
-    }
+    # Selectores compartidos con el motor async (xtiming_ui)
+    SELECTORS = xtiming_ui.SELECTORS
+    TICKET_FIELDS = xtiming_ui.TICKET_FIELDS
 
-    def __init__(self, config: Optional[Dict[str, Any]] = None):
+    def __init__(self, config: Optional[Dict[str, Any]] = None, credentials: Optional[Tuple[str, str]] = None):
         self.config = config or {}
         self.user = os.getenv("XTIMING_USER")
         self.password = os.getenv("XTIMING_PASSWORD")
-        self.base_url = "https://xtiming.intelix.biz/index.php/es"
+        if credentials:
+            # Modo multi-técnico: cada técnico entra con su propia cuenta de xtiming
+            self.user, self.password = credentials
+        self.base_url = os.getenv("XTIMING_URL", "https://xtiming.intelix.biz/index.php/es")
         
         self.headless = self.config.get("app", {}).get("headless_browser", False)
 
+        # Sesión autenticada persistida (cookies + localStorage) para evitar login en cada arranque
+        self.persist_session = self.config.get("app", {}).get("persist_session", True)
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        self.session_state_path = os.path.join(base_dir, "data", self._session_filename(credentials and self.user))
+
+        # Índice label -> value de los selects (evita abrir Select2 y tipear en cada slot)
+        ttl_hours = self.config.get("app", {}).get("select_cache_ttl_hours", 24)
+        self.option_index = SelectOptionIndex(os.path.join(base_dir, "data", "select_options.json"), ttl_hours)
+        self._indexed_scopes = set()
+
+        # Bloqueo de recursos innecesarios (imágenes, fuentes, terceros) en el contexto del navegador
+        self.network_filter = NetworkFilter(self.config.get("app", {}).get("network_filter"), self.base_url)
+
+        # Trazas de latencia por paso de cada slot
+        self.tracer = tracing.StepTracer()
+        self.last_trace: Optional[tracing.SlotTrace] = None
+
+        # Valores ya llenados por ticket: los sub-bloques siguientes solo cambian fechas y descripción
+        self._ticket_fields: Dict[tuple, List[Dict[str, Any]]] = {}
+
         defaults = self.config.get("defaults", {})
         self.default_client = defaults.get("client_fallback", "Intelix")
         self.default_project = defaults.get("project_fallback", "Gestión - Intelix")
@@ -94,6 +238,14 @@ class WebAutomator:
         self.context: Optional[BrowserContext] = None
         self.page: Optional[Page] = None
 
+        # Puerto CDP opcional para que otros hilos se conecten al mismo Chromium (ver BrowserPool)
+        self.remote_debugging_port: Optional[int] = None
+
+    @property
+    def cdp_endpoint(self) -> Optional[str]:
+        if not self.remote_debugging_port: return None
+        return f"http://127.0.0.1:{self.remote_debugging_port}"
+
     def start_browser(self):
         if self.page: return
 
@@ -105,23 +257,56 @@ class WebAutomator:
             is_headless = True
 
         logger.info(f"Iniciando navegador (headless={is_headless})...")
+        launch_args = ["--no-sandbox", "--disable-dev-shm-usage"]
+        if self.remote_debugging_port:
+            launch_args.append(f"--remote-debugging-port={self.remote_debugging_port}")
+
         self.playwright = sync_playwright().start()
         self.browser = self.playwright.chromium.launch(
             headless=is_headless,
-            args=["--no-sandbox", "--disable-dev-shm-usage"]
+            args=launch_args
         )
-        self.context = self.browser.new_context()
+        state_file = self.session_state_path if self.persist_session and os.path.exists(self.session_state_path) else None
+        self.context = self.browser.new_context(storage_state=state_file)
+        self.network_filter.install(self.context)
         self.page = self.context.new_page()
         
         try:
+            if state_file and self._session_is_valid():
+                logger.info("Sesión persistida válida. Se omite el login.")
+                return
             self.login()
+            self._save_session()
         except Exception as e:
             logger.error(f"Error crítico iniciando navegador: {e}")
             self.close_browser()
             raise e
 
+    def _session_is_valid(self) -> bool:
+        """Valida la sesión cargada con una única petición ligera (sin renderizar la página)."""
+        try:
+            resp = self.context.request.get(f"{self.base_url}/timesheet/", max_redirects=0, timeout=10000)
+            # Una sesión expirada redirige a /login
+            return resp.status == 200
+        except Exception as e:
+            logger.debug(f"No se pudo validar la sesión persistida: {e}")
+            return False
+
+    def _save_session(self):
+        if not self.persist_session: return
+        try:
+            os.makedirs(os.path.dirname(self.session_state_path), exist_ok=True)
+            self.context.storage_state(path=self.session_state_path)
+            os.chmod(self.session_state_path, 0o600)
+            logger.debug(f"Sesión guardada en {self.session_state_path}")
+        except Exception as e:
+            logger.warning(f"No se pudo guardar la sesión: {e}")
+
     def close_browser(self):
         logger.info("Cerrando navegador...")
+        self.option_index.save()
+        self._indexed_scopes = set()
+        self._ticket_fields = {}
         if self.page: self.page.close()
         if self.context: self.context.close()
         if self.browser: self.browser.close()
@@ -171,13 +356,11 @@ class WebAutomator:
             if page.is_visible(container_selector):
                 logger.debug(f"Select2: container {container_selector} visible, haciendo scroll y click")
                 page.locator(container_selector).scroll_into_view_if_needed()
-                time.sleep(0.3)
                 page.click(container_selector)
             else:
                 fallback = f"{selector_id} + .select2 .select2-selection"
                 logger.debug(f"Select2: container no visible, usando fallback: {fallback}")
                 page.locator(fallback).scroll_into_view_if_needed()
-                time.sleep(0.3)
                 page.click(fallback)
 
             # 2. Esperar input de búsqueda
@@ -187,11 +370,11 @@ class WebAutomator:
             # 3. Escribir
             logger.debug(f"Select2: Escribiendo '{label_text}' en búsqueda")
             page.fill(self.SELECTORS["select2_search"], label_text)
-            time.sleep(0.5)  # Esperar que filtre resultados
             
-            # 4. Esperar resultados
+            # 4. Esperar resultados ya filtrados (sin indicador de carga)
             logger.debug("Select2: Esperando resultados...")
             page.wait_for_selector(self.SELECTORS["select2_results"], state="visible", timeout=5000)
+            self._wait_select2_filtered(label_text)
             
             # 5. Seleccionar opción
             option = page.locator(f".select2-results__option:text-is('{label_text}')")
@@ -217,113 +400,262 @@ class WebAutomator:
                 pass
             page.keyboard.press("Escape")
 
+    # --- Esperas por condición (reemplazan los time.sleep fijos) ---
+
+    def _wait_select2_filtered(self, query: str, timeout: int = 5000):
+        """Espera a que Select2 termine de renderizar los resultados filtrados por 'query'."""
+        try:
+            self.page.wait_for_function(xtiming_ui.SELECT2_FILTERED_JS, arg=query, timeout=timeout)
+        except PlaywrightTimeout:
+            logger.debug(f"Select2: resultados para '{query}' no se estabilizaron en {timeout}ms. Continuando.")
+
+    def _wait_ajax_idle(self, timeout: int = 10000):
+        """Espera a que no haya peticiones jQuery en curso (p.ej. recarga de proyectos tras elegir cliente)."""
+        try:
+            self.page.wait_for_function(xtiming_ui.AJAX_IDLE_JS, timeout=timeout)
+        except PlaywrightTimeout:
+            logger.debug(f"AJAX no quedó inactivo en {timeout}ms. Continuando.")
+
+    # --- Índice de opciones de selects ---
+
+    def _read_select_options(self, selector: str) -> List[Dict[str, str]]:
+        return self.page.evaluate(xtiming_ui.READ_OPTIONS_JS, selector)
+
+    def _learn_select(self, key: str, scope: str = "*", force: bool = False):
+        """Lee las opciones del <select> una vez por sesión y scope, y las guarda en el índice."""
+        if not force and (key, scope) in self._indexed_scopes: return
+        options = self._read_select_options(self.SELECTORS[key])
+        self.option_index.update(key, options, scope)
+        self._indexed_scopes.add((key, scope))
+
+    def _set_select_values(self, selector: str, values: List[str]) -> bool:
+        """Selecciona valores en el <select> subyacente con un único evaluate y dispara 'change'."""
+        return self.page.evaluate(xtiming_ui.SET_SELECT_VALUES_JS, [selector, values])
+
+    def _wait_option_present(self, selector: str, value: str, timeout: int = 5000) -> bool:
+        """Listas dependientes: espera a que el value exista en el <select> (carga AJAX tras el padre)."""
+        try:
+            self.page.wait_for_function(xtiming_ui.OPTION_PRESENT_JS, arg=[selector, value], timeout=timeout)
+            return True
+        except PlaywrightTimeout:
+            return False
+
+    def _current_value(self, selector: str) -> str:
+        return self.page.evaluate(xtiming_ui.CURRENT_VALUE_JS, selector)
+
+    def _choose_option(self, key: str, label: str, scope: str = "*") -> str:
+        """
+        Selecciona 'label' en el select 'key'. Usa el índice cacheado (un evaluate + 'change');
+        solo si no hay coincidencia recurre al flujo de tipeo de Select2. Devuelve el value final.
+        """
+        if not label: return self._current_value(self.SELECTORS[key])
+        selector = self.SELECTORS[key]
+
+        value = self.option_index.lookup(key, label, scope)
+        if value and self._wait_option_present(selector, value) and self._set_select_values(selector, [value]):
+            logger.debug(f"Select: '{label}' -> {value} en {selector} (índice)")
+            return value
+
+        logger.debug(f"Select: '{label}' no está en el índice de {selector}. Usando búsqueda Select2.")
+        self._select_select2(selector, label)
+        # Tras tipear la lista ya está cargada: aprenderla para los próximos slots
+        self._learn_select(key, scope, force=True)
+        return self._current_value(selector)
+
+    def _choose_tags(self, tags: List[str]):
+        tags = [t for t in tags if t]
+        selector = self.SELECTORS["ts_tags"]
+        values = [self.option_index.lookup("ts_tags", t) for t in tags]
+        if tags and all(values) and self._set_select_values(selector, values):
+            logger.debug(f"Tags {tags} seleccionados desde el índice.")
+            return
+        for tag, value in zip(tags, values):
+            if value and self._set_select_values(selector, [value]):
+                continue
+            self._select_select2(selector, tag)
+        self._learn_select("ts_tags", force=True)
+
+    @staticmethod
+    def _session_filename(user: Optional[str] = None) -> str:
+        """Archivo de sesión: el compartido por defecto, o uno por cuenta en modo multi-técnico."""
+        if not user:
+            return "xtiming_session.json"
+        return f"xtiming_session_{re.sub(r'[^A-Za-z0-9_.-]', '_', user)}.json"
+
+    @staticmethod
+    def _entries_list_params(date_str: str) -> Dict[str, Any]:
+        """Filtro del listado /timesheet/ para un día (YYYY-MM-DD), en el formato de fecha de xtiming."""
+        day = datetime.strptime(date_str, "%Y-%m-%d").strftime("%d.%m.%Y")
+        return {"daterange": f"{day} - {day}", "size": 500}
+
+    def fetch_existing_entries(self, date_str: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Lee en una sola petición los registros que el usuario ya tiene en xtiming para esa fecha.
+        Devuelve None si no se pudo consultar (el llamador debe asumir que no hay nada).
+        """
+        if not self.context: self.start_browser()
+        try:
+            resp = self.context.request.get(f"{self.base_url}/timesheet/", params=self._entries_list_params(date_str), timeout=15000)
+            if resp.status != 200 or "login" in resp.url:
+                raise Exception(f"HTTP {resp.status} en {resp.url}")
+            entries = xtiming_html.parse_timesheet_entries(resp.text(), default_date=date_str)
+            logger.info(f"Registros existentes en xtiming para {date_str}: {len(entries)}")
+            return entries
+        except Exception as e:
+            logger.warning(f"No se pudieron leer los registros existentes de {date_str}: {e}")
+            return None
+
+    def _ticket_signature(self, entry_data: Dict[str, Any]) -> tuple:
+        """Clave de la ruta rápida: todo lo que comparten los sub-bloques de un ticket."""
+        tags = entry_data.get('tags', self.default_tag)
+        return (
+            str(entry_data.get('ticket_id')),
+            entry_data.get('client', self.default_client),
+            entry_data.get('project', self.default_project),
+            entry_data.get('activity', self.default_activity),
+            tuple(tags) if isinstance(tags, list) else (tags,),
+        )
+
+    def _capture_ticket_fields(self) -> Optional[List[Dict[str, Any]]]:
+        return xtiming_ui.usable_capture(
+            self.page.evaluate(xtiming_ui.CAPTURE_FIELDS_JS, xtiming_ui.ticket_field_selectors())
+        )
+
+    def _fill_ticket_fields(self, entry_data: Dict[str, Any], trace: tracing.SlotTrace):
+        """Flujo completo de selects (cliente -> proyecto -> actividad -> tags)."""
+        page = self.page
+
+        # Selects: índice de opciones construido una vez por sesión desde los <select> de la página
+        self._learn_select("ts_customer")
+        self._learn_select("ts_tags")
+        customer_value = self._choose_option("ts_customer", entry_data.get('client', self.default_client))
+        # La lista de proyectos depende del cliente: esperar a que termine su recarga AJAX
+        self._wait_ajax_idle()
+        trace.checkpoint("customer")
+
+        project_value = self._choose_option("ts_project", entry_data.get('project', self.default_project), scope=customer_value)
+        self._wait_ajax_idle()
+        trace.checkpoint("project")
+
+        self._choose_option("ts_activity", entry_data.get('activity', self.default_activity), scope=project_value)
+        trace.checkpoint("activity")
+
+        target_tags = entry_data.get('tags', self.default_tag)
+        self._choose_tags(target_tags if isinstance(target_tags, list) else [target_tags])
+
+        # Cerrar dropdown de tags clickeando afuera
+        page.keyboard.press("Escape")
+        page.evaluate("document.body.click()")
+        trace.checkpoint("tags")
+
+    def _recover_session(self, attempt: int, url: str):
+        """
+        xtiming llevó fuera del formulario (p.ej. a /login porque venció la sesión persistida):
+        re-login, reescritura del archivo de sesión y un único reintento del registro.
+        """
+        if attempt:
+            raise Exception(f"Redirección inesperada tras reintentar: {url}")
+        logger.warning(f"Redirección a {url}: sesión expirada, reintentando tras login.")
+        self.login()
+        self._save_session()
+
     def fill_timesheet_entry(self, entry_data: Dict[str, Any]) -> bool:
         if not self.page: self.start_browser()
         page = self.page
+        trace = self.tracer.start(entry_data.get('title', ''))
+        ok = False
+        self.network_filter.reset()
 
         try:
             logger.info(f"Registrando: {entry_data['title']} [{entry_data['start_time']} - {entry_data['end_time']}]")
             
-            page.goto(f"{self.base_url}/timesheet/create")
-            page.wait_for_load_state('domcontentloaded')
-
-            # --- Llenado de fechas via JavaScript para NO activar el datepicker ---
-            start_selector = self.SELECTORS["ts_start_time"]
-            end_selector = self.SELECTORS["ts_end_time"]
-
-            # Inyectar valor de inicio directamente con JS
-            page.evaluate(f"""(() => {{
-                const el = document.querySelector('{start_selector}');
-                el.value = '{entry_data["start_time"]}';
-                el.dispatchEvent(new Event('change', {{ bubbles: true }}));
-                el.blur();
-            }})()""")
-            logger.debug(f"Start time seteado via JS: {entry_data['start_time']}")
-
-            # Inyectar valor de fin directamente con JS  
-            page.evaluate(f"""(() => {{
-                const el = document.querySelector('{end_selector}');
-                el.value = '{entry_data["end_time"]}';
-                el.dispatchEvent(new Event('change', {{ bubbles: true }}));
-                el.blur();
-            }})()""")
-            logger.debug(f"End time seteado via JS: {entry_data['end_time']}")
-
-            # Cerrar cualquier datepicker residual que pueda estar abierto
-            page.evaluate("""(() => {
-                // Intentar cerrar datepickers de jQuery UI / bootstrap-datepicker
-                document.querySelectorAll('.datepicker, .daterangepicker, .bootstrap-datetimepicker-widget, .flatpickr-calendar').forEach(el => {
-                    el.style.display = 'none';
-                });
-                // También cerrar con jQuery si existe
-                if (typeof jQuery !== 'undefined' && jQuery.fn.datepicker) {
-                    jQuery('.datepicker-input, input[data-toggle="datetimepicker"]').datepicker('hide');
-                }
-                document.activeElement.blur();
-            })()""")
-            page.keyboard.press("Escape")
-            time.sleep(0.5)
-            logger.debug("Datepickers cerrados, procediendo con selects.")
-
-            # Selects
-            self._select_select2(self.SELECTORS["ts_customer"], entry_data.get('client', self.default_client))
-            time.sleep(0.5) 
-            self._select_select2(self.SELECTORS["ts_project"], entry_data.get('project', self.default_project))
-            time.sleep(0.5)
-            self._select_select2(self.SELECTORS["ts_activity"], entry_data.get('activity', self.default_activity))
-
-            page.fill(self.SELECTORS["ts_description"], entry_data['title'])
-
-            target_tags = entry_data.get('tags', self.default_tag)
-            if isinstance(target_tags, list):
-                for tag in target_tags:
-                    self._select_select2(self.SELECTORS["ts_tags"], tag)
-            else:
-                self._select_select2(self.SELECTORS["ts_tags"], target_tags)
-            
-            # Cerrar dropdown de tags clickeando afuera
-            page.keyboard.press("Escape")
-            page.evaluate("document.body.click()")
-
-            # ID Ticket (si es numérico)
-            ticket_id = entry_data.get('ticket_id')
-            # Check if ticket_id is a valid integer string (excludes "TEL-1234")
-            if ticket_id and str(ticket_id).isdigit():
-                 if page.locator(self.SELECTORS["ts_ticket_glpi"]).is_visible():
-                    page.fill(self.SELECTORS["ts_ticket_glpi"], str(ticket_id))
-
-            # --- Guardado ---
-            logger.info("Procediendo a guardar el registro...")
-            
-            # Buscar el botón Guardar específico (no cualquier submit)
-            save_btn = page.locator("button:has-text('Guardar'), input[type='submit'][value='Guardar']").first
-            if save_btn.count() == 0:
-                # Fallback al último botón submit del formulario
-                save_btn = page.locator("form button[type='submit']").last
-                logger.debug("Usando fallback: último submit del formulario")
-            
-            # Scroll al botón para que sea visible
-            save_btn.scroll_into_view_if_needed()
-            time.sleep(0.5)
-            logger.debug("Botón Guardar visible, haciendo click...")
-            
-            # Esperar navegación tras click
-            with page.expect_navigation(timeout=15000): 
-                 save_btn.click()
-            
-            # Validación post-navegación
-            if "create" not in page.url: 
-                logger.info("Redirección detectada. Registro exitoso.")
+            for attempt in range(2):
+                page.goto(f"{self.base_url}/timesheet/create")
+                page.wait_for_load_state('domcontentloaded')
+                trace.checkpoint("navigate")
+                if "create" not in page.url:
+                    # La sesión venció antes de abrir el formulario
+                    self._recover_session(attempt, page.url)
+                    continue
+
+                # --- Llenado de fechas via JavaScript para NO activar el datepicker ---
+                page.evaluate(xtiming_ui.SET_DATES_JS, [self.SELECTORS["ts_start_time"], self.SELECTORS["ts_end_time"],
+                                                        entry_data["start_time"], entry_data["end_time"]])
+                logger.debug(f"Fechas seteadas via JS: {entry_data['start_time']} - {entry_data['end_time']}")
+                page.keyboard.press("Escape")
+                logger.debug("Datepickers cerrados, procediendo con selects.")
+                trace.checkpoint("dates")
+
+                # Ruta rápida: sub-bloques de un ticket ya guardado reutilizan los selects capturados
+                signature = self._ticket_signature(entry_data)
+                captured = self._ticket_fields.get(signature)
+                if captured and page.evaluate(xtiming_ui.REPLAY_FIELDS_JS, captured):
+                    logger.debug(f"Campos del ticket {signature[0]} reutilizados del bloque anterior.")
+                    trace.checkpoint("replay")
+                else:
+                    captured = None
+                    self._fill_ticket_fields(entry_data, trace)
+
+                page.fill(self.SELECTORS["ts_description"], entry_data['title'])
+                trace.checkpoint("description")
+
+                # ID Ticket (si es numérico)
+                ticket_id = entry_data.get('ticket_id')
+                # Check if ticket_id is a valid integer string (excludes "TEL-1234")
+                if ticket_id and str(ticket_id).isdigit():
+                     if page.locator(self.SELECTORS["ts_ticket_glpi"]).is_visible():
+                        page.fill(self.SELECTORS["ts_ticket_glpi"], str(ticket_id))
+                trace.checkpoint("ticket")
+
+                # --- Guardado ---
+                logger.info("Procediendo a guardar el registro...")
+
+                # Buscar el botón Guardar específico (no cualquier submit)
+                save_btn = page.locator(xtiming_ui.SAVE_BUTTON).first
+                if save_btn.count() == 0:
+                    # Fallback al último botón submit del formulario
+                    save_btn = page.locator(xtiming_ui.SAVE_BUTTON_FALLBACK).last
+                    logger.debug("Usando fallback: último submit del formulario")
+
+                if captured is None:
+                    captured = self._capture_ticket_fields()
+
+                # Scroll al botón y esperar a que esté visible y habilitado
+                save_btn.scroll_into_view_if_needed()
+                save_btn.wait_for(state="visible", timeout=5000)
+                page.wait_for_function(xtiming_ui.BUTTON_ENABLED_JS, arg=save_btn.element_handle(), timeout=5000)
+                logger.debug("Botón Guardar visible, haciendo click...")
+
+                # Esperar navegación tras click
+                with page.expect_navigation(timeout=15000): 
+                     save_btn.click()
+                     trace.checkpoint("save")
+                trace.checkpoint("redirect")
+
+                # Validación post-navegación: solo el listado o un registro confirman el guardado
+                if xtiming_ui.is_saved_url(self.base_url, page.url):
+                    logger.info("Redirección detectada. Registro exitoso.")
+                    if captured:
+                        self._ticket_fields[signature] = captured
+                    ok = True
+                    return True
+                if "create" not in page.url:
+                    # Otro destino (p.ej. /login por sesión expirada): el registro no se guardó
+                    self._recover_session(attempt, page.url)
+                    continue
+
+                # Un rechazo invalida la captura del ticket: el próximo bloque hace el flujo completo
+                self._ticket_fields.pop(signature, None)
+                if page.locator(self.SELECTORS["alert_error"]).is_visible():
+                    error_text = page.locator(self.SELECTORS["alert_error"]).first.inner_text()
+                    raise Exception(f"Error de validación: {error_text}")
+
+                ok = True
                 return True
-            
-            if page.locator(self.SELECTORS["alert_error"]).is_visible():
-                error_text = page.locator(self.SELECTORS["alert_error"]).first.inner_text()
-                raise Exception(f"Error de validación: {error_text}")
-
-            return True
 
         except Exception as e:
             logger.error(f"Error registrando ticket: {e}")
+            self._ticket_fields.pop(self._ticket_signature(entry_data), None)
             timestamp = int(time.time())
             screenshot_path = os.path.abspath(f"error_validation_{timestamp}.png")
             try:
@@ -333,5 +665,119 @@ class WebAutomator:
                 pass
             return False
 
+        finally:
+            if self.network_filter.enabled:
+                net = self.network_filter.snapshot()
+                trace.extra["red"] = f"{net['allowed']} ok/{net['blocked']} bloqueadas/{net['bytes'] / 1024:.0f}KB"
+            self.last_trace = trace
+            self.tracer.finish(trace, ok)
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class BrowserPool:
+    """
+    Pool de N contextos de navegador aislados que comparten un único proceso Chromium
+    y la sesión autenticada del contexto principal.
+
+    La API síncrona de Playwright no es thread-safe, así que cada hilo trabajador abre su
+    propio driver y se conecta por CDP al Chromium lanzado por el automator principal.
+    """
+    def __init__(self, config: Optional[Dict[str, Any]] = None, size: int = 2, credentials: Optional[Tuple[str, str]] = None):
+        self.config = config or {}
+        self.size = max(1, int(size))
+        self.credentials = credentials
+        self.main = WebAutomator(self.config, credentials)
+        self.main.remote_debugging_port = _free_port()
+        self.storage_state: Optional[Dict[str, Any]] = None
+
+    def start(self):
+        """Lanza Chromium, hace login una sola vez y captura cookies/localStorage para los workers."""
+        self.main.start_browser()
+        self.storage_state = self.main.context.storage_state()
+
+    def close(self):
+        self.main.close_browser()
+
+    def run(self, jobs: List[Any], process, on_worker_exit=None):
+        """
+        Drena 'jobs' con N workers en paralelo. 'process(bot, job)' se ejecuta en el hilo del worker
+        con un WebAutomator ligado a su propio contexto. Si un worker no logra conectarse, los jobs
+        que queden en cola se procesan al final de forma secuencial con el contexto principal.
+        'on_worker_exit()' se llama en el hilo de cada worker al terminar (p.ej. para cerrar recursos
+        por hilo como la conexión SQLite).
+        """
+        if not self.main.page: self.start()
+
+        pending = queue.Queue()
+        for job in jobs:
+            pending.put(job)
+
+        workers = [
+            threading.Thread(target=self._worker, args=(i, pending, process, on_worker_exit),
+                             name=f"BrowserPool-{i}", daemon=True)
+            for i in range(min(self.size, len(jobs)))
+        ]
+        for w in workers: w.start()
+        for w in workers: w.join()
+
+        while True:
+            try:
+                job = pending.get_nowait()
+            except queue.Empty:
+                break
+            logger.warning("Procesando job remanente en el contexto principal del pool.")
+            try:
+                process(self.main, job)
+            except Exception as e:
+                logger.error(f"Error procesando job remanente: {e}")
+
+    def _worker(self, index: int, pending: "queue.Queue", process, on_worker_exit=None):
+        try:
+            with sync_playwright() as p:
+                browser = p.chromium.connect_over_cdp(self.main.cdp_endpoint)
+                context = browser.new_context(storage_state=self.storage_state)
+                # Misma cuenta que el contexto principal: un re-login del worker no cae en la cuenta por defecto
+                bot = WebAutomator(self.config, self.credentials)
+                bot.network_filter.install(context)
+                bot.tracer = self.main.tracer  # Estadísticas por paso agregadas para todo el pool
+                # Índice de opciones compartido: lo que aprende un worker se guarda al cerrar el pool
+                bot.option_index = self.main.option_index
+                bot.context = context
+                bot.page = context.new_page()
+                logger.info(f"Worker {index} conectado al navegador compartido.")
+                try:
+                    while True:
+                        try:
+                            job = pending.get_nowait()
+                        except queue.Empty:
+                            break
+                        try:
+                            process(bot, job)
+                        except Exception as e:
+                            logger.error(f"Worker {index}: error procesando job: {e}")
+                            # Recuperar una página limpia para que el siguiente job no falle en cascada
+                            try:
+                                bot.page.close()
+                            except Exception:
+                                pass
+                            bot.page = context.new_page()
+                finally:
+                    context.close()
+                    browser.close()
+        except Exception as e:
+            logger.error(f"Worker {index} del pool no pudo iniciar: {e}")
+        finally:
+            if on_worker_exit:
+                try:
+                    on_worker_exit()
+                except Exception as e:
+                    logger.debug(f"Worker {index}: error liberando recursos del hilo: {e}")
+
+
 if __name__ == "__main__":
     pass
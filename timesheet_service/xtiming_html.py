@@ -0,0 +1,368 @@
+from html.parser import HTMLParser
+from typing import Dict, Any, Optional, List
+import re
+
+
+# Elementos sin etiqueta de cierre: no abren nivel en el seguimiento de bloques de error
+VOID_ELEMENTS = frozenset((
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr",
+))
+
+
+class _FormParser(HTMLParser):
+    """
+    Parser mínimo de formularios HTML (sin dependencias externas).
+    Recolecta cada <form> con sus inputs, textareas y selects (incluyendo opciones y optgroups).
+    """
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.forms: List[Dict[str, Any]] = []
+        self.errors: List[str] = []
+        self._form = None
+        self._select = None
+        self._option = None
+        self._optgroup = None
+        self._textarea = None
+        self._error_depth = 0
+        self._error_buf = []
+
+    def _current_fields(self):
+        if self._form is None:
+            # Campos fuera de un <form> se agrupan en un formulario anónimo
+            self._form = {"attrs": {}, "fields": [], "implicit": True}
+            self.forms.append(self._form)
+        return self._form["fields"]
+
+    def handle_starttag(self, tag, attrs):
+        a = {k: (v if v is not None else "") for k, v in attrs}
+        classes = a.get("class", "").split()
+
+        if tag in VOID_ELEMENTS:
+            if self._error_depth:
+                # <br> separa palabras del mensaje
+                self._error_buf.append(" ")
+        elif self._error_depth:
+            self._error_depth += 1
+        elif any(c in ("alert-danger", "has-error", "flash-error", "invalid-feedback", "form-error-message") for c in classes):
+            self._error_depth = 1
+            self._error_buf = []
+
+        if tag == "form":
+            self._form = {"attrs": a, "fields": []}
+            self.forms.append(self._form)
+        elif tag == "input":
+            self._current_fields().append({
+                "tag": "input",
+                "id": a.get("id"),
+                "name": a.get("name"),
+                "type": a.get("type", "text").lower(),
+                "value": a.get("value", ""),
+                "checked": "checked" in a,
+                "attrs": a,
+            })
+        elif tag == "textarea":
+            self._textarea = {"tag": "textarea", "id": a.get("id"), "name": a.get("name"), "value": "", "attrs": a}
+            self._current_fields().append(self._textarea)
+        elif tag == "select":
+            self._select = {
+                "tag": "select",
+                "id": a.get("id"),
+                "name": a.get("name"),
+                "multiple": "multiple" in a,
+                "options": [],
+                "attrs": a,
+            }
+            self._current_fields().append(self._select)
+        elif tag == "optgroup" and self._select is not None:
+            self._optgroup = a.get("label", "")
+        elif tag == "option" and self._select is not None:
+            self._option = {
+                "value": a.get("value"),
+                "text": "",
+                "group": self._optgroup,
+                "selected": "selected" in a,
+                "attrs": a,
+            }
+            self._select["options"].append(self._option)
+
+    def handle_endtag(self, tag):
+        if self._error_depth and tag not in VOID_ELEMENTS:
+            self._error_depth -= 1
+            if self._error_depth == 0:
+                text = " ".join("".join(self._error_buf).split())
+                if text:
+                    self.errors.append(text)
+
+        if tag == "form":
+            self._form = None
+        elif tag == "select":
+            self._close_option()
+            self._select = None
+            self._optgroup = None
+        elif tag == "optgroup":
+            self._close_option()
+            self._optgroup = None
+        elif tag == "option":
+            self._close_option()
+        elif tag == "textarea":
+            self._textarea = None
+
+    def _close_option(self):
+        if self._option is not None:
+            self._option["text"] = " ".join(self._option["text"].split())
+            if self._option["value"] is None:
+                self._option["value"] = self._option["text"]
+            self._option = None
+
+    def handle_data(self, data):
+        if self._error_depth:
+            self._error_buf.append(data)
+        if self._option is not None:
+            self._option["text"] += data
+        elif self._textarea is not None:
+            self._textarea["value"] += data
+
+
+def parse_forms(html: str) -> List[Dict[str, Any]]:
+    """Devuelve la lista de formularios de la página con todos sus campos."""
+    parser = _FormParser()
+    parser.feed(html or "")
+    parser.close()
+    return parser.forms
+
+
+def parse_errors(html: str) -> List[str]:
+    """Extrae los mensajes de error de validación visibles (.alert-danger, .has-error, ...)."""
+    parser = _FormParser()
+    parser.feed(html or "")
+    parser.close()
+    return parser.errors
+
+
+def find_form(forms: List[Dict[str, Any]], field_id: Optional[str] = None, field_name: Optional[str] = None):
+    """Busca el formulario que contiene un campo con el id o name indicado."""
+    for form in forms:
+        for field in form["fields"]:
+            if field_id and field.get("id") == field_id:
+                return form
+            if field_name and field.get("name") == field_name:
+                return form
+    return None
+
+
+def get_field(form: Dict[str, Any], field_id: str):
+    """Devuelve el campo del formulario con el id indicado (sin '#')."""
+    for field in form["fields"]:
+        if field.get("id") == field_id:
+            return field
+    return None
+
+
+def default_payload(form: Dict[str, Any]) -> List[tuple]:
+    """
+    Construye el payload que el navegador enviaría sin modificar nada:
+    hidden/text con su valor, checkboxes marcados y opciones seleccionadas.
+    """
+    payload = []
+    for field in form["fields"]:
+        name = field.get("name")
+        if not name:
+            continue
+        if field["tag"] == "input":
+            ftype = field["type"]
+            if ftype in ("submit", "button", "image", "reset", "file"):
+                continue
+            if ftype in ("checkbox", "radio") and not field["checked"]:
+                continue
+            payload.append((name, field["value"]))
+        elif field["tag"] == "textarea":
+            payload.append((name, field["value"]))
+        elif field["tag"] == "select":
+            selected = [o["value"] for o in field["options"] if o["selected"]]
+            if not selected and field["options"] and not field["multiple"]:
+                selected = [field["options"][0]["value"]]
+            for value in selected:
+                payload.append((name, value))
+    return payload
+
+
+def resolve_option(options: List[Dict[str, Any]], label: str, group: Optional[str] = None) -> Optional[str]:
+    """
+    Resuelve el 'value' de una opción a partir de su texto visible, imitando la búsqueda de Select2:
+    coincidencia exacta, luego sin distinguir mayúsculas, y por último la primera que contenga el texto.
+    Si se indica 'group' (optgroup, p.ej. el cliente de un proyecto) se prefieren sus opciones.
+    """
+    if not label:
+        return None
+    wanted = " ".join(str(label).split())
+    wanted_low = wanted.lower()
+
+    candidates = [o for o in options if o.get("value") not in (None, "")]
+    if group:
+        grouped = [o for o in candidates if (o.get("group") or "").strip().lower() == group.strip().lower()]
+        if grouped:
+            candidates = grouped
+
+    for o in candidates:
+        if o["text"] == wanted:
+            return o["value"]
+    for o in candidates:
+        if o["text"].lower() == wanted_low:
+            return o["value"]
+    for o in candidates:
+        if wanted_low in o["text"].lower():
+            return o["value"]
+    return None
+
+
+def resolve_url(base_url: str, action: str) -> str:
+    """Convierte un 'action' relativo del formulario en URL absoluta respecto a base_url."""
+    if not action:
+        return base_url
+    if re.match(r"^https?://", action):
+        return action
+    m = re.match(r"^(https?://[^/]+)", base_url)
+    origin = m.group(1) if m else base_url
+    if action.startswith("/"):
+        return origin + action
+    return base_url.rstrip("/") + "/" + action
+
+
+class _TableParser(HTMLParser):
+    """Parser mínimo de tablas: encabezados (<th>) y filas con el texto de cada celda."""
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.tables: List[Dict[str, Any]] = []
+        self._table = None
+        self._row = None
+        self._cell = None
+        self._cell_is_header = False
+
+    def handle_starttag(self, tag, attrs):
+        a = {k: (v if v is not None else "") for k, v in attrs}
+        if tag == "table":
+            self._table = {"attrs": a, "headers": [], "rows": []}
+            self.tables.append(self._table)
+        elif self._table is None:
+            return
+        elif tag == "tr":
+            self._row = {"attrs": a, "cells": []}
+        elif tag in ("td", "th") and self._row is not None:
+            self._cell = {"text": "", "attrs": a}
+            self._cell_is_header = tag == "th"
+
+    def handle_endtag(self, tag):
+        if self._table is None:
+            return
+        if tag in ("td", "th") and self._cell is not None:
+            self._cell["text"] = " ".join(self._cell["text"].split())
+            self._row["cells"].append(self._cell)
+            self._cell = None
+        elif tag == "tr" and self._row is not None:
+            cells = self._row["cells"]
+            if cells and self._cell_is_header and not self._table["headers"]:
+                self._table["headers"] = [c["text"] for c in cells]
+            elif cells:
+                self._table["rows"].append(self._row)
+            self._row = None
+        elif tag == "table":
+            self._table = None
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell["text"] += data
+
+
+def parse_tables(html: str) -> List[Dict[str, Any]]:
+    """Devuelve las tablas de la página: {'headers': [...], 'rows': [{'attrs', 'cells': [{'text', 'attrs'}]}]}."""
+    parser = _TableParser()
+    parser.feed(html or "")
+    parser.close()
+    return parser.tables
+
+
+# Encabezados (en minúsculas) con los que xtiming puede titular cada columna del listado
+TIMESHEET_COLUMNS = {
+    "date": ("fecha", "date", "día", "dia"),
+    "begin": ("inicio", "desde", "begin", "start"),
+    "end": ("fin", "hasta", "end"),
+    "description": ("descripción", "descripcion", "description"),
+    "ticket_id": ("ticket glpi", "ticket", "ticket_glpi"),
+}
+
+_DATE_RE = re.compile(r"(\d{4})-(\d{2})-(\d{2})|(\d{1,2})[./](\d{1,2})[./](\d{4})")
+_TIME_RE = re.compile(r"(\d{1,2}):(\d{2})")
+
+
+def normalize_datetime(text: str, default_date: Optional[str] = None) -> tuple:
+    """
+    Convierte '02.03.2026 07:30', '2026-03-02 07:30' o '07:30' en ('2026-03-02', '07:30').
+    Si el texto no trae fecha se usa default_date (ISO).
+    """
+    text = text or ""
+    date = default_date
+    m = _DATE_RE.search(text)
+    if m:
+        if m.group(1):
+            date = f"{m.group(1)}-{m.group(2)}-{m.group(3)}"
+        else:
+            date = f"{m.group(6)}-{int(m.group(5)):02d}-{int(m.group(4)):02d}"
+    t = _TIME_RE.search(text[m.end():] if m else text)
+    time = f"{int(t.group(1)):02d}:{t.group(2)}" if t else None
+    return date, time
+
+
+def _column_index(headers: List[str]) -> Dict[str, int]:
+    index = {}
+    lowered = [h.strip().lower() for h in headers]
+    for key, aliases in TIMESHEET_COLUMNS.items():
+        for alias in aliases:
+            if alias in lowered:
+                index[key] = lowered.index(alias)
+                break
+    return index
+
+
+def parse_timesheet_entries(html: str, default_date: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Lee los registros del listado de timesheet guiándose por los encabezados de la tabla.
+    Devuelve [{'date', 'begin', 'end', 'description', 'ticket_id'}] con fecha ISO y horas HH:MM.
+    """
+    entries = []
+    for table in parse_tables(html):
+        cols = _column_index(table["headers"])
+        if "begin" not in cols or "end" not in cols:
+            continue
+        for row in table["rows"]:
+            cells = row["cells"]
+            cell = lambda key: cells[cols[key]]["text"] if key in cols and cols[key] < len(cells) else ""
+
+            row_date = normalize_datetime(cell("date"), default_date)[0] if "date" in cols else default_date
+            date, begin = normalize_datetime(cell("begin"), row_date)
+            _, end = normalize_datetime(cell("end"), date)
+            if not begin or not end:
+                continue
+            entries.append({
+                "date": date,
+                "begin": begin,
+                "end": end,
+                "description": cell("description"),
+                "ticket_id": cell("ticket_id") or None,
+            })
+    return entries
+
+
+def entry_keys(entry: Dict[str, Any]) -> set:
+    """
+    Claves de duplicado de un registro: (ticket, fecha, inicio, fin) si tiene ticket numérico
+    y (descripción, fecha, inicio, fin) para los que no lo tienen (p.ej. tickets de Telegram).
+    """
+    keys = set()
+    slot = (entry.get("date"), entry.get("begin"), entry.get("end"))
+    ticket_id = str(entry.get("ticket_id") or "").strip()
+    if ticket_id.isdigit():
+        keys.add(("ticket", ticket_id) + slot)
+    description = " ".join((entry.get("description") or "").split()).lower()
+    if description:
+        keys.add(("description", description) + slot)
+    return keys
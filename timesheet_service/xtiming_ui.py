@@ -0,0 +1,163 @@
+import re
+from typing import Dict, Any, Optional, List
+from urllib.parse import urlparse
+
+import xtiming_html
+
+# Selectores y scripts del formulario de timesheet de xtiming, compartidos por WebAutomator y
+# AsyncWebAutomator (solo cambia sync/async); HttpAutomator usa los mismos ids de campos.
+# Sin dependencias de Playwright.
+
+SELECTORS = {
+    "login_user": "input[name='_username']",
+    "login_pass": "input[name='_password']",
+    "login_btn": "button[type='submit']",
+    "user_menu": ".user-menu, .dropdown-user",
+
+    "ts_start_time": "#timesheet_edit_form_begin",
+    "ts_end_time": "#timesheet_edit_form_end",
+
+    "ts_customer": "#timesheet_edit_form_customer",
+    "ts_project": "#timesheet_edit_form_project",
+    "ts_activity": "#timesheet_edit_form_activity",
+    "ts_description": "#timesheet_edit_form_description",
+    "ts_tags": "#timesheet_edit_form_tags",
+
+    "ts_ticket_glpi": "#timesheet_edit_form_metaFields_ticket_glpi_value",
+    "ts_save_btn": "button[type='submit']",
+
+    "select2_container": ".select2-container",
+    "select2_search": ".select2-search__field",
+    "select2_results": ".select2-results__options",
+    "select2_option": ".select2-results__option",
+
+    "alert_success": ".alert-success, .flash-success",
+    "alert_error": ".alert-danger, .has-error, .flash-error"
+}
+
+# Botón Guardar específico (no cualquier submit) y, si no aparece, el último submit del formulario
+SAVE_BUTTON = "button:has-text('Guardar'), input[type='submit'][value='Guardar']"
+SAVE_BUTTON_FALLBACK = "form button[type='submit']"
+
+# Campos que comparten todos los sub-bloques de un mismo ticket (se capturan y se reinyectan)
+TICKET_FIELDS = ["ts_customer", "ts_project", "ts_activity", "ts_tags"]
+
+# Fechas via JavaScript para NO activar el datepicker; cierra cualquier datepicker residual
+SET_DATES_JS = """([startSel, endSel, start, end]) => {
+    [[startSel, start], [endSel, end]].forEach(([sel, value]) => {
+        const el = document.querySelector(sel);
+        el.value = value;
+        el.dispatchEvent(new Event('change', { bubbles: true }));
+        el.blur();
+    });
+    document.querySelectorAll('.datepicker, .daterangepicker, .bootstrap-datetimepicker-widget, .flatpickr-calendar').forEach(el => {
+        el.style.display = 'none';
+    });
+    if (typeof jQuery !== 'undefined' && jQuery.fn.datepicker) {
+        jQuery('.datepicker-input, input[data-toggle="datetimepicker"]').datepicker('hide');
+    }
+    document.activeElement.blur();
+}"""
+
+# Sin peticiones jQuery en curso (p.ej. recarga de proyectos tras elegir cliente)
+AJAX_IDLE_JS = "() => (typeof window.jQuery === 'undefined') || window.jQuery.active === 0"
+
+# Select2 terminó de renderizar los resultados filtrados por la búsqueda (sin indicador de carga)
+SELECT2_FILTERED_JS = """(q) => {
+    const ul = document.querySelector('.select2-results__options');
+    if (!ul || ul.querySelector('.loading-results, .select2-results__option--loading')) return false;
+    const opts = Array.from(ul.querySelectorAll('.select2-results__option'));
+    const needle = q.toLowerCase();
+    return opts.length > 0 && opts.every(o =>
+        o.classList.contains('select2-results__message') ||
+        o.getAttribute('role') === 'group' ||
+        o.textContent.toLowerCase().includes(needle));
+}"""
+
+READ_OPTIONS_JS = """(sel) => {
+    const el = document.querySelector(sel);
+    if (!el) return [];
+    return Array.from(el.options).map(o => ({ value: o.value, text: o.text }));
+}"""
+
+# Selecciona valores en el <select> subyacente con un único evaluate y dispara 'change'
+SET_SELECT_VALUES_JS = """([sel, values]) => {
+    const el = document.querySelector(sel);
+    if (!el) return false;
+    const wanted = new Set(values);
+    const present = Array.from(el.options).filter(o => wanted.has(o.value));
+    if (present.length !== wanted.size) return false;
+    if (el.multiple) {
+        present.forEach(o => { o.selected = true; });
+    } else {
+        el.value = values[0];
+    }
+    el.dispatchEvent(new Event('change', { bubbles: true }));
+    return true;
+}"""
+
+# Listas dependientes: el value ya existe en el <select> (carga AJAX tras el padre)
+OPTION_PRESENT_JS = """([sel, value]) => {
+    const el = document.querySelector(sel);
+    return !!el && Array.from(el.options).some(o => o.value === value);
+}"""
+
+CURRENT_VALUE_JS = "(sel) => { const el = document.querySelector(sel); return el ? el.value : ''; }"
+
+BUTTON_ENABLED_JS = "(el) => !el.disabled"
+
+# Lee value(s) + texto de cada select para poder recrear las opciones cargadas por AJAX
+CAPTURE_FIELDS_JS = """(selectors) => selectors.map(sel => {
+    const el = document.querySelector(sel);
+    if (!el) return null;
+    const picked = Array.from(el.options).filter(o => o.selected && o.value);
+    return { sel: sel, options: picked.map(o => ({ value: o.value, text: o.text })) };
+})"""
+
+# Reinyecta los valores capturados en un solo evaluate. No dispara 'change' para que xtiming
+# no recargue las listas dependientes (vaciaría el proyecto); solo refresca la vista de Select2.
+REPLAY_FIELDS_JS = """(fields) => {
+    for (const f of fields) {
+        const el = document.querySelector(f.sel);
+        if (!el) return false;
+        el.disabled = false;
+        const wanted = new Set(f.options.map(o => o.value));
+        for (const o of f.options) {
+            if (!Array.from(el.options).some(x => x.value === o.value)) {
+                el.add(new Option(o.text, o.value, false, false));
+            }
+        }
+        Array.from(el.options).forEach(o => { o.selected = wanted.has(o.value); });
+        if (typeof jQuery !== 'undefined') jQuery(el).trigger('change.select2');
+    }
+    return true;
+}"""
+
+
+def ticket_field_selectors() -> List[str]:
+    return [SELECTORS[k] for k in TICKET_FIELDS]
+
+
+def usable_capture(fields: Optional[List[Dict[str, Any]]]) -> Optional[List[Dict[str, Any]]]:
+    """Solo vale la pena reutilizar una captura completa (todos los selects con valor)."""
+    if not fields or any(f is None or not f["options"] for f in fields):
+        return None
+    return fields
+
+
+# Destinos válidos tras guardar: el listado (/timesheet/) o el detalle/edición de un registro
+_SAVED_PATH = re.compile(r"^/timesheet(/|/\d+(/[a-z_]+)?/?)?$")
+
+
+def is_saved_url(base_url: str, location: str) -> bool:
+    """
+    True solo si la URL (absoluta o relativa a base_url) tras guardar es el listado o un registro;
+    /login (sesión expirada) o /timesheet/create (rechazo) no confirman el guardado.
+    """
+    if not location:
+        return False
+    base_path = urlparse(base_url).path.rstrip("/")
+    path = urlparse(xtiming_html.resolve_url(base_url, location)).path
+    if base_path and not path.startswith(base_path):
+        return False
+    return bool(_SAVED_PATH.match(path[len(base_path):]))